@@ -1,2 +1,41 @@
 from __future__ import annotations
+
+import time
+from typing import AsyncGenerator
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db import session
 from app.db.session import get_db
+
+# Cookie/header con l'istante (epoch) dell'ultima scrittura del client, impostato da ReadYourWritesMiddleware
+LAST_WRITE_COOKIE = "schools_last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+def wrote_recently(request: Request) -> bool:
+    """Indica se il client ha scritto negli ultimi settings.READ_YOUR_WRITES_SECONDS secondi."""
+    value = request.cookies.get(LAST_WRITE_COOKIE) or request.headers.get(LAST_WRITE_HEADER)
+    if not value:
+        return False
+    try:
+        return time.time() - float(value) < settings.READ_YOUR_WRITES_SECONDS
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db)) -> AsyncGenerator[AsyncSession, None]:
+    """Sessione per le route in sola lettura.
+
+    Usa la replica se configurata e aggiornata, altrimenti il primario (la sessione di get_db non apre
+    connessioni finché non viene usata). Un client che ha appena scritto legge sempre dal primario.
+    """
+    if (session.ReplicaSessionLocal is None or wrote_recently(request)
+            or not await session.replica_health.is_usable()):
+        yield db
+        return
+
+    async with session.ReplicaSessionLocal() as replica_db:
+        yield replica_db
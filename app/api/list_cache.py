@@ -0,0 +1,138 @@
+"""Cache delle risposte delle liste, per parametri della query, invalidata dalla generazione del catalogo.
+
+Ogni pagina viene salvata già codificata in JSON insieme alla generazione (versione di catalog_version)
+da cui è stata calcolata: finché la generazione non cambia, e al massimo per settings.LIST_CACHE_TTL_SECONDS,
+viene restituita senza eseguire il service.
+Dopo una modifica la prima richiesta ricalcola la pagina e le richieste concorrenti ricevono ancora la
+versione precedente (stale-while-revalidate) per al massimo settings.LIST_CACHE_MAX_STALE_SECONDS.
+
+Le risposte hanno ETag e Last-Modified (istante dell'ultima modifica al catalogo o updated_at più recente
+della pagina), e le richieste condizionali ricevono 304.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Hashable
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import wrote_recently
+from app.core.cache import LRUCache, SingleFlight
+from app.core.config import settings
+from app.services.changes import generation
+
+_cache = LRUCache(settings.LIST_CACHE_MAX_ENTRIES)
+_flight = SingleFlight()
+_counters = {"hits": 0, "misses": 0, "stale": 0, "not_modified": 0}
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    generation: tuple[int, int]  # generazione del catalogo da cui è stata calcolata
+    stored_at: float
+    body: bytes
+    etag: str
+    last_modified: datetime | None
+
+
+def cache_stats() -> dict[str, int]:
+    """Restituisce i contatori della cache delle liste (hits, misses, stale, not_modified) e il numero di pagine."""
+    return {**_counters, "entries": len(_cache)}
+
+
+def clear_cache() -> None:
+    _cache.clear()
+    generation.invalidate()
+    for key in _counters:
+        _counters[key] = 0
+
+
+def _last_modified_header(page: CachedPage) -> str | None:
+    # Un Last-Modified nel secondo corrente non distinguerebbe una modifica successiva nello stesso secondo
+    if page.last_modified is None or (datetime.now(timezone.utc) - page.last_modified).total_seconds() < 1:
+        return None
+    return format_datetime(page.last_modified.replace(microsecond=0), usegmt=True)
+
+
+def _not_modified(request: Request, page: CachedPage, last_modified: str | None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match ha la precedenza su If-Modified-Since
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        return "*" in tags or page.etag in tags or f"W/{page.etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _response(request: Request, page: CachedPage) -> Response:
+    last_modified = _last_modified_header(page)
+    headers = {"ETag": page.etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if _not_modified(request, page, last_modified):
+        _counters["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+
+async def cached_response(request: Request, db: AsyncSession, key: Hashable,
+                          build: Callable[[], Awaitable[BaseModel]],
+                          updated_at: Callable[[BaseModel], datetime | None] = lambda _: None) -> Response:
+    """Restituisce la pagina dalla cache se calcolata dalla generazione attuale del catalogo, altrimenti la ricalcola.
+
+    Args:
+        request (Request): Richiesta, per gli header condizionali.
+        db (AsyncSession): Sessione DB, per leggere la generazione del catalogo.
+        key (Hashable): Chiave della pagina: nome della lista e parametri già interpretati dalla route (così
+            ordine, codifica e valori di default della query string non creano chiavi diverse).
+        build (Callable[[], Awaitable[BaseModel]]): Calcola la pagina (es. il service della lista).
+        updated_at (Callable[[BaseModel], datetime | None]): updated_at più recente tra le righe della pagina.
+
+    Returns:
+        Response: JSON della pagina, o 304 se il client ha già la versione attuale.
+    """
+    # Chi ha appena scritto (anche tramite un altro worker) deve vedere la propria modifica
+    current = await generation.current(db, refresh=wrote_recently(request))
+    page: CachedPage | None = _cache.get(key)
+    # Il TTL copre le modifiche fatte fuori dal servizio (import diretti, rebuild da un altro processo)
+    if (page is not None and page.generation == current.token
+            and time.monotonic() - page.stored_at < settings.LIST_CACHE_TTL_SECONDS):
+        _counters["hits"] += 1
+        return _response(request, page)
+
+    flight_key = (key, current.token)
+    if (page is not None and _flight.in_flight(flight_key)
+            and time.monotonic() - current.observed_at < settings.LIST_CACHE_MAX_STALE_SECONDS):
+        _counters["stale"] += 1
+        return _response(request, page)
+
+    async def refresh() -> CachedPage:
+        model = await build()
+        body = to_json(model)
+        newest = [value.replace(tzinfo=value.tzinfo or timezone.utc)
+                  for value in (current.changed_at, updated_at(model)) if value is not None]
+        fresh = CachedPage(
+            generation=current.token,
+            stored_at=time.monotonic(),
+            body=body,
+            etag='"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest(),
+            last_modified=max(newest) if newest else None,
+        )
+        _cache.set(key, fresh)
+        return fresh
+
+    _counters["misses"] += 1
+    page, _ = await _flight.do(flight_key, refresh)
+    return _response(request, page)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+
+class ModelResponse(ORJSONResponse):
+    """ORJSONResponse che serializza direttamente un modello pydantic già costruito dal service.
+
+    Restituendo una Response la route salta il passaggio di FastAPI su response_model (model_dump,
+    nuova validazione di ogni campo ed EmailStr, serializzazione): il modello viene scritto in JSON
+    da pydantic-core in un solo passaggio, con lo stesso output. response_model resta dichiarato
+    sulla route e continua a generare lo schema OpenAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return to_json(content)
+        return super().render(content)
+
+
+def model_response(result: Any) -> Any:
+    """Incapsula in ModelResponse il risultato di un service; gli altri valori passano da FastAPI come prima.
+
+    Args:
+        result (Any): Modello pydantic restituito dal service (o altro, es. None).
+
+    Returns:
+        Any: ModelResponse per i modelli, altrimenti result invariato.
+    """
+    return ModelResponse(result) if isinstance(result, BaseModel) else result
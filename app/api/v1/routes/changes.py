@@ -0,0 +1,20 @@
+from __future__ import annotations
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_read_db
+from app.core.config import settings
+import app.services.changes as ChangesService
+from app.schemas.changes import CatalogChangesPage
+
+router = APIRouter()
+
+@router.get("/", response_model=CatalogChangesPage)
+async def get_changes(
+        since: int = Query(default=0, ge=0, description="Token next_since della chiamata precedente (0 = tutto il catalogo)"),
+        limit: int = Query(default=100, ge=1, le=settings.CHANGES_PAGE_MAX),
+        db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        return await ChangesService.get_changes(db, since, limit)
+    except Exception as e:
+        raise e
@@ -1,12 +1,54 @@
 from __future__ import annotations
-from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import AsyncIterator
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.api.deps import get_db
+from app.api.deps import get_db, get_read_db
 import app.services.citta as CittaService
-from app.schemas.citta import CittaList, CittaResponse, CittaCreate, CittaUpdate
+from app.schemas.citta import CittaList, CittaResponse, CittaCreate, CittaUpdate, CittaBulkResult
 
 router = APIRouter()
 
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def _read_bulk_body(request: Request) -> AsyncIterator[object]:
+    """Elementi del body: NDJSON letto riga per riga mentre arriva, oppure un array JSON."""
+    if request.headers.get("content-type", "").split(";")[0].strip() in NDJSON_TYPES:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+
+    items = orjson.loads(await request.body())
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array")
+    for item in items:
+        yield item
+
+
+async def _parse_bulk_citta(request: Request) -> AsyncIterator[CittaCreate]:
+    position = 0
+    try:
+        async for item in _read_bulk_body(request):
+            if isinstance(item, bytes):
+                item = orjson.loads(item)
+            yield CittaCreate.model_validate(item)
+            position += 1
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", position, *error["loc"])}
+                                      for error in e.errors(include_url=False)])
+    except ValueError as e:  # orjson.JSONDecodeError è una sottoclasse di ValueError
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body", position), "msg": str(e)}])
+
 @router.get("/", response_model=CittaList)
 async def get_citta(
         limit: int = Query(default=10, ge=1, le=100),
@@ -14,7 +56,7 @@ async def get_citta(
         search: str = Query(default=None),
         sort_by: str = Query(default=None),
         order: str = Query(default="asc", pattern="^(asc|desc)$"),
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     try:
         return await CittaService.get_citta(db, limit, offset, search, sort_by, order)
@@ -22,14 +64,14 @@ async def get_citta(
         raise e
 
 @router.get("/{citta_id}", response_model=CittaResponse)
-async def get_citta_by_id(citta_id: int, db: AsyncSession = Depends(get_db)):
+async def get_citta_by_id(citta_id: int, db: AsyncSession = Depends(get_read_db)):
     try:
         return await CittaService.get_citta_by_id(citta_id, db)
     except Exception as e:
         raise e
 
 @router.get("/zipcode/{zipcode}", response_model=CittaResponse)
-async def get_citta_by_zipcode(zipcode: str, db: AsyncSession = Depends(get_db)):
+async def get_citta_by_zipcode(zipcode: str, db: AsyncSession = Depends(get_read_db)):
     try:
         return await CittaService.get_citta_by_zipcode(zipcode, db)
     except Exception as e:
@@ -42,6 +84,27 @@ async def post_citta(citta: CittaCreate, db: AsyncSession = Depends(get_db)):
     except Exception as e:
         raise e
 
+@router.post(
+    "/bulk",
+    response_model=CittaBulkResult,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/CittaCreate"}}},
+        "application/x-ndjson": {"schema": {"$ref": "#/components/schemas/CittaCreate"}},
+    }}},
+)
+async def bulk_upsert_citta(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Crea o aggiorna per nome un elenco di città (es. i comuni ISTAT) in un'unica transazione.
+
+    Accetta un array JSON oppure NDJSON (una città per riga, Content-Type: application/x-ndjson),
+    letto riga per riga man mano che arriva. Le scritture iniziano solo dopo aver validato tutto
+    l'elenco: se un elemento non è valido non viene salvato nulla.
+    """
+    try:
+        return await CittaService.bulk_upsert_citta(_parse_bulk_citta(request), db)
+    except Exception as e:
+        raise e
+
 @router.put("/{citta_id}", response_model=CittaResponse)
 async def put_citta(citta_id: int, citta: CittaUpdate, db: AsyncSession = Depends(get_db)):
     try:
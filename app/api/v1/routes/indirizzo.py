@@ -1,9 +1,12 @@
 from __future__ import annotations
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.api.deps import get_db
+from app.api.deps import get_db, get_read_db
 import app.services.indirizzi as IndirizziService
-from app.schemas.indirizzo import IndirizzoList, IndirizzoResponse, IndirizzoCreate, IndirizzoUpdate
+from app.schemas.indirizzo import (IndirizzoList, IndirizzoResponse, IndirizzoCreate, IndirizzoUpdate,
+                                   IndirizziMatchRequest, IndirizziMatchList)
+from app.services.http_client import OrientatiException
 
 router = APIRouter()
 
@@ -14,7 +17,7 @@ async def get_indirizzi(
         search: str = Query(default=None),
         sort_by: str = Query(default=None),
         order: str = Query(default="asc", pattern="^(asc|desc)$"),
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     try:
         return await IndirizziService.get_indirizzi(db, limit, offset, search, sort_by, order)
@@ -22,12 +25,29 @@ async def get_indirizzi(
         raise e
 
 @router.get("/{indirizzo_id}", response_model=IndirizzoResponse)
-async def get_indirizzo_by_id(indirizzo_id: int, db: AsyncSession = Depends(get_db)):
+async def get_indirizzo_by_id(indirizzo_id: int, db: AsyncSession = Depends(get_read_db)):
     try:
         return await IndirizziService.get_indirizzo_by_id(indirizzo_id, db)
     except Exception as e:
         raise e
 
+@router.post("/match", response_model=IndirizziMatchList)
+async def match_indirizzi(request: IndirizziMatchRequest, db: AsyncSession = Depends(get_read_db)):
+    """
+    Classifica gli indirizzi di studio in base alle materie preferite (con peso), opzionalmente per provincia o regione.
+    """
+    try:
+        return await IndirizziService.match_indirizzi(request, db)
+    except OrientatiException as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={
+                "message": e.message,
+                "details": e.details,
+                "url": e.url
+            }
+        )
+
 @router.post("/", response_model=IndirizzoResponse)
 async def post_indirizzo(indirizzo: IndirizzoCreate, db: AsyncSession = Depends(get_db)):
     try:
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.api.deps import get_db
+from app.api.deps import get_db, get_read_db
 from app.schemas.materia import MateriaResponse, MateriaList, MateriaUpdate, MateriaCreate
 from app.services import materie as MaterieService
 
@@ -14,7 +14,7 @@ async def get_materie(
         search: str = Query(default=None),
         sort_by: str = Query(default=None),
         order: str = Query(default="asc", pattern="^(asc|desc)$"),
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     try:
         return await MaterieService.get_materie(db, limit, offset, search, sort_by, order)
@@ -22,7 +22,7 @@ async def get_materie(
         raise e
 
 @router.get("/{materia_id}", response_model=MateriaResponse)
-async def get_materia_by_id(materia_id: int, db: AsyncSession = Depends(get_db)):
+async def get_materia_by_id(materia_id: int, db: AsyncSession = Depends(get_read_db)):
     try:
         return await MaterieService.get_materia_by_id(materia_id, db)
     except Exception as e:
@@ -2,13 +2,17 @@ from __future__ import annotations
 
 from typing import Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi import Query
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db
-from app.schemas.school import SchoolsList, SchoolResponse, SchoolCreate, SchoolDeleteResponse, SchoolUpdate
+from app.api.deps import get_db, get_read_db
+from app.api.list_cache import cached_response
+from app.api.responses import model_response
+from app.core.config import settings
+from app.schemas.school import (SchoolsList, SchoolResponse, SchoolCreate, SchoolDeleteResponse, SchoolUpdate,
+                                SchoolFullCreate, SchoolFullUpdate, SimilarSchoolsList)
 from app.services import school as school_service
 from app.services.http_client import OrientatiException
 
@@ -17,17 +21,21 @@ router = APIRouter()
 
 @router.get("/", response_model=SchoolsList)
 async def get_schools(
+        request: Request,
         limit: int = Query(default=10, ge=1, le=100, description="Numero di scuole da restituire (1-100)"),
         offset: int = Query(default=0, ge=0, description="Numero di scuole da saltare per la paginazione"),
         search: Optional[str] = Query(default=None, description="Termine di ricerca per filtrare le scuole per nome"),
         tipo: Optional[str] = Query(default=None, description="Filtra per tipo di scuola (es. Liceo, ITIS, ecc.)"),
         citta: Optional[str] = Query(default=None, description="Filtra per città"),
         provincia: Optional[str] = Query(default=None, description="Filtra per provincia"),
-        indirizzo: Optional[str] = Query(default=None,
-                                         description="Filtra per tipo di scuola (es. Liceo, informatico, ecc.)"),
+        indirizzo: Optional[str] = Query(default=None, description="Filtra per indirizzo (via) della scuola"),
+        materia: Optional[str] = Query(default=None, description="Filtra per materia insegnata (es. Informatica)"),
+        indirizzo_studio: Optional[str] = Query(default=None,
+                                                description="Filtra per indirizzo di studio (es. Scientifico)"),
+        regione: Optional[str] = Query(default=None, description="Filtra per regione"),
         sort_by: str = Query(default="name", description="Campo per ordinamento (es. nome, città, provincia)"),
         order: str = Query(default="asc", pattern="^(asc|desc)$", description="Ordine: asc o desc"),
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     """
     Recupera la lista delle scuole con opzioni di paginazione e filtro.
@@ -35,18 +43,18 @@ async def get_schools(
     Returns:
         dict: Lista delle scuole con metadati di paginazione
     """
+    # Pagine riutilizzate finché il catalogo non cambia, con ETag/Last-Modified (vedi app.api.list_cache)
+    params = dict(limit=limit, offset=offset, search=search, tipo=tipo, citta=citta, provincia=provincia,
+                  indirizzo=indirizzo, materia=materia, indirizzo_studio=indirizzo_studio, regione=regione,
+                  sort_by=sort_by, order=order)
     try:
-        return await school_service.get_schools(
-            db=db,
-            limit=limit,
-            offset=offset,
-            search=search,
-            tipo=tipo,
-            citta=citta,
-            provincia=provincia,
-            indirizzo=indirizzo,
-            sort_by=sort_by,
-            order=order
+        if not settings.LIST_CACHE_ENABLED:
+            return model_response(await school_service.get_schools(db=db, **params))
+        return await cached_response(
+            request, db,
+            key=("schools", *params.values()),
+            build=lambda: school_service.get_schools(db=db, **params),
+            updated_at=lambda page: max((s.updated_at for s in page.scuole if s.updated_at), default=None),
         )
     except OrientatiException as e:
         return JSONResponse(
@@ -60,7 +68,7 @@ async def get_schools(
 
 
 @router.get("/{school_id}", response_model=SchoolResponse)
-async def get_school_by_id(school_id: int, db: AsyncSession = Depends(get_db)) -> SchoolResponse:
+async def get_school_by_id(school_id: int, db: AsyncSession = Depends(get_read_db)) -> SchoolResponse:
     """
     Recupera i dettagli di una scuola dato il suo ID.
 
@@ -71,7 +79,38 @@ async def get_school_by_id(school_id: int, db: AsyncSession = Depends(get_db)) -
         SchoolResponse: Dettagli della scuola.
     """
     try:
-        return await school_service.get_school_by_id(school_id, db)
+        return model_response(await school_service.get_school_by_id(school_id, db))
+    except OrientatiException as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={
+                "message": e.message,
+                "details": e.details,
+                "url": e.url
+            }
+        )
+
+
+@router.get("/{school_id}/similar", response_model=SimilarSchoolsList)
+async def get_similar_schools(
+        school_id: int,
+        k: int = Query(default=10, ge=1, le=settings.SIMILARITY_MAX_K, description="Numero di scuole da restituire"),
+        metric: str = Query(default="jaccard", pattern="^(jaccard|cosine)$", description="Metrica: jaccard o cosine"),
+        provincia: Optional[str] = Query(default=None, description="Solo scuole di questa provincia"),
+        tipo: Optional[str] = Query(default=None, description="Solo scuole di questo tipo"),
+        db: AsyncSession = Depends(get_read_db)
+) -> SimilarSchoolsList:
+    """
+    Recupera le scuole più simili a quella indicata in base alle materie insegnate nei loro indirizzi di studio.
+
+    Args:
+        school_id (int): ID della scuola di riferimento.
+
+    Returns:
+        SimilarSchoolsList: Scuole simili con il relativo punteggio (da 0 a 1).
+    """
+    try:
+        return model_response(await school_service.get_similar_schools(school_id, k, metric, provincia, tipo, db))
     except OrientatiException as e:
         return JSONResponse(
             status_code=e.status_code,
@@ -93,9 +132,53 @@ async def post_school(school: SchoolCreate, db: AsyncSession = Depends(get_db))
         SchoolResponse: Dettagli della scuola creata.
     """
     try:
-        scuola = await school_service.create_school(school, db)
-        print(scuola)
-        return scuola
+        return model_response(await school_service.create_school(school, db))
+    except OrientatiException as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={
+                "message": e.message,
+                "details": e.details,
+                "url": e.url
+            }
+        )
+
+
+@router.post("/full", response_model=SchoolResponse)
+async def post_school_full(school: SchoolFullCreate, db: AsyncSession = Depends(get_db)) -> SchoolResponse:
+    """
+    Crea una scuola con i suoi indirizzi di studio e le relative materie (id o nomi) in un'unica transazione.
+    Args:
+        school (SchoolFullCreate): Dati della scuola, dei suoi indirizzi e delle materie.
+    Returns:
+        SchoolResponse: Dettagli della scuola creata.
+    """
+    try:
+        return model_response(await school_service.create_school_full(school, db))
+    except OrientatiException as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={
+                "message": e.message,
+                "details": e.details,
+                "url": e.url
+            }
+        )
+
+
+@router.put("/{school_id}/full", response_model=SchoolResponse)
+async def put_school_full(school_id: int, school: SchoolFullUpdate,
+                          db: AsyncSession = Depends(get_db)) -> SchoolResponse:
+    """
+    Sostituisce i dati di una scuola e l'elenco completo dei suoi indirizzi di studio e materie.
+    Args:
+        school_id (int): ID della scuola da sostituire.
+        school (SchoolFullUpdate): Nuovi dati della scuola, dei suoi indirizzi e delle materie.
+    Returns:
+        SchoolResponse: Dettagli della scuola aggiornata.
+    """
+    try:
+        return model_response(await school_service.replace_school_full(school_id, school, db))
     except OrientatiException as e:
         return JSONResponse(
             status_code=e.status_code,
@@ -118,7 +201,7 @@ async def put_school(school_id: int, school: SchoolUpdate, db: AsyncSession = De
         SchoolResponse: Dettagli della scuola aggiornata.
     """
     try:
-        return await school_service.update_school(school_id, school.model_dump(), db)
+        return model_response(await school_service.update_school(school_id, school.model_dump(), db))
     except OrientatiException as e:
         return JSONResponse(
             status_code=e.status_code,
@@ -140,7 +223,7 @@ async def delete_school(school_id: int, db: AsyncSession = Depends(get_db)) -> S
         SchoolDeleteResponse: Conferma dell'eliminazione della scuola.
     """
     try:
-        return await school_service.delete_school(school_id, db)
+        return model_response(await school_service.delete_school(school_id, db))
     except OrientatiException as e:
         return JSONResponse(
             status_code=e.status_code,
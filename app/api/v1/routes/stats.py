@@ -0,0 +1,20 @@
+from __future__ import annotations
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_read_db
+from app.core.config import settings
+import app.services.stats as StatsService
+from app.schemas.stats import CatalogStats
+
+router = APIRouter()
+
+@router.get("/", response_model=CatalogStats)
+async def get_stats(response: Response, db: AsyncSession = Depends(get_read_db)):
+    """
+    Conteggi del catalogo: scuole per regione, provincia e tipo, indirizzi per materia.
+    """
+    try:
+        response.headers["Cache-Control"] = f"public, max-age={int(settings.STATS_CACHE_SECONDS)}"
+        return await StatsService.get_stats(db)
+    except Exception as e:
+        raise e
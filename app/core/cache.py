@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class LRUCache:
+    """Cache in memoria con limite di dimensione ed eviction Least Recently Used.
+
+    Non è thread-safe: è pensata per essere usata dal solo event loop del processo.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """Inizializza la cache.
+
+        Args:
+            max_entries (int): Numero massimo di elementi mantenuti (default: 1024).
+        """
+        self.max_entries = max_entries
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Restituisce il valore associato alla chiave e lo marca come usato di recente."""
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Inserisce o aggiorna un valore, rimuovendo il meno usato se la cache è piena."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+
+class SingleFlight:
+    """Coalescing delle chiamate concorrenti identiche (pattern "single flight").
+
+    La prima coroutine che richiede una chiave esegue davvero la funzione, le altre
+    attendono lo stesso risultato (o la stessa eccezione) senza ripetere il lavoro.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                 wait_timeout: float | None = None) -> tuple[Any, bool]:
+        """Esegue fn una sola volta per tutte le chiamate concorrenti con la stessa chiave.
+
+        Se la coroutine che esegue fn viene cancellata (es. client disconnesso) le altre in attesa non
+        vengono cancellate: la prima riprende la chiamata con la propria fn e le restanti attendono quella.
+
+        Args:
+            key (Hashable): Chiave che identifica la chiamata.
+            fn (Callable[[], Awaitable[Any]]): Funzione asincrona da eseguire.
+            wait_timeout (float | None): Tempo massimo di attesa per chi si accoda a una chiamata già in corso.
+                Allo scadere solleva asyncio.TimeoutError senza interrompere la chiamata condivisa.
+
+        Returns:
+            tuple[Any, bool]: Il risultato e True se la chiamata è stata accorpata a una già in corso.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if wait_timeout is None else loop.time() + wait_timeout
+        while (future := self._calls.get(key)) is not None:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            try:
+                # shield: se il chiamante viene cancellato non cancella la chiamata condivisa
+                return await asyncio.wait_for(asyncio.shield(future), timeout), True
+            except asyncio.CancelledError:
+                # Cancellata la chiamata condivisa, non questa: si riprova (al più come nuovo esecutore)
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = loop.create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # evita il warning "exception was never retrieved" se nessuno attende
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
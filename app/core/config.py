@@ -5,18 +5,75 @@ class Settings(BaseSettings):
     SERVICE_NAME: str = "Schools Service"
     SERVICE_VERSION: str = "0.1.0"
     DATABASE_URL: str = "sqlite:///./database.db"
+    DATABASE_REPLICA_URL: str = ""  # Replica in sola lettura per le GET del catalogo (vuoto = solo primario)
+    REPLICA_MAX_LAG_SECONDS: float = 5.0  # Oltre questo ritardo le letture tornano sul primario
+    REPLICA_LAG_CHECK_INTERVAL: float = 5.0  # Ogni quanti secondi ricontrollare il ritardo della replica
+    READ_YOUR_WRITES_SECONDS: float = 10.0  # Dopo una scrittura il client legge dal primario per questo intervallo
+    # Pool per processo: con N worker gunicorn il DB vede fino a N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connessioni
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # Secondi di attesa massima per una connessione libera
+    DB_POOL_RECYCLE: int = 1800  # Secondi dopo cui una connessione viene riaperta (-1 = mai)
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Prepared statement in cache per connessione (0 con pgbouncer transaction mode)
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # statement_timeout lato server (0 = nessun limite)
+    QUERY_BUDGET_PER_REQUEST: int = 10  # Oltre questo numero di statement per richiesta viene loggato un warning (0 = off)
+    N_PLUS_ONE_THRESHOLD: int = 5  # Stesso SQL ripetuto almeno N volte in una richiesta = probabile N+1 (0 = off)
+    # Admission control: richieste concorrenti per classe di route (0 = derivato da DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_DETAIL_CONCURRENCY: int = 0  # Letture per id (default: tutta la capacità del pool)
+    ADMISSION_LIST_CONCURRENCY: int = 0  # Liste e ricerche (default: metà della capacità del pool)
+    ADMISSION_WRITE_CONCURRENCY: int = 0  # Scritture (default: un quarto della capacità del pool)
+    ADMISSION_MAX_QUEUE: int = 50  # Richieste in coda per classe oltre le quali si risponde subito 503
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0  # Attesa massima in coda (secondi) prima del 503
+    ADMISSION_RETRY_AFTER: int = 1  # Valore dell'header Retry-After dei 503
+    SLOW_QUERY_MS: float = 200.0  # Statement più lenti di così finiscono nello slow query log (0 = off)
     RABBITMQ_HOST: str = "localhost"
     RABBITMQ_PORT: int = 5672
     RABBITMQ_USER: str = "guest"
     RABBITMQ_CONNECTION_RETRIES: int = 5
     RABBITMQ_CONNECTION_RETRY_DELAY: int = 5
     RABBITMQ_PASS: str = "guest"
+    WARMUP_ENABLED: bool = True  # Apre il pool ed esegue le query calde all'avvio (/ready attende la fine)
+    WARMUP_CONNECTIONS: int = 0  # Connessioni da aprire in anticipo (0 = DB_POOL_SIZE)
+    WARMUP_TIMEOUT: float = 30.0  # Oltre questo tempo il warm-up viene interrotto e il worker dichiarato pronto
+    READINESS_CACHE_SECONDS: float = 2.0  # Per quanto riutilizzare l'esito dei controlli di /ready
+    CHANGES_PAGE_MAX: int = 1000  # Modifiche massime per pagina di GET /changes
+    # Ogni quanti secondi gli indici in memoria (scuole simili, match degli indirizzi) leggono le nuove modifiche
+    SIMILARITY_REFRESH_SECONDS: float = 5.0
+    SIMILARITY_MAX_K: int = 50  # Numero massimo di scuole simili per richiesta
+    MATCH_MAX_K: int = 50  # Numero massimo di indirizzi per richiesta di POST /indirizzi/match
+    STATS_CACHE_SECONDS: float = 10.0  # Per quanto ogni worker riutilizza la risposta di GET /stats
+    LIST_CACHE_ENABLED: bool = True  # Cache delle risposte di GET /schools/ per parametri della query
+    LIST_CACHE_MAX_ENTRIES: int = 512  # Pagine di scuole mantenute in cache da ogni worker
+    # Ogni quanti secondi un worker rilegge la generazione del catalogo (le scritture degli altri worker
+    # invalidano la sua cache entro questo tempo, le proprie subito)
+    LIST_CACHE_GENERATION_SECONDS: float = 1.0
+    # Per quanto, dopo una modifica, una pagina superata può ancora essere servita mentre un'altra richiesta la ricalcola
+    LIST_CACHE_MAX_STALE_SECONDS: float = 5.0
+    LIST_CACHE_TTL_SECONDS: float = 300.0  # Durata massima di una pagina in cache (modifiche fatte fuori dal servizio)
 
     SERVICE_PORT: int = 8000
+    WEB_CONCURRENCY: int = 0  # Worker gunicorn (0 = uno per CPU disponibile, limite del container compreso)
+    LEADER_LOCK_PATH: str = "/tmp/schools-service-leader.lock"  # File lock per eleggere il worker che gestisce il broker
+    LEADER_RETRY_INTERVAL: float = 5.0  # Ogni quanti secondi i worker non leader riprovano a prendere il lock
+    METRICS_MULTIPROC_DIR: str = ""  # Cartella condivisa dai worker per aggregare /metrics (gunicorn la crea se vuota)
+    METRICS_SNAPSHOT_INTERVAL: float = 5.0  # Ogni quanti secondi ogni worker scrive le proprie metriche nella cartella
     ENVIRONMENT: str = "development"
     SENTRY_DSN: str = ""
     SENTRY_RELEASE: str = "0.1.0"
     API_PREFIX: str = "/api/v1"
+    REQUEST_DEFAULT_BUDGET_MS: int = 0  # Budget di default delle richieste in ingresso (0 = nessuna scadenza)
+
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" (una riga JSON per record) oppure "text"
+    LOG_SAMPLING: dict[str, float] = {}  # es. {"app.access": 0.1}: frazione dei record < WARNING da tenere per logger
+
+    ERROR_LOG_WINDOW_SECONDS: float = 60.0  # Finestra di deduplica dei log di OrientatiException
+    ERROR_LOG_MAX_PER_WINDOW: int = 3  # Log identici emessi per finestra, i successivi vengono solo contati
+
+    HTTP_CLIENT_TIMEOUT: float = 5.0  # Timeout massimo (secondi) delle chiamate verso gli altri servizi
+    HTTP_CACHE_MAX_ENTRIES: int = 1024  # Numero massimo di risposte GET in cache per send_request(cache=True)
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+
+# Header con il tempo residuo della richiesta in millisecondi.
+# Si usa un budget relativo (e non un istante assoluto) per non dipendere dalla sincronizzazione degli orologi.
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """Scadenza della richiesta corrente.
+
+    Attributes:
+        expires_at (float): Istante di scadenza (time.monotonic).
+    """
+    expires_at: float
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_current_deadline: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(budget_seconds: float) -> Token:
+    """Imposta la scadenza della richiesta corrente a partire dal budget in secondi."""
+    return _current_deadline.set(Deadline(time.monotonic() + budget_seconds))
+
+
+def reset_deadline(token: Token) -> None:
+    _current_deadline.reset(token)
+
+
+def get_deadline() -> Deadline | None:
+    return _current_deadline.get()
+
+
+def remaining() -> float | None:
+    """Restituisce i secondi rimanenti prima della scadenza, o None se la richiesta non ha scadenza."""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def parse_budget_header(value: str | None) -> float | None:
+    """Converte il valore dell'header DEADLINE_HEADER in secondi, ignorando valori non validi."""
+    if not value:
+        return None
+    try:
+        return max(int(value), 0) / 1000
+    except ValueError:
+        return None
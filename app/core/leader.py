@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: nessun lock tra processi, ogni processo è leader
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+class LeaderLock:
+    """Elezione del leader tra i worker gunicorn della stessa istanza tramite un file lock.
+
+    Il lock (fcntl.flock) è legato al processo: se il leader termina il kernel lo rilascia
+    e uno degli altri worker, che riprova periodicamente, ne prende il posto.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: int | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None or fcntl is None
+
+    def try_acquire(self) -> bool:
+        """Prova a diventare leader senza bloccare.
+
+        Returns:
+            bool: True se il processo corrente è (o è appena diventato) leader.
+        """
+        if self.is_leader:
+            return True
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info("Worker %d elected broker leader (%s)", os.getpid(), self.path)
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    async def run_when_elected(self, fn: Callable[[], Awaitable[object]], interval: float | None = None) -> None:
+        """Attende di diventare leader (riprovando ogni interval secondi) e poi esegue fn.
+
+        Args:
+            fn (Callable[[], Awaitable]): Coroutine da avviare una volta eletti (es. i consumer del broker).
+            interval (float | None): Intervallo tra i tentativi (default: settings.LEADER_RETRY_INTERVAL).
+        """
+        interval = interval or settings.LEADER_RETRY_INTERVAL
+        while not self.try_acquire():
+            await asyncio.sleep(interval)
+        await fn()
+
+
+leader = LeaderLock(settings.LEADER_LOCK_PATH)
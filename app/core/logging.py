@@ -1,14 +1,143 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
 
+import orjson
 
-def setup_logging(level: int | str = "INFO") -> None:
-    logging.basicConfig(
-        level=level,
-        stream=sys.stdout,
-        format="%(asctime)s %(levelname)s %(name)s - %(message)s",
-    )
+from app.core.config import settings
+
+# Contesto della richiesta corrente, impostato da RequestContextMiddleware e aggiunto a ogni record di log
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+request_scope_var: ContextVar[dict | None] = ContextVar("request_scope", default=None)
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def current_route() -> str | None:
+    """Restituisce il path template della route corrente (es. /api/v1/schools/{school_id}), o il path grezzo
+    se il routing non è ancora avvenuto."""
+    scope = request_scope_var.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path")
+
+
+class RequestContextFilter(logging.Filter):
+    """Aggiunge request_id e route al record. Gira sul thread chiamante, dove i contextvars sono visibili."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.route = current_route()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Campiona i record sotto WARNING dei logger configurati.
+
+    Args:
+        rates (dict[str, float]): Prefisso del nome del logger -> frazione di record da tenere (0.0 - 1.0).
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Prefissi più lunghi prima, così la regola più specifica vince
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatter JSON compatto (una riga per record) con il contesto della richiesta."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in ("request_id", "route", "latency_ms", "status"):
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(payload).decode()
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler che rimanda al thread del listener la formattazione (eccezioni comprese)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Risolvo subito gli argomenti: potrebbero cambiare prima che il listener li formatti
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level: int | str | None = None) -> None:
+    """Configura il logging asincrono: i record vengono accodati e scritti su stdout da un thread dedicato.
+
+    Può essere chiamata più volte: dopo la prima aggiorna solo il livello.
+
+    Args:
+        level (int | str | None): Livello del root logger (default: settings.LOG_LEVEL).
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level or settings.LOG_LEVEL)
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] - %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+    queue_handler.addFilter(RequestContextFilter())
+
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Ferma il thread di scrittura dopo aver svuotato la coda."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def get_logger(name: str) -> logging.Logger:
     return logging.getLogger(name)
+
+
+def log_request(logger: logging.Logger, method: str, path: str, status: int, started: float) -> None:
+    """Emette la riga di access log con latenza e stato della richiesta."""
+    if logger.isEnabledFor(logging.INFO):
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info("%s %s %s", method, path, status, extra={"latency_ms": latency_ms, "status": status})
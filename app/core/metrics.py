@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Iterable
+
+# Bucket di default per le latenze (secondi)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contatore monotono con etichette opzionali."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Istogramma a bucket fissi. observe() costa una bisect e tre incrementi."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [conteggi per bucket (non cumulativi, l'ultimo è +Inf), somma, conteggio]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, labels: tuple = ()) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+class GaugeCallback:
+    """Gauge letto al momento dell'esportazione tramite una funzione (es. lo stato del pool)."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str],
+                 collect: Callable[[], dict[tuple, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect().items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class CounterCallback(GaugeCallback):
+    """Contatore monotono letto al momento dell'esportazione (es. i totali mantenuti dal pool)."""
+
+    type_name = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | GaugeCallback] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self, snapshots: Iterable[dict[str, list[str]]] | None = None) -> str:
+        """Esporta tutte le metriche nel formato testuale di Prometheus (versione 0.0.4).
+
+        Args:
+            snapshots (Iterable[dict[str, list[str]]] | None): Campioni per metrica di più processi
+                (vedi write_snapshot); se None vengono esportati quelli del processo corrente.
+        """
+        snapshots = list(snapshots) if snapshots is not None else None
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            if snapshots is None:
+                lines.extend(metric.samples())
+            else:
+                for snapshot in snapshots:
+                    lines.extend(snapshot.get(metric.name, ()))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, worker: str) -> dict[str, list[str]]:
+        """Campioni attuali per metrica, con l'etichetta worker aggiunta a ogni serie."""
+        label = f'worker="{_escape(worker)}"'
+        return {name: [_add_label(sample, label) for sample in metric.samples()]
+                for name, metric in self._metrics.items()}
+
+
+def _add_label(sample: str, label: str) -> str:
+    series, value = sample.rsplit(" ", 1)
+    if series.endswith("}"):
+        return f"{series[:-1]},{label}}} {value}"
+    return f"{series}{{{label}}} {value}"
+
+
+# Con più worker gunicorn ogni processo ha il proprio registry: ognuno scrive periodicamente i propri campioni
+# in una cartella condivisa (settings.METRICS_MULTIPROC_DIR) e /metrics li esporta tutti, con l'etichetta worker
+def _snapshot_path(directory: str, pid: int) -> Path:
+    return Path(directory) / f"{pid}.json"
+
+
+def write_snapshot(directory: str, target: Registry | None = None) -> None:
+    """Scrive i campioni del processo corrente in directory/<pid>.json (sostituzione atomica)."""
+    pid = os.getpid()
+    path = _snapshot_path(directory, pid)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps((target or registry).snapshot(str(pid))))
+    os.replace(tmp, path)
+
+
+def remove_snapshot(directory: str, pid: int) -> None:
+    """Elimina i campioni di un worker terminato, che altrimenti resterebbero esportati."""
+    _snapshot_path(directory, pid).unlink(missing_ok=True)
+
+
+async def write_snapshots(directory: str, interval: float) -> None:
+    """Scrive i campioni del processo ogni interval secondi, finché il task non viene cancellato.
+
+    Senza directory (un solo worker) termina subito: /metrics esporta direttamente il registry del processo.
+    """
+    while directory:
+        try:
+            write_snapshot(directory)
+        except OSError:
+            pass
+        await asyncio.sleep(interval)
+
+
+def render_multiprocess(directory: str, target: Registry | None = None) -> str:
+    """Esporta le metriche di tutti i worker: quelle del processo corrente aggiornate, le altre all'ultima scrittura."""
+    target = target or registry
+    write_snapshot(directory, target)
+    snapshots = []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            # Worker appena terminato o file in sostituzione: i suoi campioni tornano alla prossima scrittura
+            continue
+    return target.render(snapshots)
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "Latenza delle richieste HTTP per route.", ("method", "route", "status")))
+DB_STATEMENTS_PER_REQUEST = registry.register(Histogram(
+    "db_statements_per_request", "Statement SQL eseguiti per richiesta HTTP.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)))
+DB_TIME_PER_REQUEST = registry.register(Histogram(
+    "db_time_per_request_seconds", "Tempo speso nel database per richiesta HTTP.", ("route",)))
+DB_STATEMENT_DURATION = registry.register(Histogram(
+    "db_statement_duration_seconds", "Durata dei singoli statement SQL."))
+BROKER_PUBLISHED = registry.register(Counter(
+    "broker_messages_published_total", "Messaggi pubblicati su RabbitMQ.", ("exchange",)))
+BROKER_CONSUMED = registry.register(Counter(
+    "broker_messages_consumed_total", "Messaggi ricevuti da RabbitMQ.", ("exchange",)))
+ADMISSION_REJECTED = registry.register(Counter(
+    "admission_rejected_total", "Richieste scartate dall'admission control (503).", ("class",)))
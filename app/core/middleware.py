@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import deque
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.deadline import DEADLINE_HEADER, parse_budget_header, remaining, reset_deadline, set_deadline
+from app.core.logging import get_logger, log_request, request_id_var, request_scope_var
+from app.db import session
+from app.db.instrumentation import check_query_stats, start_query_stats, stop_query_stats
+
+_DEADLINE_HEADER_KEY = DEADLINE_HEADER.lower().encode("latin-1")
+_REQUEST_ID_HEADER_KEY = b"x-request-id"
+
+logger = get_logger(__name__)
+access_logger = get_logger("app.access")
+
+
+class RequestContextMiddleware:
+    """Middleware ASGI che assegna un request id alla richiesta, lo rende disponibile ai log
+    e scrive la riga di access log con la latenza."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request_id = None
+        for key, value in scope["headers"]:
+            if key == _REQUEST_ID_HEADER_KEY:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []),
+                                      (_REQUEST_ID_HEADER_KEY, request_id.encode("latin-1"))]
+            await send(message)
+
+        id_token = request_id_var.set(request_id)
+        scope_token = request_scope_var.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            log_request(access_logger, scope["method"], scope["path"], status, started)
+            request_scope_var.reset(scope_token)
+            request_id_var.reset(id_token)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI che registra latenza, numero di statement SQL e tempo DB per route."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats, token = start_query_stats()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop_query_stats(token)
+            # Uso il path template della route per non avere una serie per ogni id
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, (scope["method"], route, status))
+            metrics.DB_STATEMENTS_PER_REQUEST.observe(stats.count, (route,))
+            metrics.DB_TIME_PER_REQUEST.observe(stats.duration, (route,))
+            check_query_stats(stats, route)
+
+
+class DeadlineMiddleware:
+    """Middleware ASGI che imposta la scadenza della richiesta corrente.
+
+    La scadenza arriva dall'header DEADLINE_HEADER del chiamante oppure da settings.REQUEST_DEFAULT_BUDGET_MS,
+    e viene usata da send_request per limitare i timeout e propagare il budget residuo ai servizi a valle.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = None
+        for key, value in scope["headers"]:
+            if key == _DEADLINE_HEADER_KEY:
+                budget = parse_budget_header(value.decode("latin-1"))
+                break
+
+        if budget is None and settings.REQUEST_DEFAULT_BUDGET_MS > 0:
+            budget = settings.REQUEST_DEFAULT_BUDGET_MS / 1000
+
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        if budget <= 0:
+            # Il chiamante ha già rinunciato: inutile iniziare il lavoro
+            await _send_json(send, 504, b'{"message":"Gateway Timeout","details":{"message":"Deadline exceeded"}}')
+            return
+
+        token = set_deadline(budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
+
+
+class ReadYourWritesMiddleware:
+    """Middleware ASGI che marca il client dopo una scrittura andata a buon fine.
+
+    Imposta cookie e header con l'istante della scrittura: per settings.READ_YOUR_WRITES_SECONDS
+    le letture del client vengono servite dal primario invece che dalla replica (vedi get_read_db).
+    """
+
+    WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+    def __init__(self, app: ASGIApp, cookie_name: str, header_name: str):
+        self.app = app
+        self.cookie_name = cookie_name
+        self.header_name = header_name.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in self.WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                now = f"{time.time():.3f}"
+                cookie = (f"{self.cookie_name}={now}; Max-Age={int(settings.READ_YOUR_WRITES_SECONDS)}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = [*message.get("headers", []),
+                                      (b"set-cookie", cookie.encode("latin-1")),
+                                      (self.header_name, now.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class ConcurrencyLimiter:
+    """Limita le richieste concorrenti di una classe, con una coda FIFO di attesa limitata."""
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float, queue: bool = True) -> bool:
+        """Prova a ottenere uno slot, attendendo in coda al massimo timeout secondi.
+
+        Args:
+            timeout (float): Attesa massima in coda.
+            queue (bool): Se False, non entra in coda quando i posti sono esauriti.
+
+        Returns:
+            bool: True se lo slot è stato ottenuto (va poi restituito con release()).
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if not queue or len(self._waiters) >= self.max_queue or timeout <= 0:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            # Lo slot può essere stato ceduto proprio mentre scadeva il timeout
+            return waiter.done() and not waiter.cancelled()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        # Lo slot passa direttamente al primo in coda, senza decrementare active
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+_ADMISSION_BYPASS_PATHS = {"/health", "/ready", "/metrics", "/docs", "/redoc", "/openapi.json"}
+
+
+def request_class(method: str, path: str) -> str | None:
+    """Classifica la richiesta per l'admission control.
+
+    Returns:
+        str | None: "detail" (lettura per chiave, economica), "list" (liste e ricerche, costose),
+        "write" oppure None per le route che non vanno mai limitate (health, metriche, docs).
+    """
+    if path in _ADMISSION_BYPASS_PATHS:
+        return None
+    if method not in ("GET", "HEAD"):
+        return "write"
+    last_segment = path.rstrip("/").rsplit("/", 1)[-1]
+    if last_segment.isdigit() or "/zipcode/" in path:
+        return "detail"
+    return "list"
+
+
+def _pool_exhausted() -> bool:
+    # Tutte le connessioni in uso o checkout già in coda nel pool: un checkout normale, anche mentre
+    # apre una nuova connessione, non è contesa e non deve far scartare le liste
+    pool = session.engine.sync_engine.pool
+    return isinstance(pool, session.TimedQueuePool) and (pool.waiting > 0 or pool.exhausted())
+
+
+def admission_limiters(limits: dict[str, int] | None = None,
+                       max_queue: int | None = None) -> dict[str, ConcurrencyLimiter]:
+    """Crea i limiter per classe dell'admission control.
+
+    Args:
+        limits (dict[str, int] | None): Richieste in corso ammesse per classe (default: derivate dalla
+            capacità del pool e dalle impostazioni ADMISSION_*_CONCURRENCY).
+        max_queue (int | None): Richieste in coda ammesse per classe (default: settings.ADMISSION_MAX_QUEUE).
+
+    Returns:
+        dict[str, ConcurrencyLimiter]: Limiter per classe (detail, list, write).
+    """
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    limits = limits or {
+        "detail": settings.ADMISSION_DETAIL_CONCURRENCY or capacity,
+        "list": settings.ADMISSION_LIST_CONCURRENCY or max(capacity // 2, 1),
+        "write": settings.ADMISSION_WRITE_CONCURRENCY or max(capacity // 4, 1),
+    }
+    max_queue = settings.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+    return {name: ConcurrencyLimiter(limit, max_queue) for name, limit in limits.items()}
+
+
+def register_admission_metrics(limiters: dict[str, ConcurrencyLimiter]) -> None:
+    """Esporta richieste in corso e in coda dei limiter indicati; da chiamare una volta, per quelli dell'app."""
+    metrics.registry.register(metrics.GaugeCallback(
+        "admission_in_flight", "Richieste in corso per classe di admission control.", ("class",),
+        lambda: {(name,): limiter.active for name, limiter in limiters.items()}))
+    metrics.registry.register(metrics.GaugeCallback(
+        "admission_queued", "Richieste in coda per classe di admission control.", ("class",),
+        lambda: {(name,): limiter.queued for name, limiter in limiters.items()}))
+
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI che limita la concorrenza per classe di route e scarta il carico in eccesso.
+
+    Ogni classe (detail, list, write) ha un numero massimo di richieste in corso e una coda limitata:
+    oltre la coda, o dopo settings.ADMISSION_QUEUE_TIMEOUT in attesa, la richiesta riceve subito un 503
+    con Retry-After invece di accodarsi in get_db fino al timeout del pool. I limiti di default derivano
+    dalla capacità del pool (DB_POOL_SIZE + DB_MAX_OVERFLOW): le letture per id ne hanno a disposizione
+    tutta, le liste metà, così una raffica di liste non blocca le richieste economiche.
+    Con il pool esaurito (tutte le connessioni in uso) le liste oltre il limite vengono scartate senza accodarle.
+
+    Il middleware non registra metriche: l'app passa i limiter già esportati con register_admission_metrics().
+    """
+
+    def __init__(self, app: ASGIApp, limits: dict[str, int] | None = None, max_queue: int | None = None,
+                 limiters: dict[str, ConcurrencyLimiter] | None = None):
+        self.app = app
+        self.limiters = limiters if limiters is not None else admission_limiters(limits, max_queue)
+        self.retry_after = str(settings.ADMISSION_RETRY_AFTER).encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        name = request_class(scope["method"], scope["path"])
+        limiter = self.limiters.get(name)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT
+        budget = remaining()
+        if budget is not None:
+            timeout = min(timeout, budget)
+        queue = not (name == "list" and _pool_exhausted())
+
+        if not await limiter.acquire(timeout, queue=queue):
+            metrics.ADMISSION_REJECTED.inc((name,))
+            logger.warning("Load shedding %s %s (class %s: %d in flight, %d queued)",
+                           scope["method"], scope["path"], name, limiter.active, limiter.queued)
+            await _send_json(send, 503,
+                             b'{"message":"Service Unavailable","details":{"message":"Server overloaded, retry later"}}',
+                             [(b"retry-after", self.retry_after)])
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+async def _send_json(send: Send, status: int, body: bytes, headers: list[tuple[bytes, bytes]] | None = None) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            *(headers or []),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
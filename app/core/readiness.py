@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import time
+from typing import Awaitable, Callable
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class CachedCheck:
+    """Controllo di readiness il cui esito viene riutilizzato per ttl secondi.
+
+    Così le probe frequenti (kubelet, load balancer) non generano una query per ogni chiamata.
+    """
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.ok = False
+        self.error: str | None = None
+        self.checked_at = float("-inf")
+
+    async def run(self, check: Callable[[], Awaitable[object]]) -> bool:
+        """Esegue check se l'esito in cache è scaduto.
+
+        Args:
+            check (Callable[[], Awaitable]): Coroutine che solleva un'eccezione se la dipendenza non è disponibile.
+
+        Returns:
+            bool: True se la dipendenza è disponibile.
+        """
+        now = time.monotonic()
+        if now - self.checked_at < self.ttl:
+            return self.ok
+
+        self.checked_at = now
+        try:
+            await check()
+            self.ok, self.error = True, None
+        except Exception as e:
+            if self.ok or self.error is None:
+                logger.warning("Readiness check '%s' failed: %s", self.name, e)
+            self.ok, self.error = False, str(e)
+        return self.ok
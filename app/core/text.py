@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+
+# Apostrofi tipografici, trattini e punteggiatura vengono trattati come separatori:
+# "Sant'Anna", "Sant’Anna" e "Sant Anna" hanno la stessa forma normalizzata
+_SEPARATORS = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def fold(value: str | None) -> str:
+    """Forma normalizzata di un nome per la ricerca: senza accenti, minuscola, spazi compattati.
+
+    Esempi: "Forlì" -> "forli", "Città di Castello" -> "citta di castello", "Sant'Anna" -> "sant anna".
+
+    Args:
+        value (str | None): Testo da normalizzare.
+
+    Returns:
+        str: Testo normalizzato (stringa vuota per None).
+    """
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _SEPARATORS.sub(" ", stripped.casefold()).strip()
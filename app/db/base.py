@@ -8,3 +8,7 @@ def import_models():
     from app.models import Scuola
     from app.models import Indirizzo
     from app.models import Materia
+    from app.models import ScuolaSearch
+    from app.models import CatalogChange
+    from app.models import CatalogStat
+    from app.models import CatalogVersion
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class QueryStats:
+    """Statement SQL eseguiti nel contesto corrente (tipicamente una richiesta HTTP).
+
+    Attributes:
+        count (int): Numero di statement eseguiti.
+        duration (float): Tempo totale passato nel database, in secondi.
+        statements (dict[str, int]): Quante volte è stato eseguito ciascun testo SQL (per rilevare gli N+1).
+    """
+    count: int = 0
+    duration: float = 0.0
+    statements: dict[str, int] = field(default_factory=dict)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+
+_request_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+# Raccoglitori aggiuntivi attivi (es. assert_max_queries nei test), indipendenti da quello della richiesta
+_collectors: ContextVar[tuple[QueryStats, ...]] = ContextVar("query_collectors", default=())
+
+
+def start_query_stats() -> tuple[QueryStats, Token]:
+    """Inizia a raccogliere le statistiche SQL per il contesto corrente."""
+    stats = QueryStats()
+    return stats, _request_stats.set(stats)
+
+
+def stop_query_stats(token: Token) -> None:
+    _request_stats.reset(token)
+
+
+def current_query_stats() -> QueryStats | None:
+    return _request_stats.get()
+
+
+def parameters_shape(parameters) -> str:
+    """Descrive i parametri di uno statement senza riportarne i valori (es. {'id_1': 'int'})."""
+    if isinstance(parameters, dict):
+        return str({key: type(value).__name__ for key, value in parameters.items()})
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"{len(parameters)} x {parameters_shape(parameters[0])}"
+        return str([type(value).__name__ for value in parameters])
+    return type(parameters).__name__
+
+
+def check_query_stats(stats: QueryStats, route: str) -> None:
+    """Segnala le richieste oltre il budget di query e i probabili N+1 (stesso SQL ripetuto molte volte)."""
+    budget = settings.QUERY_BUDGET_PER_REQUEST
+    if budget and stats.count > budget:
+        logger.warning("Query budget exceeded on %s: %d statements (budget %d, %.1fms in DB)",
+                       route, stats.count, budget, stats.duration * 1000)
+
+    threshold = settings.N_PLUS_ONE_THRESHOLD
+    if threshold:
+        for statement, count in stats.statements.items():
+            if count >= threshold:
+                logger.warning("Possible N+1 on %s: statement executed %d times: %s", route, count, statement)
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryStats]:
+    """Raccoglie gli statement SQL eseguiti all'interno del blocco.
+
+    Example:
+        with capture_queries() as queries:
+            await client.get("/api/v1/schools/")
+        print(queries.count)
+    """
+    stats = QueryStats()
+    token = _collectors.set((*_collectors.get(), stats))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+@contextmanager
+def assert_max_queries(n: int) -> Iterator[QueryStats]:
+    """Helper per i test: fallisce se il blocco esegue più di n statement SQL.
+
+    Example:
+        with assert_max_queries(3):
+            await client.get("/api/v1/schools/")
+    """
+    with capture_queries() as stats:
+        yield stats
+    if stats.count > n:
+        executed = "\n".join(f"  {count} x {statement}" for statement, count in stats.statements.items())
+        raise AssertionError(f"Expected at most {n} queries, {stats.count} were executed:\n{executed}")
+
+
+# Listener registrati sulla classe Engine: valgono per ogni engine (primario, replica, test).
+# Con l'engine asincrono girano nel greenlet di SQLAlchemy, che condivide i contextvars del task chiamante.
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    metrics.DB_STATEMENT_DURATION.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for collector in _collectors.get():
+        collector.record(statement, elapsed)
+
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1fms): %s | params: %s", elapsed * 1000, statement,
+                       parameters_shape(parameters))
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def _pool_stat(stat: str):
+    def collect() -> dict[tuple, float]:
+        from app.db import session
+
+        values = {}
+        for name, target in (("primary", session.engine), ("replica", session.replica_engine)):
+            if target is not None:
+                stats = session.pool_stats(target)
+                if stat in stats:
+                    values[(name,)] = stats[stat]
+        return values
+
+    return collect
+
+
+for _field, _doc in (("checked_out", "Connessioni in uso."),
+                     ("checked_in", "Connessioni libere nel pool."),
+                     ("overflow", "Connessioni oltre pool_size (negativo finché il pool non è pieno)."),
+                     ("size", "Dimensione configurata del pool."),
+                     ("waiting", "Richieste in attesa di una connessione con il pool esaurito.")):
+    metrics.registry.register(metrics.GaugeCallback(f"db_pool_{_field}", _doc, ("engine",), _pool_stat(_field)))
+
+# Totali monotoni: il tasso di attese e il tempo medio si ricavano con rate() tra due scrape
+for _name, _field, _doc in (("db_pool_waits_total", "wait_count", "Checkout che hanno atteso con il pool esaurito."),
+                            ("db_pool_wait_seconds_total", "wait_seconds_total",
+                             "Tempo totale di attesa di una connessione con il pool esaurito.")):
+    metrics.registry.register(metrics.CounterCallback(_name, _doc, ("engine",), _pool_stat(_field)))
@@ -0,0 +1,41 @@
+"""versione catalogo
+
+Tabella catalog_version (una riga), incrementata al commit di ogni transazione che modifica il catalogo:
+serializza la scrittura di catalog_changes nell'ordine di commit. Parte dall'ultimo seq già registrato.
+
+Revision ID: 3b7f9c2d4e61
+Revises: e83a5d21c9b6
+Create Date: 2026-10-19 19:20:37.418206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7f9c2d4e61'
+down_revision: Union[str, Sequence[str], None] = 'e83a5d21c9b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'catalog_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute(
+        "INSERT INTO catalog_version (id, version, changed_at) "
+        "SELECT 1, COALESCE(MAX(seq), 0), MAX(changed_at) FROM catalog_changes"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('catalog_version')
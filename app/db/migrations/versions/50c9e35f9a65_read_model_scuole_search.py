@@ -0,0 +1,95 @@
+"""read model scuole_search
+
+Tabella denormalizzata per le liste di scuole (una riga per scuola con città e indirizzi di studio),
+popolata qui con i dati esistenti. In seguito è mantenuta da app.services.catalog_sync e può essere
+ricostruita con `python -m app.services.catalog_sync`. Gli indici compositi su scuole per tipo e città
+non servono più alle liste e vengono sostituiti dal solo indice su id_citta.
+
+Revision ID: 50c9e35f9a65
+Revises: 7129d683a1d3
+Create Date: 2026-10-19 11:40:27.502113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '50c9e35f9a65'
+down_revision: Union[str, Sequence[str], None] = '7129d683a1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    scuole_search = op.create_table(
+        'scuole_search',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('tipo', sa.String(), nullable=False),
+        sa.Column('descrizione', sa.String(), nullable=True),
+        sa.Column('indirizzo', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('telefono', sa.String(), nullable=False),
+        sa.Column('sito_web', sa.String(), nullable=True),
+        sa.Column('id_citta', sa.Integer(), nullable=False),
+        sa.Column('citta_nome', sa.String(), nullable=False),
+        sa.Column('provincia', sa.String(), nullable=False),
+        sa.Column('codice_postale', sa.String(), nullable=False),
+        sa.Column('regione', sa.String(), nullable=False),
+        sa.Column('indirizzi', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scuole_search_nome'), 'scuole_search', ['nome'], unique=False)
+    op.create_index('ix_scuole_search_tipo_nome', 'scuole_search', ['tipo', 'nome'], unique=False)
+    op.create_index('ix_scuole_search_citta_nome', 'scuole_search', ['citta_nome', 'nome'], unique=False)
+    op.create_index('ix_scuole_search_provincia_nome', 'scuole_search', ['provincia', 'nome'], unique=False)
+
+    # Le liste leggono da scuole_search: su scuole resta solo id_citta, usato per trovare le scuole di una città
+    op.drop_index('ix_scuole_tipo_nome', table_name='scuole')
+    op.drop_index('ix_scuole_id_citta_nome', table_name='scuole')
+    op.create_index(op.f('ix_scuole_id_citta'), 'scuole', ['id_citta'], unique=False)
+
+    # Backfill con SQL autonomo (senza importare i modelli, che nelle revisioni successive possono cambiare)
+    bind = op.get_bind()
+    materie = {}
+    for indirizzo_id, nome in bind.execute(sa.text(
+            "SELECT im.indirizzo_id, m.nome FROM indirizzi_materie_table im "
+            "JOIN materie m ON m.id = im.materia_id ORDER BY m.id")):
+        materie.setdefault(indirizzo_id, []).append(nome)
+
+    indirizzi = {}
+    for row in bind.execute(sa.text(
+            "SELECT id, nome, descrizione, id_scuola FROM indirizzi ORDER BY id")).mappings():
+        indirizzi.setdefault(row["id_scuola"], []).append({
+            "id": row["id"], "nome": row["nome"], "descrizione": row["descrizione"],
+            "materie": materie.get(row["id"], []),
+        })
+
+    schools = bind.execute(sa.text(
+        "SELECT s.id, s.nome, s.tipo, s.descrizione, s.indirizzo, s.email, s.telefono, s.sito_web, s.id_citta, "
+        "s.created_at, s.updated_at, c.nome AS citta_nome, c.provincia, c.codice_postale, c.regione "
+        "FROM scuole s JOIN citta c ON c.id = s.id_citta"
+    ).columns(created_at=sa.DateTime(timezone=True), updated_at=sa.DateTime(timezone=True))).mappings().all()
+    rows = [{**school, "indirizzi": indirizzi.get(school["id"], [])} for school in schools]
+    for start in range(0, len(rows), CHUNK):
+        op.bulk_insert(scuole_search, rows[start:start + CHUNK])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_scuole_id_citta'), table_name='scuole')
+    op.create_index('ix_scuole_id_citta_nome', 'scuole', ['id_citta', 'nome'], unique=False)
+    op.create_index('ix_scuole_tipo_nome', 'scuole', ['tipo', 'nome'], unique=False)
+    op.drop_index('ix_scuole_search_provincia_nome', table_name='scuole_search')
+    op.drop_index('ix_scuole_search_citta_nome', table_name='scuole_search')
+    op.drop_index('ix_scuole_search_tipo_nome', table_name='scuole_search')
+    op.drop_index(op.f('ix_scuole_search_nome'), table_name='scuole_search')
+    op.drop_table('scuole_search')
@@ -0,0 +1,32 @@
+"""indici per filtri materia e regione
+
+Revision ID: 5cbd2595a837
+Revises: 50c9e35f9a65
+Create Date: 2026-10-19 13:05:51.664019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5cbd2595a837'
+down_revision: Union[str, Sequence[str], None] = '50c9e35f9a65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # La PK (indirizzo_id, materia_id) non aiuta le ricerche per materia
+    op.create_index(op.f('ix_indirizzi_materie_table_materia_id'), 'indirizzi_materie_table', ['materia_id'],
+                    unique=False)
+    op.create_index('ix_scuole_search_regione_nome', 'scuole_search', ['regione', 'nome'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_scuole_search_regione_nome', table_name='scuole_search')
+    op.drop_index(op.f('ix_indirizzi_materie_table_materia_id'), table_name='indirizzi_materie_table')
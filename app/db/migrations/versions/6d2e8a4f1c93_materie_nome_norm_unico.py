@@ -0,0 +1,75 @@
+"""materie nome_norm unico
+
+Rende unico materie.nome_norm, così le materie create per nome da richieste concorrenti (POST/PUT
+/schools/{id}/full) non vengono duplicate. Le materie già duplicate vengono unite nella più vecchia: i loro
+collegamenti agli indirizzi passano a quest'ultima e le copie vengono eliminate, registrando le modifiche in
+catalog_changes. Se sono state unite delle materie, dopo la migrazione vanno ricalcolati i read model:
+    python -m app.services.catalog_sync && python -m app.services.stats
+
+Revision ID: 6d2e8a4f1c93
+Revises: 3b7f9c2d4e61
+Create Date: 2026-10-19 21:05:48.120394
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2e8a4f1c93'
+down_revision: Union[str, Sequence[str], None] = '3b7f9c2d4e61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _merge_duplicates(bind) -> None:
+    kept: dict[str, int] = {}
+    merged: dict[int, int] = {}  # materia duplicata -> materia più vecchia con lo stesso nome_norm
+    for materia_id, nome_norm in bind.execute(sa.text("SELECT id, nome_norm FROM materie ORDER BY id")):
+        if nome_norm in kept:
+            merged[materia_id] = kept[nome_norm]
+        else:
+            kept[nome_norm] = materia_id
+    if not merged:
+        return
+
+    links = bind.execute(sa.text("SELECT indirizzo_id, materia_id FROM indirizzi_materie_table")).all()
+    existing = {(indirizzo_id, materia_id) for indirizzo_id, materia_id in links}
+    moved = {(indirizzo_id, merged[materia_id]) for indirizzo_id, materia_id in links if materia_id in merged}
+    indirizzi = sorted({indirizzo_id for indirizzo_id, materia_id in links if materia_id in merged})
+    params = [{"id": materia_id} for materia_id in merged]
+    bind.execute(sa.text("DELETE FROM indirizzi_materie_table WHERE materia_id = :id"), params)
+    new_links = sorted(moved - existing)
+    if new_links:
+        bind.execute(
+            sa.text("INSERT INTO indirizzi_materie_table (indirizzo_id, materia_id) VALUES (:indirizzo_id, :materia_id)"),
+            [{"indirizzo_id": indirizzo_id, "materia_id": materia_id} for indirizzo_id, materia_id in new_links],
+        )
+    bind.execute(sa.text("DELETE FROM materie WHERE id = :id"), params)
+
+    now = datetime.now(timezone.utc)
+    changes = ([{"entity": "materia", "entity_id": materia_id, "deleted": True} for materia_id in merged]
+               + [{"entity": "indirizzo", "entity_id": indirizzo_id, "deleted": False} for indirizzo_id in indirizzi])
+    bind.execute(
+        sa.text("INSERT INTO catalog_changes (entity, entity_id, deleted, changed_at) "
+                "VALUES (:entity, :entity_id, :deleted, :changed_at)"),
+        [{**change, "changed_at": now} for change in changes],
+    )
+    bind.execute(sa.text("UPDATE catalog_version SET version = version + 1, changed_at = :now WHERE id = 1"),
+                 {"now": now})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _merge_duplicates(op.get_bind())
+    op.drop_index(op.f('ix_materie_nome_norm'), table_name='materie')
+    op.create_index(op.f('ix_materie_nome_norm'), 'materie', ['nome_norm'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_materie_nome_norm'), table_name='materie')
+    op.create_index(op.f('ix_materie_nome_norm'), 'materie', ['nome_norm'], unique=False)
@@ -0,0 +1,49 @@
+"""indici scuole allineati alle query
+
+Rimuove gli indici di scuole che nessuna query usa (email, telefono, sito_web, indirizzo: quest'ultimo
+è filtrato solo con ILIKE '%...%') e aggiunge gli indici composti per i filtri di get_schools
+con ordinamento per nome, più l'indice sulla FK indirizzi.id_scuola usata dal caricamento degli indirizzi.
+
+Revision ID: 7129d683a1d3
+Revises: cc77d72cace4
+Create Date: 2026-10-19 10:12:04.318221
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7129d683a1d3'
+down_revision: Union[str, Sequence[str], None] = 'cc77d72cace4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index(op.f('ix_scuole_email'), table_name='scuole')
+    op.drop_index(op.f('ix_scuole_telefono'), table_name='scuole')
+    op.drop_index(op.f('ix_scuole_sito_web'), table_name='scuole')
+    op.drop_index(op.f('ix_scuole_indirizzo'), table_name='scuole')
+    # Sostituito da ix_scuole_tipo_nome, che ha tipo come prefisso
+    op.drop_index(op.f('ix_scuole_tipo'), table_name='scuole')
+
+    op.create_index('ix_scuole_tipo_nome', 'scuole', ['tipo', 'nome'], unique=False)
+    op.create_index('ix_scuole_id_citta_nome', 'scuole', ['id_citta', 'nome'], unique=False)
+    op.create_index(op.f('ix_indirizzi_id_scuola'), 'indirizzi', ['id_scuola'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_indirizzi_id_scuola'), table_name='indirizzi')
+    op.drop_index('ix_scuole_id_citta_nome', table_name='scuole')
+    op.drop_index('ix_scuole_tipo_nome', table_name='scuole')
+
+    op.create_index(op.f('ix_scuole_tipo'), 'scuole', ['tipo'], unique=False)
+    op.create_index(op.f('ix_scuole_indirizzo'), 'scuole', ['indirizzo'], unique=False)
+    op.create_index(op.f('ix_scuole_sito_web'), 'scuole', ['sito_web'], unique=False)
+    op.create_index(op.f('ix_scuole_telefono'), 'scuole', ['telefono'], unique=False)
+    op.create_index(op.f('ix_scuole_email'), 'scuole', ['email'], unique=False)
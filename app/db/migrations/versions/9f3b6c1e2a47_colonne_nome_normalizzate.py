@@ -0,0 +1,82 @@
+"""colonne nome normalizzate
+
+Aggiunge nome_norm (nome senza accenti, in minuscolo, punteggiatura come spazio) a scuole, citta e
+materie, e nome_norm/citta_nome_norm a scuole_search, con i relativi indici e il backfill dei dati esistenti.
+
+Revision ID: 9f3b6c1e2a47
+Revises: 5cbd2595a837
+Create Date: 2026-10-19 14:20:12.318442
+
+"""
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f3b6c1e2a47'
+down_revision: Union[str, Sequence[str], None] = '5cbd2595a837'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK = 1000
+TABLES = ('scuole', 'citta', 'materie')
+
+_SEPARATORS = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def fold(value):
+    """Copia di app.core.text.fold al momento della revisione (la migrazione non importa l'app)."""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _SEPARATORS.sub(" ", stripped.casefold()).strip()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    for table in TABLES:
+        op.add_column(table, sa.Column('nome_norm', sa.String(), server_default='', nullable=False))
+        rows = bind.execute(sa.text(f"SELECT id, nome FROM {table}")).all()
+        update = sa.text(f"UPDATE {table} SET nome_norm = :nome_norm WHERE id = :id")
+        for start in range(0, len(rows), CHUNK):
+            bind.execute(update, [{"id": id_, "nome_norm": fold(nome)} for id_, nome in rows[start:start + CHUNK]])
+        # Il default serviva solo per le righe esistenti: d'ora in poi lo valorizzano i modelli
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('nome_norm', server_default=None)
+        op.create_index(op.f(f'ix_{table}_nome_norm'), table, ['nome_norm'], unique=False)
+
+    # scuole_search è derivata: basta copiare i valori appena calcolati
+    op.add_column('scuole_search', sa.Column('nome_norm', sa.String(), server_default='', nullable=False))
+    op.add_column('scuole_search', sa.Column('citta_nome_norm', sa.String(), server_default='', nullable=False))
+    op.execute(
+        "UPDATE scuole_search SET "
+        "nome_norm = (SELECT s.nome_norm FROM scuole s WHERE s.id = scuole_search.id), "
+        "citta_nome_norm = (SELECT c.nome_norm FROM citta c WHERE c.id = scuole_search.id_citta)"
+    )
+    with op.batch_alter_table('scuole_search') as batch_op:
+        batch_op.alter_column('nome_norm', server_default=None)
+        batch_op.alter_column('citta_nome_norm', server_default=None)
+    op.create_index(op.f('ix_scuole_search_nome_norm'), 'scuole_search', ['nome_norm'], unique=False)
+    op.drop_index('ix_scuole_search_citta_nome', table_name='scuole_search')
+    op.create_index('ix_scuole_search_citta_nome_norm_nome', 'scuole_search', ['citta_nome_norm', 'nome'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_scuole_search_citta_nome_norm_nome', table_name='scuole_search')
+    op.create_index('ix_scuole_search_citta_nome', 'scuole_search', ['citta_nome', 'nome'], unique=False)
+    op.drop_index(op.f('ix_scuole_search_nome_norm'), table_name='scuole_search')
+    with op.batch_alter_table('scuole_search') as batch_op:
+        batch_op.drop_column('citta_nome_norm')
+        batch_op.drop_column('nome_norm')
+    for table in reversed(TABLES):
+        op.drop_index(op.f(f'ix_{table}_nome_norm'), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('nome_norm')
@@ -0,0 +1,54 @@
+"""log modifiche catalogo
+
+Tabella catalog_changes per GET /changes. Le entità già presenti vengono registrate come modificate
+adesso, così un client che parte da since=0 riceve tutto il catalogo.
+
+Revision ID: c41d8e0b7f25
+Revises: 9f3b6c1e2a47
+Create Date: 2026-10-19 15:02:44.870311
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d8e0b7f25'
+down_revision: Union[str, Sequence[str], None] = '9f3b6c1e2a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK = 1000
+ENTITIES = (('citta', 'citta'), ('materia', 'materie'), ('scuola', 'scuole'), ('indirizzo', 'indirizzi'))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    catalog_changes = op.create_table(
+        'catalog_changes',
+        sa.Column('seq', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('entity', sa.String(), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Boolean(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True,
+    )
+
+    bind = op.get_bind()
+    now = datetime.now(timezone.utc)
+    for entity, table in ENTITIES:
+        ids = bind.execute(sa.text(f"SELECT id FROM {table} ORDER BY id")).scalars().all()
+        for start in range(0, len(ids), CHUNK):
+            op.bulk_insert(catalog_changes, [
+                {"entity": entity, "entity_id": id_, "deleted": False, "changed_at": now}
+                for id_ in ids[start:start + CHUNK]
+            ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('catalog_changes')
@@ -0,0 +1,60 @@
+"""statistiche catalogo
+
+Tabella catalog_stats per GET /stats, calcolata dalle righe già presenti in scuole_search.
+
+Revision ID: e83a5d21c9b6
+Revises: c41d8e0b7f25
+Create Date: 2026-10-19 17:41:09.215630
+
+"""
+import json
+from collections import Counter
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e83a5d21c9b6'
+down_revision: Union[str, Sequence[str], None] = 'c41d8e0b7f25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    catalog_stats = op.create_table(
+        'catalog_stats',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('dimension', 'value'),
+    )
+
+    # Stessi conteggi di app.services.stats.count_rows al momento della revisione
+    counts = Counter()
+    bind = op.get_bind()
+    for regione, provincia, tipo, indirizzi in bind.execute(
+            sa.text("SELECT regione, provincia, tipo, indirizzi FROM scuole_search")):
+        if isinstance(indirizzi, str):
+            indirizzi = json.loads(indirizzi)
+        counts['totale', 'scuole'] += 1
+        counts['regione', regione] += 1
+        counts['provincia', provincia] += 1
+        counts['tipo', tipo] += 1
+        for indirizzo in indirizzi or []:
+            counts['totale', 'indirizzi'] += 1
+            for materia in set(indirizzo['materie']):
+                counts['materia', materia] += 1
+
+    rows = [{"dimension": d, "value": v, "total": t} for (d, v), t in sorted(counts.items())]
+    for start in range(0, len(rows), CHUNK):
+        op.bulk_insert(catalog_stats, rows[start:start + CHUNK])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('catalog_stats')
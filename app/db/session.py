@@ -1,23 +1,92 @@
+import time
 from typing import AsyncGenerator
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_database_url(url: str) -> str:
+    """Gestione URL database per aiosqlite e asyncpg."""
+    url = str(url).strip()
+    if "sqlite" in url and "aiosqlite" not in url:
+        url = url.replace("sqlite://", "sqlite+aiosqlite://")
+
+    url = url.replace("postgresql://", "postgresql+asyncpg://")
+    url = url.replace("postgres://", "postgresql+asyncpg://")
+    url = url.replace("postgresql+psycopg2://", "postgresql+asyncpg://")
+    return url
+
+
+database_url = normalize_database_url(settings.DATABASE_URL)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Pool che misura quanto le richieste attendono una connessione libera.
+
+    Conta solo le attese vere, cioè i checkout iniziati con tutte le connessioni (pool_size + max_overflow)
+    già in uso: il tempo di un checkout normale, compresa l'apertura di una nuova connessione, non è contesa.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0  # checkout in attesa di una connessione restituita da un'altra richiesta
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+
+    def exhausted(self) -> bool:
+        """True se tutte le connessioni consentite sono in uso (mai con max_overflow=-1, cioè senza limite)."""
+        return self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+
+    def _do_get(self):
+        if not self.exhausted():
+            return super()._do_get()
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        finally:
+            self.waiting -= 1
+            self.wait_count += 1
+            self.wait_seconds_total += time.perf_counter() - started
+
+
+def engine_options(url: str) -> dict:
+    """Costruisce le opzioni di create_async_engine in base al database e alle impostazioni SCHOOLS_DB_*."""
+    if "sqlite" in url:
+        return {"connect_args": {"check_same_thread": False}}
+
+    connect_args = {
+        # Cache dei prepared statement: quella di asyncpg e quella dell'adapter SQLAlchemy.
+        # Va messa a 0 se davanti al DB c'è pgbouncer in transaction mode.
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {"application_name": settings.SERVICE_NAME},
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["server_settings"]["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
 
-# Gestione URL database per aiosqlite e asyncpg
-database_url = str(settings.DATABASE_URL).strip()
-if "sqlite" in database_url and "aiosqlite" not in database_url:
-    database_url = database_url.replace("sqlite://", "sqlite+aiosqlite://")
-    
-database_url = database_url.replace("postgresql://", "postgresql+asyncpg://")
-database_url = database_url.replace("postgres://", "postgresql+asyncpg://")
-database_url = database_url.replace("postgresql+psycopg2://", "postgresql+asyncpg://")
 
 # Engine e Session asincroni
 engine = create_async_engine(
     database_url,
     future=True,
     echo=False,
-    connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
+    **engine_options(database_url)
 )
 
 AsyncSessionLocal = sessionmaker(
@@ -28,6 +97,86 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+
+# Replica in sola lettura (opzionale) per le route GET del catalogo
+replica_engine = None
+ReplicaSessionLocal = None
+if settings.DATABASE_REPLICA_URL:
+    replica_url = normalize_database_url(settings.DATABASE_REPLICA_URL)
+    replica_engine = create_async_engine(replica_url, future=True, echo=False, **engine_options(replica_url))
+    ReplicaSessionLocal = sessionmaker(
+        bind=replica_engine,
+        class_=AsyncSession,
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+# Ritardo della replica in secondi: 0 se ha applicato tutto il WAL ricevuto
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaHealth:
+    """Stato della replica, verificato al massimo ogni settings.REPLICA_LAG_CHECK_INTERVAL secondi."""
+
+    def __init__(self):
+        self.healthy = True
+        self.lag_seconds = 0.0
+        self.checked_at = float("-inf")
+
+    async def is_usable(self) -> bool:
+        """Restituisce True se la replica risponde e il suo ritardo è entro settings.REPLICA_MAX_LAG_SECONDS."""
+        if replica_engine is None:
+            return False
+        now = time.monotonic()
+        if now - self.checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return self.healthy
+
+        # Aggiorno subito il timestamp così le richieste concorrenti non ripetono il controllo
+        self.checked_at = now
+        try:
+            if replica_engine.dialect.name == "postgresql":
+                async with replica_engine.connect() as conn:
+                    self.lag_seconds = float(await conn.scalar(REPLICA_LAG_SQL) or 0)
+            self.healthy = self.lag_seconds <= settings.REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            logger.warning("Replica check failed, falling back to primary: %s", e)
+            self.healthy = False
+
+        if not self.healthy:
+            logger.warning("Replica not usable (lag %.1fs), reads go to primary", self.lag_seconds)
+        return self.healthy
+
+
+replica_health = ReplicaHealth()
+
+
+def pool_stats(target=None) -> dict[str, float]:
+    """Restituisce lo stato attuale del pool di connessioni.
+
+    Args:
+        target: Engine asincrono da ispezionare (default: engine principale).
+
+    Returns:
+        dict[str, float]: size, checked_out, checked_in, overflow e, se disponibili, i tempi di attesa.
+    """
+    pool = (target or engine).sync_engine.pool
+    stats = {}
+    for name, attr in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin"),
+                       ("overflow", "overflow")):
+        method = getattr(pool, attr, None)
+        if method is not None:
+            stats[name] = method()
+    if isinstance(pool, TimedQueuePool):
+        stats["waiting"] = pool.waiting
+        stats["wait_count"] = pool.wait_count
+        stats["wait_seconds_total"] = round(pool.wait_seconds_total, 6)
+    return stats
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as db:
         try:
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert_insert(db: AsyncSession, table):
+    """insert() del dialetto della sessione, che espone on_conflict_do_nothing/on_conflict_do_update.
+
+    Args:
+        db (AsyncSession): Sessione su cui verrà eseguito lo statement.
+        table: Modello o tabella di destinazione.
+
+    Returns:
+        Insert: Statement insert specifico di Postgres o sqlite.
+    """
+    dialect = db.get_bind().dialect.name
+    try:
+        return _INSERTS[dialect](table)
+    except KeyError:
+        raise NotImplementedError(f"Upsert not supported on {dialect}") from None
@@ -1,18 +1,27 @@
 from __future__ import annotations
 
-import sys
+import os
 import asyncio
 from contextlib import asynccontextmanager
 
 import sentry_sdk
-from fastapi import FastAPI, APIRouter
-from fastapi.responses import ORJSONResponse
-
-from app.api.v1.routes import school, citta, indirizzo, materia
+from fastapi import FastAPI, APIRouter, Depends
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import LAST_WRITE_COOKIE, LAST_WRITE_HEADER, get_db
+from app.api.v1.routes import school, citta, indirizzo, materia, changes, stats
+from app.core import metrics
 from app.core.config import settings
+from app.core.leader import leader
 from app.core.logging import setup_logging, get_logger
+from app.core.readiness import CachedCheck
+from app.core.middleware import (AdmissionControlMiddleware, DeadlineMiddleware, MetricsMiddleware,
+                                 ReadYourWritesMiddleware, RequestContextMiddleware, admission_limiters,
+                                 register_admission_metrics)
 from app.db.base import import_models
-from app.services import broker
+from app.services import broker, warmup
 
 import_models()  # Importo i modelli perché siano disponibili per le relazioni SQLAlchemy
 
@@ -23,14 +32,14 @@ sentry_sdk.init(
 )
 sentry_sdk.set_tag("service.name", settings.SERVICE_NAME)
 
-logger = None
+logger = get_logger(__name__)
 
 
 # RabbitMQ Broker
 async def callback(message):
     async with message.process():
-        print(
-            f"Received message from exchange '{message.exchange}' with routing key '{message.routing_key}': {message.body.decode()}")
+        logger.debug("Received message from exchange '%s' with routing key '%s': %s",
+                     message.exchange, message.routing_key, message.body)
 
 
 exchanges = {
@@ -38,36 +47,51 @@ exchanges = {
 }
 
 
+broker_supervisor = broker.BrokerSupervisor(exchanges)
+db_check = CachedCheck("database", settings.READINESS_CACHE_SECONDS)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     setup_logging()
-    logger = get_logger(__name__)
     logger.info(f"Starting {settings.SERVICE_NAME}...")
 
-    # Avvia il broker asincrono all'avvio dell'app
+    # Il broker viene gestito in background: l'app serve subito le richieste anche se RabbitMQ non risponde.
+    # Con più worker gunicorn solo il leader consuma dal broker; gli altri servono solo HTTP
+    # e riprovano a prendere il lock nel caso il leader termini.
+    broker_task = None
     if settings.ENVIRONMENT != "testing":
-        broker_instance = broker.AsyncBrokerSingleton()
-        
-        # Connect ritorna False se fallisce dopo tutti i retry
-        connected = await broker_instance.connect(
-            retries=settings.RABBITMQ_CONNECTION_RETRIES,
-            delay=settings.RABBITMQ_CONNECTION_RETRY_DELAY
-        )
-        
-        if not connected:
-            logger.error("Could not connect to RabbitMQ after multiple attempts. Exiting...")
-            sys.exit(1)
-        
-        logger.info("Connected to RabbitMQ.")
-        for exchange, cb in exchanges.items():
-            await broker_instance.subscribe(exchange, cb)
+        if not leader.try_acquire():
+            logger.info("Worker %d is not the broker leader, serving HTTP only", os.getpid())
+        broker_task = asyncio.create_task(leader.run_when_elected(broker_supervisor.run))
+
+    # Con più worker ognuno scrive periodicamente le proprie metriche, esportate insieme da /metrics
+    metrics_task = asyncio.create_task(
+        metrics.write_snapshots(settings.METRICS_MULTIPROC_DIR, settings.METRICS_SNAPSHOT_INTERVAL))
+
+    # Warm-up in background: /ready risponde 503 finché non è terminato
+    warmup_task = None
+    if settings.WARMUP_ENABLED and settings.ENVIRONMENT != "testing":
+        warmup_task = asyncio.create_task(warmup.warm_up())
+    else:
+        warmup.state.done = True
 
     yield
 
     logger.info(f"Shutting down {settings.SERVICE_NAME}...")
-    if settings.ENVIRONMENT != "testing":
-        await broker_instance.close()
-    logger.info("RabbitMQ connection closed.")
+    if warmup_task is not None:
+        warmup_task.cancel()
+    metrics_task.cancel()
+    if broker_task is not None:
+        broker_task.cancel()
+        try:
+            await broker_task
+        except asyncio.CancelledError:
+            pass
+    if settings.ENVIRONMENT != "testing" and leader.is_leader:
+        await broker.AsyncBrokerSingleton().close()
+        leader.release()
+        logger.info("RabbitMQ connection closed.")
 
 
 docs_url = None if settings.ENVIRONMENT == "production" else "/docs"
@@ -82,6 +106,18 @@ app = FastAPI(
     redoc_url=redoc_url,
 )
 
+if settings.ADMISSION_CONTROL_ENABLED:
+    # Limiter creati qui, una volta: le metriche admission_* descrivono quelli dell'app
+    limiters = admission_limiters()
+    register_admission_metrics(limiters)
+    # dentro DeadlineMiddleware: l'attesa in coda rispetta la scadenza
+    app.add_middleware(AdmissionControlMiddleware, limiters=limiters)
+app.add_middleware(DeadlineMiddleware)
+if settings.DATABASE_REPLICA_URL:
+    app.add_middleware(ReadYourWritesMiddleware, cookie_name=LAST_WRITE_COOKIE, header_name=LAST_WRITE_HEADER)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)  # aggiunto per ultimo: è il più esterno
+
 # Routers
 current_router = APIRouter()
 
@@ -108,9 +144,57 @@ current_router.include_router(
     tags=[settings.SERVICE_NAME, "materie"],
     router=materia.router,
 )
+
+current_router.include_router(
+    prefix="/changes",
+    tags=[settings.SERVICE_NAME, "changes"],
+    router=changes.router,
+)
+
+current_router.include_router(
+    prefix="/stats",
+    tags=[settings.SERVICE_NAME, "stats"],
+    router=stats.router,
+)
 app.include_router(current_router, prefix=settings.API_PREFIX)
 
 
 @app.get("/health", tags=["health"])
 def health():
     return {"status": "ok", "service": settings.SERVICE_NAME}
+
+
+@app.get("/ready", tags=["health"])
+async def ready(db: AsyncSession = Depends(get_db)):
+    """Readiness probe: il servizio è pronto se il warm-up è terminato e il database risponde.
+
+    Lo stato del broker viene riportato ma non blocca il traffico, perché le letture del catalogo non ne dipendono.
+    """
+    async def ping():
+        await db.execute(text("SELECT 1"))
+
+    database_ok = await db_check.run(ping)
+    if settings.ENVIRONMENT == "testing":
+        broker_state = "disabled"
+    elif not leader.is_leader:
+        broker_state = "follower"
+    else:
+        broker_state = broker_supervisor.state
+
+    is_ready = database_ok and warmup.state.done
+    body = {
+        "status": "ready" if is_ready else "not_ready",
+        "database": "ok" if database_ok else db_check.error,
+        "broker": broker_state,
+        "warmup": "done" if warmup.state.done else "running",
+    }
+    return ORJSONResponse(body, status_code=200 if is_ready else 503)
+
+
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+def get_metrics():
+    if settings.METRICS_MULTIPROC_DIR:
+        body = metrics.render_multiprocess(settings.METRICS_MULTIPROC_DIR)
+    else:
+        body = metrics.registry.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
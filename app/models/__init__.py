@@ -1,6 +1,10 @@
+from .catalog_change import CatalogChange
+from .catalog_stat import CatalogStat
+from .catalog_version import CatalogVersion
 from .citta import Citta
 from .indirizzo import Indirizzo
 from .materia import Materia
 from .scuola import Scuola
+from .scuola_search import ScuolaSearch
 
-__all__ = ["Scuola", "Citta", "Indirizzo", "Materia"]
+__all__ = ["Scuola", "ScuolaSearch", "Citta", "Indirizzo", "Materia", "CatalogChange", "CatalogStat", "CatalogVersion"]
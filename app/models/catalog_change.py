@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class CatalogChange(Base):
+    """Log delle modifiche al catalogo (scuole, città, indirizzi, materie) per la replica incrementale.
+
+    Una riga per ogni entità creata, modificata o eliminata, scritta da app.services.changes al commit
+    della transazione della modifica. seq è crescente nell'ordine di commit (vedi CatalogVersion) e fa da
+    token per GET /changes?since=<seq>; le eliminazioni restano come tombstone (deleted=True).
+    """
+    __tablename__ = "catalog_changes"
+    # Su sqlite senza AUTOINCREMENT gli id possono essere riutilizzati: seq deve essere monotono
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    entity: Mapped[str] = mapped_column(String, nullable=False)  # "scuola", "citta", "indirizzo" o "materia"
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
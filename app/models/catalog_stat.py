@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class CatalogStat(Base):
+    """Conteggi aggregati del catalogo per GET /stats (scuole per regione, provincia e tipo, indirizzi per materia).
+
+    Viene aggiornata in modo incrementale da app.services.catalog_sync a ogni modifica del read model
+    scuole_search (nella stessa transazione) e può essere ricalcolata con `python -m app.services.stats`.
+    Le righe arrivate a zero restano fino al ricalcolo completo.
+    """
+    __tablename__ = "catalog_stats"
+
+    dimension: Mapped[str] = mapped_column(String, primary_key=True)  # "totale", "regione", "provincia", "tipo" o "materia"
+    value: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
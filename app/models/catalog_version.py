@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class CatalogVersion(Base):
+    """Versione del catalogo: una sola riga (id=1), incrementata al commit di ogni transazione che lo modifica.
+
+    L'incremento blocca la riga fino al commit, quindi le transazioni che modificano il catalogo registrano le
+    proprie righe di catalog_changes una alla volta, nell'ordine in cui committano: un seq (o una versione)
+    visibile implica che tutti quelli precedenti sono già visibili.
+    """
+    __tablename__ = "catalog_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    changed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -3,8 +3,9 @@ from __future__ import annotations
 from typing import List
 
 from sqlalchemy import String, Integer
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
+from app.core.text import fold
 from app.db.base import Base
 
 
@@ -12,7 +13,14 @@ class Citta(Base):
     __tablename__ = "citta"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     nome: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
+    # nome senza accenti e in minuscolo (app.core.text.fold), usato dalla ricerca e dal filtro per città
+    nome_norm: Mapped[str] = mapped_column(String, index=True, nullable=False)
     provincia: Mapped[str] = mapped_column(String, index=True, nullable=False)
     codice_postale: Mapped[str] = mapped_column(String, index=True, nullable=False)
     regione: Mapped[str] = mapped_column(String, index=True, nullable=False)
     scuole: Mapped[List["Scuola"]] = relationship("Scuola", back_populates="citta")
+
+    @validates("nome")
+    def _sync_nome_norm(self, key, value):
+        self.nome_norm = fold(value)
+        return value
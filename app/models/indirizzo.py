@@ -9,7 +9,8 @@ indirizzi_materie_table = Table(
     "indirizzi_materie_table",
     Base.metadata,
     Column("indirizzo_id", ForeignKey("indirizzi.id"), primary_key=True),
-    Column("materia_id", ForeignKey("materie.id"), primary_key=True),
+    # La PK composta copre solo le ricerche per indirizzo_id: serve l'indice inverso per filtrare per materia
+    Column("materia_id", ForeignKey("materie.id"), primary_key=True, index=True),
 )
 
 
@@ -19,6 +20,6 @@ class Indirizzo(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     nome: Mapped[str] = mapped_column(String, index=True, nullable=False)
     descrizione: Mapped[str] = mapped_column(String, nullable=True)
-    id_scuola: Mapped[int] = Column(Integer, ForeignKey("scuole.id"))
+    id_scuola: Mapped[int] = Column(Integer, ForeignKey("scuole.id"), index=True)
     materie = relationship("Materia", secondary=indirizzi_materie_table, back_populates="indirizzi")
     scuola = relationship("Scuola", back_populates="indirizzi")
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from sqlalchemy import String, Integer
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
+from app.core.text import fold
 from app.db.base import Base
 from app.models.indirizzo import indirizzi_materie_table
 
@@ -12,5 +13,13 @@ class Materia(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     nome: Mapped[str] = mapped_column(String, index=True, nullable=False)
+    # nome senza accenti e in minuscolo (app.core.text.fold), usato dalla ricerca; unico, così le materie
+    # create per nome dai write annidati delle scuole non vengono duplicate da richieste concorrenti
+    nome_norm: Mapped[str] = mapped_column(String, index=True, unique=True, nullable=False)
     descrizione: Mapped[str] = mapped_column(String, nullable=True)
     indirizzi = relationship("Indirizzo", secondary=indirizzi_materie_table, back_populates="materie")
+
+    @validates("nome")
+    def _sync_nome_norm(self, key, value):
+        self.nome_norm = fold(value)
+        return value
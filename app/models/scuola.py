@@ -4,8 +4,9 @@ from datetime import datetime
 from typing import List
 
 from sqlalchemy import DateTime, Integer, func, String, Column, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
+from app.core.text import fold
 from app.db.base import Base
 
 
@@ -14,13 +15,16 @@ class Scuola(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     nome: Mapped[str] = mapped_column(String, index=True, nullable=False)
-    tipo: Mapped[str] = mapped_column(String, index=True, nullable=False)
+    # nome senza accenti e in minuscolo (app.core.text.fold), usato dalla ricerca
+    nome_norm: Mapped[str] = mapped_column(String, index=True, nullable=False)
+    tipo: Mapped[str] = mapped_column(String, nullable=False)
     descrizione: Mapped[str] = mapped_column(String, nullable=True)
-    indirizzo: Mapped[str] = mapped_column(String, index=True, nullable=False)
-    email: Mapped[str] = mapped_column(String, index=True, nullable=False)
-    telefono: Mapped[str] = mapped_column(String, index=True, nullable=False)
-    sito_web: Mapped[str] = mapped_column(String, index=True, nullable=True)
-    id_citta: Mapped[int] = Column(Integer, ForeignKey("citta.id"))
+    indirizzo: Mapped[str] = mapped_column(String, nullable=False)
+    email: Mapped[str] = mapped_column(String, nullable=False)
+    telefono: Mapped[str] = mapped_column(String, nullable=False)
+    sito_web: Mapped[str] = mapped_column(String, nullable=True)
+    # Le liste leggono da scuole_search: qui serve solo trovare le scuole di una città (catalog_sync)
+    id_citta: Mapped[int] = Column(Integer, ForeignKey("citta.id"), index=True)
     citta = relationship("Citta", back_populates="scuole")
 
     indirizzi: Mapped[List["Indirizzo"]] = relationship("Indirizzo", back_populates="scuola")
@@ -30,3 +34,8 @@ class Scuola(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
+
+    @validates("nome")
+    def _sync_nome_norm(self, key, value):
+        self.nome_norm = fold(value)
+        return value
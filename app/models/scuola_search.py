@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class ScuolaSearch(Base):
+    """Read model denormalizzato per le liste di scuole: una riga per scuola con città e indirizzi di studio.
+
+    Viene mantenuto da app.services.catalog_sync a ogni scrittura di scuole, città, indirizzi e materie
+    (nella stessa transazione) e può essere ricostruito con `python -m app.services.catalog_sync`.
+    Contiene solo le scuole con una città, come la join usata in precedenza da get_schools.
+    """
+    __tablename__ = "scuole_search"
+    __table_args__ = (
+        Index("ix_scuole_search_tipo_nome", "tipo", "nome"),
+        Index("ix_scuole_search_citta_nome_norm_nome", "citta_nome_norm", "nome"),
+        Index("ix_scuole_search_provincia_nome", "provincia", "nome"),
+        Index("ix_scuole_search_regione_nome", "regione", "nome"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)  # = scuole.id
+    nome: Mapped[str] = mapped_column(String, index=True, nullable=False)
+    nome_norm: Mapped[str] = mapped_column(String, index=True, nullable=False)  # = scuole.nome_norm
+    tipo: Mapped[str] = mapped_column(String, nullable=False)
+    descrizione: Mapped[str] = mapped_column(String, nullable=True)
+    indirizzo: Mapped[str] = mapped_column(String, nullable=False)
+    email: Mapped[str] = mapped_column(String, nullable=False)
+    telefono: Mapped[str] = mapped_column(String, nullable=False)
+    sito_web: Mapped[str] = mapped_column(String, nullable=True)
+    id_citta: Mapped[int] = mapped_column(Integer, nullable=False)
+    citta_nome: Mapped[str] = mapped_column(String, nullable=False)
+    citta_nome_norm: Mapped[str] = mapped_column(String, nullable=False)  # = citta.nome_norm
+    provincia: Mapped[str] = mapped_column(String, nullable=False)
+    codice_postale: Mapped[str] = mapped_column(String, nullable=False)
+    regione: Mapped[str] = mapped_column(String, nullable=False)
+    # [{"id": 1, "nome": "...", "descrizione": "...", "materie": ["...", ...]}, ...]
+    indirizzi: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, List, Literal
+
+from pydantic import BaseModel
+
+
+class CatalogChangeEntry(BaseModel):
+    seq: int
+    entity: Literal["scuola", "citta", "indirizzo", "materia"]
+    id: int
+    deleted: bool = False
+    changed_at: datetime
+    # Stato attuale della riga (colonne della tabella; per gli indirizzi anche gli id delle materie).
+    # None per le eliminazioni
+    data: dict[str, Any] | None = None
+
+
+class CatalogChangesPage(BaseModel):
+    changes: List[CatalogChangeEntry]
+    since: int
+    next_since: int  # token da passare alla chiamata successiva
+    has_more: bool  # True se ci sono altre modifiche già disponibili oltre questa pagina
@@ -26,3 +26,13 @@ class CittaList(BaseModel):
     filter_search: Optional[str] = None
     sort_by: Optional[str] = None
     order: Optional[str] = None
+
+class CittaBulkItem(BaseModel):
+    id: int
+    nome: str
+    changed: bool  # False se la città esisteva già con gli stessi dati
+
+class CittaBulkResult(BaseModel):
+    total: int
+    changed: int
+    citta: List[CittaBulkItem]
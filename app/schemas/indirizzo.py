@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
+from app.core.config import settings
+from app.schemas.school import SchoolResponse
+
 class IndirizzoBase(BaseModel):
     nome: str
     descrizione: str
@@ -25,3 +28,22 @@ class IndirizzoList(BaseModel):
     filter_search: Optional[str] = None
     sort_by: Optional[str] = None
     order: Optional[str] = None
+
+class MateriaPreferita(BaseModel):
+    materia_id: int
+    peso: float = Field(default=1.0, gt=0)  # importanza relativa della materia
+
+class IndirizziMatchRequest(BaseModel):
+    materie: List[MateriaPreferita] = Field(min_length=1)
+    k: int = Field(default=10, ge=1, le=settings.MATCH_MAX_K)
+    provincia: Optional[str] = None
+    regione: Optional[str] = None
+
+class IndirizzoMatch(BaseModel):
+    score: float  # quota del peso totale coperta dalle materie dell'indirizzo, da 0 a 1
+    materie_corrispondenti: List[int]  # id delle materie preferite insegnate nell'indirizzo
+    indirizzo: IndirizzoResponse
+    scuola: SchoolResponse
+
+class IndirizziMatchList(BaseModel):
+    risultati: List[IndirizzoMatch]
@@ -41,6 +41,20 @@ class SchoolUpdate(SchoolBase):
     citta_id: int
 
 
+class SchoolAddressCreate(BaseModel):  # indirizzo di studio con le sue materie, per la creazione annidata
+    nome: str
+    descrizione: str = ""
+    materie: List[int | str] = []  # id o nomi delle materie (quelle con un nome nuovo vengono create)
+
+
+class SchoolFullCreate(SchoolCreate):
+    indirizzi_scuola: List[SchoolAddressCreate] = []
+
+
+class SchoolFullUpdate(SchoolUpdate):
+    indirizzi_scuola: List[SchoolAddressCreate] = []  # sostituisce l'elenco attuale
+
+
 class SchoolsList(BaseModel):
     scuole: List[SchoolResponse]
     total: int
@@ -51,9 +65,23 @@ class SchoolsList(BaseModel):
     filter_citta: str | None = None
     filter_provincia: str | None = None
     filter_indirizzo: str | None = None
+    filter_materia: str | None = None
+    filter_indirizzo_studio: str | None = None
+    filter_regione: str | None = None
     sort_by: str | None = None
     order: str | None = None
 
 
+class SimilarSchool(BaseModel):
+    score: float  # similarità delle materie insegnate, da 0 a 1
+    scuola: SchoolResponse
+
+
+class SimilarSchoolsList(BaseModel):
+    school_id: int
+    metric: str
+    risultati: List[SimilarSchool]
+
+
 class SchoolDeleteResponse(BaseModel):
     message: str = "School deleted successfully"
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List
+
+from pydantic import BaseModel
+
+
+class StatEntry(BaseModel):
+    valore: str
+    totale: int
+
+
+class CatalogStats(BaseModel):
+    scuole: int
+    indirizzi: int
+    # Ordinati per totale decrescente (a parità, per valore)
+    scuole_per_regione: List[StatEntry]
+    scuole_per_provincia: List[StatEntry]
+    scuole_per_tipo: List[StatEntry]
+    indirizzi_per_materia: List[StatEntry]
+    generated_at: datetime  # momento della lettura dal DB (le risposte vengono riutilizzate per pochi secondi)
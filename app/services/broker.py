@@ -5,6 +5,7 @@ import asyncio
 import uuid
 import aio_pika
 
+from app.core import metrics
 from app.core.config import settings
 from app.core.logging import get_logger, setup_logging
 
@@ -41,6 +42,10 @@ class AsyncBrokerSingleton:
             self.consumer_tags = {}
             self.initialized = True
 
+    @property
+    def is_connected(self) -> bool:
+        return self.connection is not None and not self.connection.is_closed
+
     async def connect(self, retries=5, delay=5):
         """Stabilisce una connessione asincrona a RabbitMQ con retry robusti.
 
@@ -95,8 +100,12 @@ class AsyncBrokerSingleton:
         queue = await self.channel.declare_queue(queue_name, durable=True)
         await queue.bind(exchange, routing_key=routing_key)
 
+        async def counted_callback(message):
+            metrics.BROKER_CONSUMED.inc((exchange_name,))
+            await callback(message)
+
         # consume returns a consumer tag, it is NOT a blocking task that needs asyncio.create_task
-        consumer_tag = await queue.consume(callback)
+        consumer_tag = await queue.consume(counted_callback)
 
         self.queues[queue_name] = queue
         self.consumer_tags[queue_name] = consumer_tag
@@ -140,8 +149,9 @@ class AsyncBrokerSingleton:
             delivery_mode=aio_pika.DeliveryMode.PERSISTENT
         )
         await exchange.publish(message, routing_key=routing_key)
-        logger.info(
-            f"Sent message to exchange {exchange_name}. Type: {msg_type}, Routing key: {routing_key} (aio-pika)")
+        metrics.BROKER_PUBLISHED.inc((exchange_name,))
+        logger.debug("Sent message to exchange %s. Type: %s, Routing key: %s (aio-pika)",
+                     exchange_name, msg_type, routing_key)
 
     async def close(self):
         """Chiude la connessione a RabbitMQ e annulla tutte le sottoscrizioni (asincrono)."""
@@ -153,6 +163,62 @@ class AsyncBrokerSingleton:
             await self.connection.close()
         logger.info("Closed all RabbitMQ consumer tasks (aio-pika)")
 
+    async def reset(self):
+        """Scarta una connessione non più utilizzabile, così il prossimo connect() ne apre una nuova."""
+        try:
+            if self.connection and not self.connection.is_closed:
+                await self.connection.close()
+        except Exception as e:
+            logger.warning("Error while closing RabbitMQ connection: %s", e)
+        self.connection = None
+        self.channel = None
+        self.queues = {}
+        self.consumer_tags = {}
+
+
+class BrokerSupervisor:
+    """Mantiene in background la connessione al broker e le sottoscrizioni agli exchange.
+
+    Non blocca l'avvio dell'app: se RabbitMQ non è raggiungibile riprova all'infinito, e se la
+    connessione viene chiusa (oltre ai reconnect automatici di connect_robust) la riapre e risottoscrive.
+
+    Attributes:
+        state (str): "idle", "connecting", "connected" o "disconnected".
+    """
+
+    def __init__(self, exchanges: dict, check_interval: float = 5.0):
+        """
+        Args:
+            exchanges (dict): Nomi degli exchange -> callback dei messaggi.
+            check_interval (float): Ogni quanti secondi verificare che la connessione sia ancora aperta.
+        """
+        self.exchanges = exchanges
+        self.check_interval = check_interval
+        self.state = "idle"
+
+    async def run(self):
+        broker_instance = AsyncBrokerSingleton()
+        while True:
+            self.state = "connecting"
+            try:
+                if await broker_instance.connect(retries=settings.RABBITMQ_CONNECTION_RETRIES,
+                                                 delay=settings.RABBITMQ_CONNECTION_RETRY_DELAY):
+                    for exchange, callback in self.exchanges.items():
+                        await broker_instance.subscribe(exchange, callback)
+                    self.state = "connected"
+                    logger.info("Connected to RabbitMQ.")
+                    while broker_instance.is_connected:
+                        await asyncio.sleep(self.check_interval)
+                    logger.warning("RabbitMQ connection closed, reconnecting...")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("RabbitMQ setup failed: %s", e)
+
+            self.state = "disconnected"
+            await broker_instance.reset()
+            await asyncio.sleep(settings.RABBITMQ_CONNECTION_RETRY_DELAY)
+
 
 def declare_services_exchanges(exchanges: dict):
     """Dichiara e sottoscrive agli exchange RabbitMQ specificati nel dizionario exchanges (asincrono).
@@ -0,0 +1,125 @@
+"""Base degli indici NumPy in memoria costruiti dal catalogo (scuole simili, match degli indirizzi).
+
+Ogni worker costruisce l'indice alla prima richiesta (o durante il warm-up) e poi lo aggiorna in modo
+incrementale leggendo il log catalog_changes: vengono ricaricati solo i dati delle scuole toccate dalle
+modifiche, anche quando la scrittura è avvenuta in un altro worker.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models import CatalogChange
+from app.services import catalog_sync
+
+logger = get_logger(__name__)
+
+# Oltre questa quota di scuole da ricaricare conviene ricostruire tutto l'indice
+REBUILD_RATIO = 0.2
+
+
+def grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Restituisce array esteso (con zeri) ad almeno size elementi sul primo asse, raddoppiando la capacità."""
+    if size <= array.shape[0]:
+        return array
+    capacity = max(size, array.shape[0] * 2, 16)
+    grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype, order="F")
+    grown[:array.shape[0]] = array
+    return grown
+
+
+def grow_columns(matrix: np.ndarray, size: int) -> np.ndarray:
+    """Come grow() ma sul secondo asse di una matrice."""
+    if size <= matrix.shape[1]:
+        return matrix
+    capacity = max(size, matrix.shape[1] * 2, 16)
+    grown = np.zeros((matrix.shape[0], capacity), dtype=matrix.dtype, order="F")
+    grown[:, :matrix.shape[1]] = matrix
+    return grown
+
+
+class CatalogIndex:
+    """Indice aggiornato per scuola: le sottoclassi definiscono _clear(), _load(), _apply() e _school_count()."""
+
+    name = "catalog"
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.seq: int | None = None  # ultimo seq di catalog_changes incluso nell'indice (None = da costruire)
+        self.checked_at = float("-inf")
+        self._clear()
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+    async def _load(self, db: AsyncSession, school_ids: set[int] | None):
+        """Legge dal DB i dati delle scuole indicate (None = tutte)."""
+        raise NotImplementedError
+
+    def _apply(self, school_ids: set[int], data) -> None:
+        """Riscrive i dati delle scuole indicate con quelli letti da _load(): le assenti vengono disattivate."""
+        raise NotImplementedError
+
+    def _school_count(self) -> int:
+        raise NotImplementedError
+
+    async def _rebuild(self, db: AsyncSession) -> None:
+        started = time.perf_counter()
+        # seq letto prima dei dati: le modifiche concorrenti al caricamento verranno riapplicate
+        seq = (await db.execute(select(func.max(CatalogChange.seq)))).scalar() or 0
+        data = await self._load(db, None)
+        self._clear()
+        self._apply(set(), data)
+        self.seq = seq
+        logger.info("Index %s built in %.0fms (%d schools)",
+                    self.name, (time.perf_counter() - started) * 1000, self._school_count())
+
+    async def _catch_up(self, db: AsyncSession) -> None:
+        # Nessuna finestra di attesa: i seq vengono assegnati al commit, una transazione alla volta
+        # (vedi changes._write_pending_changes), quindi una modifica non ancora visibile avrà un seq
+        # maggiore di self.seq e verrà letta al prossimo aggiornamento
+        changes = (await db.execute(
+            select(CatalogChange.seq, CatalogChange.entity, CatalogChange.entity_id)
+            .where(CatalogChange.seq > self.seq).order_by(CatalogChange.seq)
+        )).all()
+        if not changes:
+            return
+
+        by_entity: dict[str, set[int]] = {}
+        for _, entity, entity_id in changes:
+            # Le materie sono indicizzate per id: rinominarle non cambia l'indice, eliminarle è
+            # possibile solo se non collegate ad alcun indirizzo
+            if entity != "materia":
+                by_entity.setdefault(entity, set()).add(entity_id)
+        affected: set[int] = set()
+        for entity, ids in by_entity.items():
+            affected |= await catalog_sync.schools_affected_by(db, entity, ids)
+
+        if len(affected) > max(REBUILD_RATIO * self._school_count(), 1000):
+            await self._rebuild(db)
+            return
+        if affected:
+            self._apply(affected, await self._load(db, affected))
+        self.seq = changes[-1].seq
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """Costruisce l'indice o applica le modifiche arrivate, al massimo ogni settings.SIMILARITY_REFRESH_SECONDS."""
+        if self.seq is not None and time.monotonic() - self.checked_at < settings.SIMILARITY_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if self.seq is not None and time.monotonic() - self.checked_at < settings.SIMILARITY_REFRESH_SECONDS:
+                return
+            if self.seq is None:
+                await self._rebuild(db)
+            else:
+                await self._catch_up(db)
+            self.checked_at = time.monotonic()
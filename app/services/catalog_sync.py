@@ -0,0 +1,188 @@
+"""Manutenzione del read model scuole_search, delle statistiche (catalog_stats) e del log delle modifiche (catalog_changes).
+
+Ogni write path del catalogo chiama entities_changed() prima del commit: le righe delle scuole
+coinvolte vengono ricalcolate e le modifiche registrate nella stessa transazione, così le liste,
+GET /stats e GET /changes non vedono mai dati parziali.
+
+Ricostruzione completa (es. dopo una migrazione o un import diretto nel DB):
+    python -m app.services.catalog_sync --batch-size 1000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Iterable
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import get_logger
+from app.models import Citta, Indirizzo, Materia, Scuola, ScuolaSearch
+from app.models.indirizzo import indirizzi_materie_table
+from app.services import stats
+from app.services.changes import record_changes
+
+logger = get_logger(__name__)
+
+ENTITIES = ("scuola", "citta", "indirizzo", "materia")
+
+
+async def schools_affected_by(db: AsyncSession, entity: str, ids: Iterable[int]) -> set[int]:
+    """Restituisce gli id delle scuole la cui riga di scuole_search dipende dalle entità indicate.
+
+    Args:
+        db (AsyncSession): Sessione DB.
+        entity (str): "scuola", "citta", "indirizzo" o "materia".
+        ids (Iterable[int]): Id delle entità modificate.
+
+    Returns:
+        set[int]: Id delle scuole da ricalcolare.
+    """
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return set()
+    if entity == "scuola":
+        return ids
+    if entity == "citta":
+        stmt = select(Scuola.id).where(Scuola.id_citta.in_(ids))
+    elif entity == "indirizzo":
+        stmt = select(Indirizzo.id_scuola).where(Indirizzo.id.in_(ids))
+    elif entity == "materia":
+        stmt = (select(Indirizzo.id_scuola)
+                .join(indirizzi_materie_table, indirizzi_materie_table.c.indirizzo_id == Indirizzo.id)
+                .where(indirizzi_materie_table.c.materia_id.in_(ids)))
+    else:
+        raise ValueError(f"Unknown catalog entity: {entity}")
+    result = await db.execute(stmt.distinct())
+    return {school_id for school_id in result.scalars() if school_id is not None}
+
+
+async def build_search_rows(db: AsyncSession, school_ids: set[int]) -> list[dict]:
+    """Calcola le righe di scuole_search per le scuole indicate (tre query, indipendentemente dal numero di scuole)."""
+    schools = (await db.execute(
+        select(Scuola.id, Scuola.nome, Scuola.nome_norm, Scuola.tipo, Scuola.descrizione, Scuola.indirizzo, Scuola.email,
+               Scuola.telefono, Scuola.sito_web, Scuola.id_citta, Scuola.created_at, Scuola.updated_at,
+               Citta.nome.label("citta_nome"), Citta.nome_norm.label("citta_nome_norm"),
+               Citta.provincia, Citta.codice_postale, Citta.regione)
+        .join(Citta, Citta.id == Scuola.id_citta)
+        .where(Scuola.id.in_(school_ids))
+    )).mappings().all()
+    if not schools:
+        return []
+
+    indirizzi = (await db.execute(
+        select(Indirizzo.id, Indirizzo.nome, Indirizzo.descrizione, Indirizzo.id_scuola)
+        .where(Indirizzo.id_scuola.in_(school_ids))
+        .order_by(Indirizzo.id)
+    )).all()
+
+    materie: dict[int, list[str]] = {}
+    if indirizzi:
+        links = await db.execute(
+            select(indirizzi_materie_table.c.indirizzo_id, Materia.nome)
+            .join(Materia, Materia.id == indirizzi_materie_table.c.materia_id)
+            .where(indirizzi_materie_table.c.indirizzo_id.in_([i.id for i in indirizzi]))
+            .order_by(Materia.id)
+        )
+        for indirizzo_id, nome in links:
+            materie.setdefault(indirizzo_id, []).append(nome)
+
+    by_school: dict[int, list[dict]] = {}
+    for i in indirizzi:
+        by_school.setdefault(i.id_scuola, []).append(
+            {"id": i.id, "nome": i.nome, "descrizione": i.descrizione, "materie": materie.get(i.id, [])})
+
+    return [{**school, "indirizzi": by_school.get(school["id"], [])} for school in schools]
+
+
+async def refresh_schools(db: AsyncSession, school_ids: Iterable[int]) -> None:
+    """Ricalcola le righe di scuole_search delle scuole indicate nella transazione corrente.
+
+    Le scuole eliminate (o senza città) vengono rimosse dal read model. catalog_stats viene aggiornata
+    con la differenza tra le righe rimosse e quelle nuove.
+    """
+    school_ids = set(school_ids)
+    if not school_ids:
+        return
+    await db.flush()
+    # Al commit le liste in cache di questo worker vanno ricalcolate (vedi changes.CatalogGeneration)
+    db.sync_session.info["catalog_changed"] = True
+    rows = await build_search_rows(db, school_ids)
+    old_rows = (await db.execute(
+        delete(ScuolaSearch).where(ScuolaSearch.id.in_(school_ids)).returning(*stats.SOURCE_COLUMNS)
+    )).mappings().all()
+    if rows:
+        await db.execute(insert(ScuolaSearch), rows)
+    await stats.apply_delta(db, old_rows, rows)
+
+
+async def entities_changed(db: AsyncSession, entity: str, ids: Iterable[int]) -> None:
+    """Hook unico dei write path del catalogo: da chiamare dopo le modifiche e prima del commit.
+
+    Args:
+        db (AsyncSession): Sessione DB con le modifiche in corso.
+        entity (str): "scuola", "citta", "indirizzo" o "materia".
+        ids (Iterable[int]): Id delle entità create, modificate o eliminate. Dopo l'eliminazione di
+            un'entità figlia (es. un indirizzo) la scuola di appartenenza non è più ricavabile: va
+            segnalata a parte come entità "scuola".
+    """
+    ids = list(ids)
+    await db.flush()
+    await record_changes(db, entity, ids)
+    await refresh_schools(db, await schools_affected_by(db, entity, ids))
+
+
+async def rebuild_search(session_factory, batch_size: int = 1000) -> int:
+    """Ricostruisce tutto scuole_search a blocchi, con un commit per blocco.
+
+    Args:
+        session_factory: Factory delle sessioni asincrone (es. AsyncSessionLocal).
+        batch_size (int): Scuole per blocco.
+
+    Returns:
+        int: Numero di scuole elaborate.
+    """
+    processed = 0
+    last_id = 0
+    async with session_factory() as db:
+        while True:
+            ids = (await db.execute(
+                select(Scuola.id).where(Scuola.id > last_id).order_by(Scuola.id).limit(batch_size)
+            )).scalars().all()
+            if not ids:
+                break
+            await refresh_schools(db, ids)
+            await db.commit()
+            processed += len(ids)
+            last_id = ids[-1]
+
+        # Righe di scuole non più esistenti
+        orphans = (await db.execute(
+            delete(ScuolaSearch).where(ScuolaSearch.id.not_in(select(Scuola.id))).returning(*stats.SOURCE_COLUMNS)
+        )).mappings().all()
+        await stats.apply_delta(db, orphans, [])
+        await db.commit()
+    return processed
+
+
+async def _main(batch_size: int) -> None:
+    from app.core.logging import setup_logging, shutdown_logging
+    from app.db.base import import_models
+    from app.db.session import AsyncSessionLocal, engine
+
+    import_models()
+    setup_logging()
+    started = time.perf_counter()
+    try:
+        processed = await rebuild_search(AsyncSessionLocal, batch_size)
+        logger.info("Rebuilt scuole_search for %d schools in %.1fs", processed, time.perf_counter() - started)
+    finally:
+        await engine.dispose()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ricostruisce il read model scuole_search.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(_main(parser.parse_args().batch_size))
@@ -0,0 +1,227 @@
+"""Feed delle modifiche al catalogo per la replica incrementale dei servizi partner.
+
+Il client parte da since=0 (tutto il catalogo) e a ogni chiamata passa il next_since ricevuto: ottiene solo
+le entità create, modificate o eliminate nel frattempo, in ordine di seq.
+
+Le modifiche registrate durante una transazione vengono scritte nel log come ultimo passo prima del commit,
+dopo aver incrementato (e bloccato fino al commit) la riga di catalog_version: i seq vengono quindi assegnati
+nell'ordine di commit e un client che ha visto il seq N non può ricevere in seguito una modifica con seq minore.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from app.core.config import settings
+from app.db.upsert import upsert_insert
+from app.models import CatalogChange, CatalogVersion, Citta, Indirizzo, Materia, Scuola
+from app.models.indirizzo import indirizzi_materie_table
+from app.schemas.changes import CatalogChangeEntry, CatalogChangesPage
+
+MODELS = {"scuola": Scuola, "citta": Citta, "indirizzo": Indirizzo, "materia": Materia}
+# Colonne derivate, ricalcolate dal servizio: non fanno parte dei dati replicati
+_INTERNAL_COLUMNS = {"nome_norm"}
+
+
+def _model(entity: str):
+    try:
+        return MODELS[entity]
+    except KeyError:
+        raise ValueError(f"Unknown catalog entity: {entity}") from None
+
+
+def as_utc(value: datetime) -> datetime:
+    # sqlite restituisce datetime naive (salvati in UTC)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def record_changes(db: AsyncSession, entity: str, ids: Iterable[int], deleted: bool | None = None) -> None:
+    """Registra una modifica per ogni entità indicata, da scrivere nel log al commit della transazione corrente.
+
+    Le righe di catalog_changes vengono inserite da _write_pending_changes() subito prima del commit (e scartate
+    in caso di rollback); se un'entità viene registrata più volte nella stessa transazione vale l'ultima.
+
+    Args:
+        db (AsyncSession): Sessione DB con le modifiche in corso.
+        entity (str): "scuola", "citta", "indirizzo" o "materia".
+        ids (Iterable[int]): Id delle entità create, modificate o eliminate.
+        deleted (bool | None): Se None le entità non più presenti nel DB (dopo il flush) vengono
+            registrate come eliminate; chi lo sa già (es. un insert Core) può evitare la verifica.
+    """
+    model = _model(entity)
+    ids = sorted({i for i in ids if i is not None})
+    if not ids:
+        return
+    if deleted is None:
+        # Dopo il flush le entità eliminate escono dall'identity map: interrogo il DB solo per quelle non caricate
+        existing = {i for i in ids if identity_key(model, i) in db.sync_session.identity_map}
+        unknown = [i for i in ids if i not in existing]
+        if unknown:
+            existing.update((await db.execute(select(model.id).where(model.id.in_(unknown)))).scalars())
+    else:
+        existing = set() if deleted else set(ids)
+    # Al commit la generazione del catalogo di questo worker viene invalidata (vedi _catalog_committed)
+    db.sync_session.info["catalog_changed"] = True
+    pending: dict[tuple[str, int], bool] = db.sync_session.info.setdefault("pending_changes", {})
+    for i in ids:
+        pending.pop((entity, i), None)  # la modifica più recente va in fondo al log
+        pending[entity, i] = i not in existing
+
+
+@dataclass(frozen=True)
+class Generation:
+    version: int  # catalog_version.version (0 = catalogo mai modificato)
+    epoch: int  # commit di questo worker che hanno modificato il catalogo o il read model
+    changed_at: datetime | None  # istante dell'ultima modifica al catalogo
+    observed_at: float  # time.monotonic() in cui questo worker ha visto la generazione per la prima volta
+
+    @property
+    def token(self) -> tuple[int, int]:
+        return self.version, self.epoch
+
+
+class CatalogGeneration:
+    """Contatore di generazione del catalogo: la versione di catalog_version, incrementata da ogni scrittura.
+
+    La versione segue l'ordine di commit (vedi _write_pending_changes): una versione letta include tutte le
+    scritture precedenti, anche di altri worker. Il valore letto dal DB viene riutilizzato per
+    settings.LIST_CACHE_GENERATION_SECONDS: le scritture di altri worker diventano visibili entro quel tempo,
+    quelle di questo worker subito dopo il commit. Anche i commit che riscrivono solo il read model
+    (es. rebuild di scuole_search) cambiano la generazione locale.
+    """
+
+    def __init__(self):
+        self._current: Generation | None = None
+        self._checked_at = float("-inf")
+        self._epoch = 0
+
+    def invalidate(self) -> None:
+        self._epoch += 1
+        self._checked_at = float("-inf")
+
+    async def current(self, db: AsyncSession, refresh: bool = False) -> Generation:
+        """Restituisce la generazione attuale, rileggendola dal DB (una query) quando è scaduta o se refresh."""
+        now = time.monotonic()
+        if (not refresh and self._current is not None
+                and now - self._checked_at < settings.LIST_CACHE_GENERATION_SECONDS):
+            return self._current
+        row = (await db.execute(
+            select(CatalogVersion.version, CatalogVersion.changed_at).where(CatalogVersion.id == 1)
+        )).first()
+        version, changed_at = (row.version, row.changed_at and as_utc(row.changed_at)) if row else (0, None)
+        if self._current is None or self._current.token != (version, self._epoch):
+            self._current = Generation(version=version, epoch=self._epoch, changed_at=changed_at, observed_at=now)
+        self._checked_at = now
+        return self._current
+
+
+generation = CatalogGeneration()
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_changes(session: Session) -> None:
+    pending: dict[tuple[str, int], bool] | None = session.info.pop("pending_changes", None)
+    if not pending:
+        return
+    now = datetime.now(timezone.utc)
+    # L'incremento blocca la riga di catalog_version fino al commit: una transazione alla volta assegna i
+    # propri seq e li rende visibili committando, quindi i seq seguono l'ordine di commit
+    stmt = upsert_insert(session, CatalogVersion).values(id=1, version=1, changed_at=now)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[CatalogVersion.id],
+        set_={"version": CatalogVersion.version + 1, "changed_at": stmt.excluded.changed_at},
+    ))
+    session.execute(insert(CatalogChange), [
+        {"entity": entity, "entity_id": entity_id, "deleted": deleted, "changed_at": now}
+        for (entity, entity_id), deleted in pending.items()
+    ])
+
+
+@event.listens_for(Session, "after_commit")
+def _catalog_committed(session: Session) -> None:
+    if session.info.pop("catalog_changed", False):
+        generation.invalidate()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _catalog_transaction_ended(session: Session, transaction) -> None:
+    # Rollback o chiusura senza commit: le modifiche registrate non sono mai avvenute
+    if transaction.parent is None:
+        session.info.pop("catalog_changed", None)
+        session.info.pop("pending_changes", None)
+
+
+async def _load_rows(db: AsyncSession, entity: str, ids: list[int]) -> dict[int, dict]:
+    """Stato attuale delle entità indicate (una query, due per gli indirizzi)."""
+    model = _model(entity)
+    columns = [c for c in model.__table__.columns if c.name not in _INTERNAL_COLUMNS]
+    result = await db.execute(select(*columns).where(model.id.in_(ids)))
+    rows = {row["id"]: dict(row) for row in result.mappings()}
+
+    if entity == "indirizzo" and rows:
+        for row in rows.values():
+            row["materie"] = []
+        links = await db.execute(
+            select(indirizzi_materie_table.c.indirizzo_id, indirizzi_materie_table.c.materia_id)
+            .where(indirizzi_materie_table.c.indirizzo_id.in_(rows))
+            .order_by(indirizzi_materie_table.c.materia_id)
+        )
+        for indirizzo_id, materia_id in links:
+            rows[indirizzo_id]["materie"].append(materia_id)
+    return rows
+
+
+async def get_changes(db: AsyncSession, since: int, limit: int) -> CatalogChangesPage:
+    """Restituisce le modifiche successive al token since, con lo stato attuale delle entità.
+
+    I seq seguono l'ordine di commit (vedi _write_pending_changes): le modifiche ancora non visibili avranno
+    un seq maggiore di next_since e arriveranno alle chiamate successive.
+    Se un'entità compare più volte nella pagina viene restituita solo l'ultima modifica.
+
+    Args:
+        db (AsyncSession): Sessione DB.
+        since (int): Token ricevuto dalla chiamata precedente (0 = dall'inizio).
+        limit (int): Numero massimo di modifiche da leggere dal log.
+
+    Returns:
+        CatalogChangesPage: Modifiche in ordine di seq e token per la chiamata successiva.
+    """
+    rows = (await db.execute(
+        select(CatalogChange).where(CatalogChange.seq > since).order_by(CatalogChange.seq).limit(limit + 1)
+    )).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {(row.entity, row.entity_id): row for row in rows}
+    pending: dict[str, list[int]] = {}
+    for row in latest.values():
+        if not row.deleted:
+            pending.setdefault(row.entity, []).append(row.entity_id)
+    data = {entity: await _load_rows(db, entity, ids) for entity, ids in pending.items()}
+
+    changes = []
+    for row in sorted(latest.values(), key=lambda r: r.seq):
+        current = data.get(row.entity, {}).get(row.entity_id)
+        changes.append(CatalogChangeEntry(
+            seq=row.seq,
+            entity=row.entity,
+            id=row.entity_id,
+            # Eliminata dopo questa modifica: il tombstone arriverà comunque in una pagina successiva
+            deleted=row.deleted or current is None,
+            changed_at=as_utc(row.changed_at),
+            data=current,
+        ))
+
+    return CatalogChangesPage(
+        changes=changes,
+        since=since,
+        next_since=rows[-1].seq if rows else since,
+        has_more=has_more,
+    )
@@ -1,9 +1,23 @@
 from __future__ import annotations
-from typing import Optional
-from sqlalchemy import select
+from typing import AsyncIterable, Optional
+from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models import Citta
-from app.schemas.citta import CittaList, CittaResponse, CittaCreate, CittaUpdate
+from app.core.text import fold
+from app.db.upsert import upsert_insert
+from app.models import Citta, Scuola
+from app.services import catalog_sync
+from app.services.changes import record_changes
+from app.schemas.citta import CittaList, CittaResponse, CittaCreate, CittaUpdate, CittaBulkItem, CittaBulkResult
+
+# Righe per statement del caricamento massivo: 5 parametri per riga restano sotto i limiti di Postgres e sqlite
+BULK_CHUNK = 1000
+
+
+def _citta_row(citta: CittaCreate) -> dict:
+    # Insert Core: i validator del modello non intervengono, nome_norm va calcolato qui
+    return {"nome": citta.nome, "nome_norm": fold(citta.nome), "codice_postale": citta.cap,
+            "provincia": citta.provincia, "regione": citta.regione}
+
 
 async def get_citta(
         db: AsyncSession,
@@ -16,7 +30,7 @@ async def get_citta(
     try:
         stmt = select(Citta)
         if search:
-            stmt = stmt.filter(Citta.nome.ilike(f"%{search}%"))
+            stmt = stmt.filter(Citta.nome_norm.contains(fold(search)))
         
         sort_column = {
             "name": Citta.nome,
@@ -67,17 +81,78 @@ async def get_citta_by_zipcode(cap: str, db: AsyncSession) -> CittaResponse:
 
 async def post_citta(citta: CittaCreate, db: AsyncSession) -> CittaResponse:
     try:
-        stmt = select(Citta).filter(Citta.nome == citta.nome, Citta.codice_postale == citta.cap)
-        result = await db.execute(stmt)
-        existing_citta = result.scalars().first()
-        if existing_citta:
+        # Un solo statement (niente SELECT preventiva, che tra due richieste concorrenti non basta):
+        # se il nome esiste già il vincolo unique fa saltare l'insert e RETURNING non restituisce righe
+        stmt = (upsert_insert(db, Citta)
+                .values(_citta_row(citta))
+                .on_conflict_do_nothing(index_elements=[Citta.nome])
+                .returning(Citta.id))
+        citta_id = (await db.execute(stmt)).scalar()
+        if citta_id is None:
             raise Exception("Città già esistente")
-            
-        new_citta = Citta(nome=citta.nome, codice_postale=citta.cap, provincia=citta.provincia, regione=citta.regione)
-        db.add(new_citta)
+
+        # Una città appena creata non ha scuole: basta registrarla nel log delle modifiche
+        await record_changes(db, "citta", [citta_id], deleted=False)
         await db.commit()
-        await db.refresh(new_citta)
-        return CittaResponse(id=new_citta.id, nome=new_citta.nome, cap=new_citta.codice_postale, provincia=new_citta.provincia, regione=new_citta.regione)
+        return CittaResponse(id=citta_id, nome=citta.nome, cap=citta.cap, provincia=citta.provincia, regione=citta.regione)
+    except Exception as e:
+        raise e
+
+async def _upsert_chunk(rows: dict[str, dict], db: AsyncSession) -> dict[str, CittaBulkItem]:
+    stmt = upsert_insert(db, Citta).values(list(rows.values()))
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Citta.nome],
+        set_={"codice_postale": excluded.codice_postale, "provincia": excluded.provincia,
+              "regione": excluded.regione},
+        # Le città già identiche non vengono riscritte (e non finiscono nel log delle modifiche)
+        where=or_(Citta.codice_postale != excluded.codice_postale, Citta.provincia != excluded.provincia,
+                  Citta.regione != excluded.regione),
+    ).returning(Citta.id, Citta.nome)
+    items = {nome: CittaBulkItem(id=citta_id, nome=nome, changed=True) for citta_id, nome in await db.execute(stmt)}
+
+    # RETURNING non restituisce le righe lasciate invariate: i loro id vanno letti a parte
+    unchanged = [nome for nome in rows if nome not in items]
+    if unchanged:
+        result = await db.execute(select(Citta.id, Citta.nome).where(Citta.nome.in_(unchanged)))
+        items.update({nome: CittaBulkItem(id=citta_id, nome=nome, changed=False) for citta_id, nome in result})
+
+    await catalog_sync.entities_changed(db, "citta", [item.id for item in items.values() if item.changed])
+    return items
+
+async def bulk_upsert_citta(citta: AsyncIterable[CittaCreate], db: AsyncSession) -> CittaBulkResult:
+    """
+    Crea o aggiorna (per nome) un elenco di città, es. i comuni ISTAT, in un'unica transazione.
+
+    L'elenco viene letto e validato per intero prima della prima scrittura, così la transazione (con la
+    connessione e i lock su citta e catalog_stats) dura solo quanto le scritture e non quanto l'upload.
+    Le città vengono poi scritte a blocchi di BULK_CHUNK con un solo INSERT ... ON CONFLICT per blocco.
+    Se un nome compare più volte vale l'ultima occorrenza.
+
+    Args:
+        citta (AsyncIterable[CittaCreate]): Città da caricare.
+        db (AsyncSession): Sessione DB.
+
+    Returns:
+        CittaBulkResult: Id di ogni città e indicazione di quali sono state create o modificate.
+    """
+    try:
+        rows: dict[str, dict] = {}
+        async for item in citta:
+            rows[item.nome] = _citta_row(item)
+
+        names = list(rows)
+        results: dict[str, CittaBulkItem] = {}
+        for start in range(0, len(names), BULK_CHUNK):
+            chunk = {nome: rows[nome] for nome in names[start:start + BULK_CHUNK]}
+            results.update(await _upsert_chunk(chunk, db))
+
+        await db.commit()
+        return CittaBulkResult(
+            total=len(results),
+            changed=sum(item.changed for item in results.values()),
+            citta=list(results.values()),
+        )
     except Exception as e:
         raise e
 
@@ -93,7 +168,8 @@ async def put_citta(citta_id: int, citta: CittaUpdate, db: AsyncSession) -> Citt
         existing_citta.codice_postale = citta.cap
         existing_citta.provincia = citta.provincia
         existing_citta.regione = citta.regione
-        
+
+        await catalog_sync.entities_changed(db, "citta", [citta_id])
         await db.commit()
         await db.refresh(existing_citta)
         return CittaResponse(id=existing_citta.id, nome=existing_citta.nome, cap=existing_citta.codice_postale, provincia=existing_citta.provincia, regione=existing_citta.regione)
@@ -107,7 +183,11 @@ async def delete_citta(citta_id: int, db: AsyncSession):
         citta = result.scalars().first()
         if not citta:
             raise Exception("Città non trovata")
+        # Le scuole della città restano senza città (id_citta = NULL): anche loro risultano modificate
+        school_ids = (await db.execute(select(Scuola.id).filter(Scuola.id_citta == citta_id))).scalars().all()
         await db.delete(citta)
+        await catalog_sync.entities_changed(db, "citta", [citta_id])
+        await catalog_sync.entities_changed(db, "scuola", school_ids)
         await db.commit()
         return {"message": "Città eliminata con successo"}
     except Exception as e:
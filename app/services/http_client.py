@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import copy
+import logging
+import re
+import sys
+import time
 import traceback
+from dataclasses import dataclass
 from enum import Enum
 
 import httpx
 
+from app.core import deadline
+from app.core.cache import LRUCache, SingleFlight
 from app.core.config import settings
 from app.core.logging import get_logger
 
@@ -105,8 +113,75 @@ class HttpHeaders():
 # Errori e risposte
 
 
+class ErrorLogLimiter:
+    """Deduplica e limita i log degli errori identici all'interno di una finestra temporale.
+
+    Durante un guasto (es. DB non raggiungibile) ogni richiesta solleva lo stesso errore: loggarlo ogni volta
+    con lo stack completo rallenta il servizio proprio quando deve recuperare.
+    """
+
+    def __init__(self, window_seconds: float, max_per_window: int, max_keys: int = 1024):
+        self.window_seconds = window_seconds
+        self.max_per_window = max_per_window
+        self._windows = LRUCache(max_keys)  # chiave -> [inizio finestra, log emessi, ripetizioni soppresse]
+        self.logged = 0
+        self.suppressed = 0
+
+    def acquire(self, key: tuple) -> int | None:
+        """Decide se l'errore identificato da key va loggato.
+
+        Returns:
+            int | None: None se il log va soppresso, altrimenti il numero di ripetizioni soppresse
+            nella finestra precedente (da riportare nel messaggio).
+        """
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.window_seconds:
+            previously_suppressed = window[2] if window is not None else 0
+            self._windows.set(key, [now, 1, 0])
+            self.logged += 1
+            return previously_suppressed
+
+        if window[1] < self.max_per_window:
+            window[1] += 1
+            self.logged += 1
+            return 0
+
+        window[2] += 1
+        self.suppressed += 1
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {"logged": self.logged, "suppressed": self.suppressed, "tracked": len(self._windows)}
+
+
+_error_log_limiter = ErrorLogLimiter(settings.ERROR_LOG_WINDOW_SECONDS, settings.ERROR_LOG_MAX_PER_WINDOW)
+
+_NUMBERS = re.compile(r"\d+")
+
+
+def error_log_key(status_code: int, message: str, url: str | None, exc: Exception | None) -> tuple:
+    """Chiave con cui due errori vengono considerati lo stesso errore ai fini del rate limit dei log.
+
+    Il testo dell'eccezione originale non ne fa parte: per gli errori del DB e dei driver contiene i
+    parametri della singola richiesta, e durante un guasto ogni occorrenza avrebbe una chiave propria.
+    Anche i numeri di URL (es. schools/12) e messaggio vengono ignorati, così la chiave corrisponde alla route.
+    """
+    return (status_code, _NUMBERS.sub("#", message), _NUMBERS.sub("#", url) if url else url,
+            type(exc).__name__ if exc is not None else None)
+
+
+def error_log_stats() -> dict[str, int]:
+    """Restituisce i contatori dei log di OrientatiException emessi e soppressi."""
+    return _error_log_limiter.stats()
+
+
 class OrientatiException(Exception):
     """Eccezione personalizzata generica per l'applicazione Orientati.
+
+    Gli errori identici vengono loggati al massimo settings.ERROR_LOG_MAX_PER_WINDOW volte per finestra;
+    lo stack del chiamante viene formattato solo quando il log viene effettivamente emesso.
+
     Attributes:
         status_code (int | None): Codice di stato HTTP della risposta, se disponibile.
         message (str): Messaggio di errore generale.
@@ -122,15 +197,26 @@ class OrientatiException(Exception):
         self.status_code = status_code
         self.details = details if details is not None else {"message": "Internal Server Error"}
         self.url = url
+        self.exc = exc
+
+        level = logging.ERROR if self.status_code >= 500 else logging.WARNING
+        if not logger.isEnabledFor(level):
+            return
+
+        suppressed = _error_log_limiter.acquire(error_log_key(self.status_code, self.message, self.url, exc))
+        if suppressed is None:
+            return
+        repeated = f" ({suppressed} ripetizioni soppresse)" if suppressed else ""
+
         if self.status_code >= 500:
-            caller_stack = "".join(traceback.format_stack()[:-1])
-            logger.error("ERRORE!\n")
-            logger.error(f"Stack del richiamante:\n{caller_stack}")
-            if exc is not None:
-                exc_tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
-                logger.error(f"ECCEZIONE ORIGINALE:\n{exc_tb}")
+            # Lo stack viene catturato solo qui, quando il log viene davvero emesso
+            caller_stack = "".join(traceback.format_stack(sys._getframe(1)))
+            exc_info = (type(exc), exc, exc.__traceback__) if exc is not None else None
+            logger.error("OrientatiException: %s (Status: %s) - URL: %s%s\nStack del richiamante:\n%s",
+                         self.message, self.status_code, self.url, repeated, caller_stack, exc_info=exc_info)
         else:
-            logger.warning(f"OrientatiException: {self.message} (Status: {self.status_code}) - URL: {self.url}")
+            logger.warning("OrientatiException: %s (Status: %s) - URL: %s%s",
+                           self.message, self.status_code, self.url, repeated)
 
 
 async_client: httpx.AsyncClient | None = None
@@ -138,7 +224,7 @@ async_client: httpx.AsyncClient | None = None
 
 async def init_client():
     global async_client
-    async_client = httpx.AsyncClient(timeout=5.0, follow_redirects=True)
+    async_client = httpx.AsyncClient(timeout=settings.HTTP_CLIENT_TIMEOUT, follow_redirects=True)
 
 
 async def close_client():
@@ -148,88 +234,163 @@ async def close_client():
         async_client = None
 
 
-async def send_request(url: HttpUrl, method: HttpMethod, endpoint: str, _params: HttpParams = None,
-                       _headers: HttpHeaders = None) -> tuple[dict | None, int]:
-    """Gestisce la risposta della richiesta HTTP.
+@dataclass
+class CachedResponse:
+    """Risposta GET memorizzata nella cache del client.
 
-    Ritorna la risposta JSON e il codice di stato HTTP o solleva HttpClientException in caso di errore.
-    Utilizza un client httpx.AsyncClient condiviso.
+    Attributes:
+        data (dict | None): Corpo JSON della risposta.
+        status_code (int): Codice di stato HTTP.
+        etag (str | None): ETag restituito dal servizio, usato per la rivalidazione.
+        expires_at (float): Istante (time.monotonic) oltre il quale la risposta va rivalidata.
+    """
+    data: dict | None
+    status_code: int
+    etag: str | None
+    expires_at: float
 
-    Args:
-        url (HttpUrl): Base URL del servizio.
-        method (HttpMethod): Metodo HTTP da utilizzare.
-        endpoint (str): Endpoint specifico del servizio.
-        _params (HttpParams, optional): Parametri della query. Defaults to None.
-        _headers (HttpHeaders, optional): Headers della richiesta. Defaults to None.
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+_response_cache = LRUCache(settings.HTTP_CACHE_MAX_ENTRIES)
+_inflight = SingleFlight()
+_cache_counters = {"hits": 0, "misses": 0, "coalesced": 0, "revalidated": 0}
+
+
+def cache_stats() -> dict[str, int]:
+    """Restituisce i contatori della cache delle risposte GET.
 
-    Raises:
-        OrientatiException: In caso di errore di connessione o eccezioni impreviste.
     Returns:
-        tuple[dict | None, int]: Una tupla contenente la risposta JSON (o None) e il codice di stato HTTP.
+        dict[str, int]: hits, misses, coalesced, revalidated e numero di elementi in cache.
     """
-    global async_client
-    if async_client is None:
-        # Fallback se il client non è stato inizializzato (es. test o script)
-        async_client = httpx.AsyncClient(timeout=5.0, follow_redirects=True)
+    return {**_cache_counters, "entries": len(_response_cache)}
 
-    full_url = f"{url.value}{API_PREFIX}{endpoint}"
-    if not full_url.endswith("/") and _params is None:
-        full_url += "/"
 
-    headers = _headers.to_dict() if _headers else HttpHeaders().to_dict()
-    params = _params.to_dict() if _params else {}
+def clear_cache() -> None:
+    """Svuota la cache delle risposte e azzera i contatori."""
+    _response_cache.clear()
+    for key in _cache_counters:
+        _cache_counters[key] = 0
+
+
+def _parse_cache_control(value: str | None) -> dict[str, str | None]:
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def _build_cache_entry(resp: httpx.Response, json_data: dict | None, status_code: int | None = None,
+                       etag: str | None = None) -> CachedResponse | None:
+    """Costruisce l'elemento di cache rispettando Cache-Control ed ETag, o None se non memorizzabile.
+
+    status_code ed etag permettono di riusare i valori della risposta originale quando resp è un 304.
+    """
+    directives = _parse_cache_control(resp.headers.get("Cache-Control"))
+    etag = resp.headers.get("ETag") or etag
+    if "no-store" in directives:
+        return None
+
+    max_age = 0
+    if "no-cache" not in directives:
+        try:
+            max_age = int(directives.get("max-age") or 0)
+        except ValueError:
+            max_age = 0
+
+    # Senza freschezza esplicita né ETag non c'è modo di riusare la risposta in modo sicuro
+    if max_age <= 0 and etag is None:
+        return None
+    return CachedResponse(data=json_data, status_code=status_code or resp.status_code, etag=etag,
+                          expires_at=time.monotonic() + max_age)
+
+
+def _request_budget(full_url: str) -> float | None:
+    """Restituisce il tempo disponibile per la chiamata in base alla scadenza della richiesta corrente.
+
+    Raises:
+        OrientatiException: Se la scadenza è già passata (504).
+    """
+    budget = deadline.remaining()
+    if budget is None:
+        return None
+    if budget <= 0:
+        raise OrientatiException(status_code=504, message="Gateway Timeout",
+                                 details={"message": "Deadline exceeded"}, url=full_url)
+    return budget
+
+
+async def _perform(method: HttpMethod, full_url: str, headers: dict, params: dict) -> httpx.Response:
+    timeout = httpx.USE_CLIENT_DEFAULT
+    budget = _request_budget(full_url)
+    if budget is not None:
+        timeout = min(budget, settings.HTTP_CLIENT_TIMEOUT)
+        # Propaga il budget residuo al servizio a valle così da non fargli fare lavoro inutile
+        headers = {**headers, deadline.DEADLINE_HEADER: str(int(budget * 1000))}
 
     try:
         match method:
             case HttpMethod.GET:
-                resp = await async_client.get(full_url, headers=headers, params=params)
+                return await async_client.get(full_url, headers=headers, params=params, timeout=timeout)
             case HttpMethod.POST:
-                resp = await async_client.post(full_url, headers=headers, json=params)
+                return await async_client.post(full_url, headers=headers, json=params, timeout=timeout)
             case HttpMethod.PUT:
-                resp = await async_client.put(full_url, headers=headers, json=params)
+                return await async_client.put(full_url, headers=headers, json=params, timeout=timeout)
             case HttpMethod.DELETE:
-                resp = await async_client.delete(full_url, headers=headers)
+                return await async_client.delete(full_url, headers=headers, timeout=timeout)
             case HttpMethod.PATCH:
-                resp = await async_client.patch(full_url, headers=headers, json=params)
+                return await async_client.patch(full_url, headers=headers, json=params, timeout=timeout)
             case _:
                 raise ValueError(f"Unsupported HTTP method: {method}")
+    except httpx.TimeoutException as e:
+        raise OrientatiException(exc=e, status_code=504, message="Gateway Timeout",
+                                 details={"message": "Upstream request timed out"}, url=full_url)
     except httpx.HTTPError as e:
         raise OrientatiException(exc=e, message="HTTP Error. Unable to fetch.", url=full_url)
     except Exception as e:
         raise OrientatiException(exc=e, url=full_url)
 
-    if resp.status_code >= 400:
-        json_body = {}
-        try:
-            if resp.content:
-                json_body = resp.json()
-                logger.info(json_body)
-        except Exception:
-            pass
 
-        try:
-            if resp.status_code < 500 and "details" in json_body and isinstance(json_body["details"],
-                                                                                dict) and "message" in json_body[
-                "details"]:
-                general_message = json_body["details"]["message"]
-            else:
-                general_message = json_body.get("message", f"HTTP Error. Unable to fetch. {resp.status_code}")
-        except KeyError:
-            general_message = f"HTTP Error. Unable to fetch. {resp.status_code}"
+def _raise_for_status(resp: httpx.Response, full_url: str) -> None:
+    if resp.status_code < 400:
+        return
 
-        try:
-            server_message = json_body.get("details", {"message": resp.text})
-        except KeyError:
-            server_message = {"message": resp.text}
+    json_body = {}
+    try:
+        if resp.content:
+            json_body = resp.json()
+            logger.info(json_body)
+    except Exception:
+        pass
 
-        try:
-            res_url = json_body.get("url", full_url)
-        except KeyError:
-            res_url = full_url
+    try:
+        if resp.status_code < 500 and "details" in json_body and isinstance(json_body["details"],
+                                                                            dict) and "message" in json_body[
+            "details"]:
+            general_message = json_body["details"]["message"]
+        else:
+            general_message = json_body.get("message", f"HTTP Error. Unable to fetch. {resp.status_code}")
+    except KeyError:
+        general_message = f"HTTP Error. Unable to fetch. {resp.status_code}"
+
+    try:
+        server_message = json_body.get("details", {"message": resp.text})
+    except KeyError:
+        server_message = {"message": resp.text}
+
+    try:
+        res_url = json_body.get("url", full_url)
+    except KeyError:
+        res_url = full_url
+
+    raise OrientatiException(message=general_message, details=server_message,
+                             url=res_url, status_code=resp.status_code)
 
-        raise OrientatiException(message=general_message, details=server_message,
-                                 url=res_url, status_code=resp.status_code)
 
+def _parse_json(resp: httpx.Response, full_url: str) -> dict | None:
     json_data = None
     try:
         if resp.content:
@@ -240,6 +401,94 @@ async def send_request(url: HttpUrl, method: HttpMethod, endpoint: str, _params:
         logger.warning(f"Failed to parse JSON response from {full_url}: {e}")
         # Non raisiamo eccezione qui, ritorniamo None come data e lasciamo gestire al chiamante
         pass
+    return json_data
+
+
+async def _cached_get(full_url: str, headers: dict, params: dict) -> tuple[dict | None, int]:
+    """Esegue una GET passando dalla cache e accorpando le richieste identiche in corso.
+
+    Ogni chiamante riceve una copia del JSON: il dict in cache (condiviso anche con le richieste accorpate)
+    non viene modificato da chi altera la risposta ricevuta.
+    """
+    key = (full_url, tuple(sorted((k, str(v)) for k, v in params.items())), headers.get("Authorization"))
+    entry: CachedResponse | None = _response_cache.get(key)
+    if entry is not None and entry.is_fresh():
+        _cache_counters["hits"] += 1
+        return copy.deepcopy(entry.data), entry.status_code
+
+    async def fetch() -> tuple[dict | None, int]:
+        request_headers = headers
+        if entry is not None and entry.etag:
+            request_headers = {**headers, "If-None-Match": entry.etag}
+
+        resp = await _perform(HttpMethod.GET, full_url, request_headers, params)
+        if resp.status_code == 304 and entry is not None:
+            _cache_counters["revalidated"] += 1
+            refreshed = _build_cache_entry(resp, entry.data, entry.status_code, entry.etag)
+            if refreshed is not None:
+                _response_cache.set(key, refreshed)
+            else:
+                _response_cache.pop(key)
+            return entry.data, entry.status_code
+
+        _raise_for_status(resp, full_url)
+        json_data = _parse_json(resp, full_url)
+        new_entry = _build_cache_entry(resp, json_data)
+        if new_entry is not None:
+            _response_cache.set(key, new_entry)
+        else:
+            _response_cache.pop(key)
+        return json_data, resp.status_code
+
+    try:
+        result, coalesced = await _inflight.do(key, fetch, wait_timeout=_request_budget(full_url))
+    except TimeoutError as e:
+        raise OrientatiException(exc=e, status_code=504, message="Gateway Timeout",
+                                 details={"message": "Deadline exceeded"}, url=full_url)
+    _cache_counters["coalesced" if coalesced else "misses"] += 1
+    json_data, status_code = result
+    return copy.deepcopy(json_data), status_code
+
+
+async def send_request(url: HttpUrl, method: HttpMethod, endpoint: str, _params: HttpParams = None,
+                       _headers: HttpHeaders = None, cache: bool = False) -> tuple[dict | None, int]:
+    """Gestisce la risposta della richiesta HTTP.
+
+    Ritorna la risposta JSON e il codice di stato HTTP o solleva HttpClientException in caso di errore.
+    Utilizza un client httpx.AsyncClient condiviso.
+
+    Args:
+        url (HttpUrl): Base URL del servizio.
+        method (HttpMethod): Metodo HTTP da utilizzare.
+        endpoint (str): Endpoint specifico del servizio.
+        _params (HttpParams, optional): Parametri della query. Defaults to None.
+        _headers (HttpHeaders, optional): Headers della richiesta. Defaults to None.
+        cache (bool, optional): Solo per GET. Riusa le risposte secondo Cache-Control/ETag del servizio
+            e accorpa le richieste identiche concorrenti in un'unica chiamata. Defaults to False.
+
+    Se la richiesta in ingresso ha una scadenza (vedi app.core.deadline), il timeout viene ridotto al tempo
+    residuo e il budget viene inoltrato al servizio a valle tramite l'header X-Request-Timeout-Ms.
+
+    Raises:
+        OrientatiException: In caso di errore di connessione o eccezioni impreviste (504 se la scadenza è superata).
+    Returns:
+        tuple[dict | None, int]: Una tupla contenente la risposta JSON (o None) e il codice di stato HTTP.
+    """
+    global async_client
+    if async_client is None:
+        # Fallback se il client non è stato inizializzato (es. test o script)
+        async_client = httpx.AsyncClient(timeout=settings.HTTP_CLIENT_TIMEOUT, follow_redirects=True)
+
+    full_url = f"{url.value}{API_PREFIX}{endpoint}"
+    if not full_url.endswith("/") and _params is None:
+        full_url += "/"
+
+    headers = _headers.to_dict() if _headers else HttpHeaders().to_dict()
+    params = _params.to_dict() if _params else {}
 
-    return json_data, resp.status_code
+    if cache and method == HttpMethod.GET:
+        return await _cached_get(full_url, headers, params)
 
+    resp = await _perform(method, full_url, headers, params)
+    _raise_for_status(resp, full_url)
+    return _parse_json(resp, full_url), resp.status_code
@@ -2,8 +2,13 @@ from __future__ import annotations
 from typing import Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models import Indirizzo
-from app.schemas.indirizzo import IndirizzoList, IndirizzoResponse, IndirizzoCreate, IndirizzoUpdate
+from app.models import Indirizzo, Materia, ScuolaSearch
+from app.services import catalog_sync
+from app.services.http_client import OrientatiException
+from app.services.matching import index as match_index
+from app.services.school import build_school_from_search
+from app.schemas.indirizzo import (IndirizzoList, IndirizzoResponse, IndirizzoCreate, IndirizzoUpdate,
+                                   IndirizziMatchRequest, IndirizziMatchList, IndirizzoMatch)
 
 def build_indirizzo(indirizzo: Indirizzo) -> IndirizzoResponse:
     return IndirizzoResponse(
@@ -61,6 +66,65 @@ async def get_indirizzo_by_id(indirizzo_id: int, db: AsyncSession) -> IndirizzoR
     except Exception as e:
         raise e
 
+async def match_indirizzi(request: IndirizziMatchRequest, db: AsyncSession) -> IndirizziMatchList:
+    """
+    Classifica gli indirizzi di studio di tutte le scuole in base alle materie preferite, dall'indice in memoria.
+
+    Args:
+        request (IndirizziMatchRequest): Materie preferite con il loro peso, numero di risultati e filtri.
+        db (AsyncSession): Sessione DB.
+
+    Returns:
+        IndirizziMatchList: Indirizzi con la relativa scuola, in ordine decrescente di copertura.
+    """
+    url = "indirizzi/match"
+    try:
+        weights: dict[int, float] = {}
+        for materia in request.materie:
+            weights[materia.materia_id] = weights.get(materia.materia_id, 0) + materia.peso
+
+        found = set((await db.execute(select(Materia.id).where(Materia.id.in_(weights)))).scalars())
+        missing = sorted(set(weights) - found)
+        if missing:
+            raise OrientatiException(
+                status_code=404,
+                url=url,
+                message="Not Found",
+                details={"message": "Materia Not Found", "ids": missing}
+            )
+
+        await match_index.ensure_fresh(db)
+        ranking = match_index.match(weights, request.k, provincia=request.provincia, regione=request.regione)
+
+        rows = {}
+        if ranking:
+            result = await db.execute(
+                select(ScuolaSearch).where(ScuolaSearch.id.in_({school_id for _, school_id, _, _ in ranking})))
+            rows = {row.id: row for row in result.scalars()}
+        risultati = []
+        for indirizzo_id, school_id, score, materie in ranking:
+            row = rows.get(school_id)
+            indirizzo = next((i for i in row.indirizzi if i["id"] == indirizzo_id), None) if row else None
+            # Indirizzo o scuola eliminati dopo l'ultimo aggiornamento dell'indice
+            if indirizzo is None:
+                continue
+            risultati.append(IndirizzoMatch(
+                score=score,
+                materie_corrispondenti=materie,
+                indirizzo=IndirizzoResponse(id=indirizzo_id, nome=indirizzo["nome"],
+                                            descrizione=indirizzo["descrizione"], id_scuola=school_id),
+                scuola=build_school_from_search(row),
+            ))
+        return IndirizziMatchList(risultati=risultati)
+
+    except OrientatiException as e:
+        raise e
+    except Exception as e:
+        raise OrientatiException(
+            url=url,
+            exc=e
+        )
+
 async def post_indirizzo(indirizzo: IndirizzoCreate, db: AsyncSession) -> IndirizzoResponse:
     try:
         # Note: Original code queried Indirizzo table to check for school existence (buggy logic in original sync code).
@@ -82,6 +146,8 @@ async def post_indirizzo(indirizzo: IndirizzoCreate, db: AsyncSession) -> Indiri
             id_scuola=indirizzo.id_scuola
         )
         db.add(new_indirizzo)
+        await db.flush()
+        await catalog_sync.entities_changed(db, "indirizzo", [new_indirizzo.id])
         await db.commit()
         await db.refresh(new_indirizzo)
         return build_indirizzo(new_indirizzo)
@@ -98,7 +164,8 @@ async def put_indirizzo(indirizzo_id: int, indirizzo: IndirizzoUpdate, db: Async
             
         existing_indirizzo.nome = indirizzo.nome
         existing_indirizzo.descrizione = indirizzo.descrizione
-        
+
+        await catalog_sync.entities_changed(db, "indirizzo", [indirizzo_id])
         await db.commit()
         await db.refresh(existing_indirizzo)
         return build_indirizzo(existing_indirizzo)
@@ -113,6 +180,9 @@ async def delete_indirizzo(indirizzo_id: int, db: AsyncSession):
         if not indirizzo:
             raise Exception("Indirizzo non trovato")
         await db.delete(indirizzo)
+        await catalog_sync.entities_changed(db, "indirizzo", [indirizzo_id])
+        # Dopo il delete l'indirizzo non è più collegabile alla scuola: la segnalo direttamente
+        await catalog_sync.entities_changed(db, "scuola", [indirizzo.id_scuola])
         await db.commit()
         return {"message": "Indirizzo eliminato con successo"}
     except Exception as e:
@@ -0,0 +1,146 @@
+"""Classifica degli indirizzi di studio in base alle materie preferite da uno studente.
+
+Ogni worker tiene in memoria una matrice indirizzo × materia e calcola la copertura delle preferenze
+(somma dei pesi delle materie insegnate / somma di tutti i pesi) per tutti gli indirizzi con un unico
+prodotto matrice × vettore. L'aggiornamento dal log catalog_changes è in app.services.catalog_index.
+"""
+from __future__ import annotations
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Indirizzo, ScuolaSearch
+from app.models.indirizzo import indirizzi_materie_table
+from app.services.catalog_index import CatalogIndex, grow, grow_columns
+
+
+class IndirizziMatchIndex(CatalogIndex):
+    """Matrice indirizzo × materia in memoria, con provincia e regione della scuola per filtrare i risultati.
+
+    Gli indirizzi vengono ricaricati per scuola: quelli eliminati restano azzerati e disattivati fino
+    alla ricostruzione successiva.
+    """
+
+    name = "indirizzi_match"
+
+    def _clear(self) -> None:
+        self.n_rows = 0
+        self.n_cols = 0
+        self.indirizzo_ids = np.zeros(0, dtype=np.int64)
+        self.school_ids = np.zeros(0, dtype=np.int64)
+        self.matrix = np.zeros((0, 0), dtype=np.uint8, order="F")
+        self.active = np.zeros(0, dtype=bool)
+        self.provincia = np.zeros(0, dtype=np.int32)
+        self.regione = np.zeros(0, dtype=np.int32)
+        self._rows: dict[int, int] = {}  # id indirizzo -> riga
+        self._by_school: dict[int, list[int]] = {}  # id scuola -> righe dei suoi indirizzi
+        self._columns: dict[int, int] = {}  # id materia -> colonna
+        self._codes: dict[str, dict[str, int]] = {"provincia": {}, "regione": {}}
+
+    def _school_count(self) -> int:
+        return len(self._by_school)
+
+    def _code(self, field: str, value: str) -> int:
+        codes = self._codes[field]
+        return codes.setdefault(value, len(codes))
+
+    def _apply(self, school_ids: set[int], data: tuple[list, list]) -> None:
+        indirizzi, links = data
+        new_rows = [row for row in indirizzi if row[0] not in self._rows]
+        new_materie = sorted({m for _, m in links if m not in self._columns})
+        size = self.n_rows + len(new_rows)
+        self.matrix = grow_columns(grow(self.matrix, size), self.n_cols + len(new_materie))
+        self.indirizzo_ids, self.school_ids, self.active, self.provincia, self.regione = (
+            grow(a, size) for a in (self.indirizzo_ids, self.school_ids, self.active, self.provincia, self.regione))
+        for indirizzo_id, *_ in new_rows:
+            self._rows[indirizzo_id] = self.n_rows
+            self.indirizzo_ids[self.n_rows] = indirizzo_id
+            self.n_rows += 1
+        for materia_id in new_materie:
+            self._columns[materia_id] = self.n_cols
+            self.n_cols += 1
+
+        # Un indirizzo spostato in un'altra scuola resta nell'elenco della precedente: lo salto
+        cleared = np.array([row for school_id in school_ids for row in self._by_school.pop(school_id, [])
+                            if self.school_ids[row] == school_id], dtype=np.int64)
+        self.matrix[cleared, :] = 0
+        self.active[cleared] = False
+        for indirizzo_id, school_id, provincia, regione in indirizzi:
+            row = self._rows[indirizzo_id]
+            self._by_school.setdefault(school_id, []).append(row)
+            self.school_ids[row] = school_id
+            self.active[row] = True
+            self.provincia[row] = self._code("provincia", provincia)
+            self.regione[row] = self._code("regione", regione)
+        if links:
+            link_rows = np.fromiter((self._rows[i] for i, _ in links), dtype=np.int64, count=len(links))
+            link_cols = np.fromiter((self._columns[m] for _, m in links), dtype=np.int64, count=len(links))
+            self.matrix[link_rows, link_cols] = 1
+
+    async def _load(self, db: AsyncSession, school_ids: set[int] | None) -> tuple[list, list]:
+        """Legge gli indirizzi con provincia e regione della scuola e i loro collegamenti alle materie: due query."""
+        # La join con il read model tiene fuori gli indirizzi di scuole senza città, come nelle liste
+        indirizzi_stmt = (select(Indirizzo.id, Indirizzo.id_scuola, ScuolaSearch.provincia, ScuolaSearch.regione)
+                          .join(ScuolaSearch, ScuolaSearch.id == Indirizzo.id_scuola))
+        links_stmt = (select(indirizzi_materie_table.c.indirizzo_id, indirizzi_materie_table.c.materia_id)
+                      .join(Indirizzo, Indirizzo.id == indirizzi_materie_table.c.indirizzo_id))
+        if school_ids is not None:
+            indirizzi_stmt = indirizzi_stmt.where(Indirizzo.id_scuola.in_(school_ids))
+            links_stmt = links_stmt.where(Indirizzo.id_scuola.in_(school_ids))
+        indirizzi = (await db.execute(indirizzi_stmt)).all()
+        known = {row[0] for row in indirizzi}
+        links = [(i, m) for i, m in (await db.execute(links_stmt)).all() if i in known]
+        return indirizzi, links
+
+    def match(self, weights: dict[int, float], k: int, provincia: str | None = None,
+              regione: str | None = None) -> list[tuple[int, int, float, list[int]]]:
+        """I k indirizzi che coprono meglio le materie preferite.
+
+        Args:
+            weights (dict[int, float]): Peso (> 0) di ogni materia preferita, per id.
+            k (int): Numero massimo di risultati.
+            provincia (str | None): Solo indirizzi di scuole di questa provincia.
+            regione (str | None): Solo indirizzi di scuole di questa regione.
+
+        Returns:
+            list[tuple[int, int, float, list[int]]]: (id indirizzo, id scuola, copertura da 0 a 1, id delle
+            materie preferite insegnate) in ordine decrescente di copertura (a parità, per id indirizzo).
+            Gli indirizzi che non insegnano nessuna delle materie non compaiono.
+        """
+        total = sum(weights.values())
+        known = [(self._columns[m], w) for m, w in weights.items() if m in self._columns]
+        n = self.n_rows
+        if not known or not n or total <= 0:
+            return []
+        columns = np.array([c for c, _ in known], dtype=np.int64)
+        vector = np.array([w for _, w in known], dtype=np.float64)
+
+        scores = self.matrix[:n, columns] @ vector / total
+        mask = self.active[:n] & (scores > 0)
+        for field, value in (("provincia", provincia), ("regione", regione)):
+            if value is not None:
+                code = self._codes[field].get(value)
+                if code is None:
+                    return []
+                mask &= getattr(self, field)[:n] == code
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+
+        scores = scores[candidates]
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((self.indirizzo_ids[candidates], -scores))
+        materie_ids = np.array([m for m in weights if m in self._columns], dtype=np.int64)
+        results = []
+        for i in order:
+            row = candidates[i]
+            taught = materie_ids[self.matrix[row, columns] > 0]
+            results.append((int(self.indirizzo_ids[row]), int(self.school_ids[row]), round(float(scores[i]), 6),
+                            sorted(int(m) for m in taught)))
+        return results
+
+
+index = IndirizziMatchIndex()
@@ -1,9 +1,12 @@
 from __future__ import annotations
 from typing import Optional
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from app.core.text import fold
 from app.models import Materia, Indirizzo
+from app.services import catalog_sync
 from app.schemas.materia import MateriaList, MateriaResponse, MateriaUpdate
 
 def build_materia(materie) -> MateriaResponse:
@@ -24,7 +27,7 @@ async def get_materie(
     try:
         stmt = select(Materia)
         if search:
-            stmt = stmt.filter(Materia.nome.ilike(f"%{search}%"))
+            stmt = stmt.filter(Materia.nome_norm.contains(fold(search)))
         
         sort_column = {
             "name": Materia.nome,
@@ -68,6 +71,12 @@ async def create_materia(materia_data: MateriaResponse, db: AsyncSession) -> Mat
             descrizione=materia_data.descrizione
         )
         db.add(nuova_materia)
+        try:
+            await db.flush()
+        except IntegrityError:
+            # nome_norm è unico: esiste già una materia con lo stesso nome (a meno di accenti e maiuscole)
+            raise Exception("Materia già esistente")
+        await catalog_sync.entities_changed(db, "materia", [nuova_materia.id])
         await db.commit()
         await db.refresh(nuova_materia)
         return build_materia(nuova_materia)
@@ -83,6 +92,11 @@ async def update_materia(materia_id: int, materia_data: MateriaUpdate, db: Async
             raise Exception(f"Materia con ID {materia_id} non trovata.")
         materia.nome = materia_data.nome
         materia.descrizione = materia_data.descrizione
+        try:
+            await db.flush()
+        except IntegrityError:
+            raise Exception("Materia già esistente")
+        await catalog_sync.entities_changed(db, "materia", [materia_id])
         await db.commit()
         await db.refresh(materia)
         return build_materia(materia)
@@ -100,6 +114,7 @@ async def delete_materia(materia_id: int, db: AsyncSession):
             raise Exception(
                 f"Impossibile eliminare la materia con ID {materia_id} perché collegata a uno o più indirizzi di studio.")
         await db.delete(materia)
+        await catalog_sync.entities_changed(db, "materia", [materia_id])
         await db.commit()
         return {"message": f"Materia {materia_id} eliminata con successo."}
     except Exception as e:
@@ -123,6 +138,7 @@ async def link_materia_to_indirizzo(materia_id: int, indirizzo_id: int, db: Asyn
             raise Exception(f"Indirizzo con ID {indirizzo_id} già collegato alla materia con ID {materia_id}.")
             
         materia.indirizzi.append(indirizzo)
+        await catalog_sync.entities_changed(db, "indirizzo", [indirizzo_id])
         await db.commit()
         await db.refresh(materia)
         return build_materia(materia)
@@ -147,6 +163,7 @@ async def unlink_materia_from_indirizzo(materia_id: int, indirizzo_id: int, db:
             raise Exception(f"Indirizzo con ID {indirizzo_id} non collegato alla materia con ID {materia_id}.")
             
         materia.indirizzi.remove(indirizzo)
+        await catalog_sync.entities_changed(db, "indirizzo", [indirizzo_id])
         await db.commit()
         await db.refresh(materia)
         return build_materia(materia)
@@ -2,26 +2,36 @@ from __future__ import annotations
 
 from typing import Optional
 
-from sqlalchemy import select, func, asc, desc
+from sqlalchemy import bindparam, delete, insert, or_, select, func, asc, desc, exists, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
 
 from app.api.deps import get_db
-from app.models import Scuola, Citta, Indirizzo
-from app.schemas.school import SchoolsList, SchoolResponse, SchoolAddress, SchoolCreate, SchoolDeleteResponse
+from app.core.text import fold
+from app.db.upsert import upsert_insert
+from app.models import Scuola, Citta, Indirizzo, Materia, ScuolaSearch
+from app.models.indirizzo import indirizzi_materie_table
+from app.schemas.school import (SchoolsList, SchoolResponse, SchoolAddress, SchoolCreate, SchoolDeleteResponse,
+                                SchoolAddressCreate, SchoolFullCreate, SchoolFullUpdate, SimilarSchool, SimilarSchoolsList)
+from app.services import catalog_sync
+from app.services.similarity import index as similarity_index
+from app.services.changes import record_changes
 from app.services.http_client import OrientatiException
 
 
+# I builder usano model_construct: i dati arrivano dal DB, già validati in scrittura, e la risposta
+# viene serializzata senza una seconda validazione (vedi app.api.responses.ModelResponse)
+
 def build_school(scuola: Scuola) -> SchoolResponse:
     def build_address(addr):
-        return SchoolAddress(
+        return SchoolAddress.model_construct(
             id=addr.id,
             nome=addr.nome,
             descrizione=addr.descrizione,
             materie=[m.nome for m in addr.materie],
         )
 
-    return SchoolResponse(
+    return SchoolResponse.model_construct(
         id=scuola.id,
         nome=scuola.nome,
         tipo=scuola.tipo,
@@ -39,6 +49,25 @@ def build_school(scuola: Scuola) -> SchoolResponse:
     )
 
 
+def build_school_from_search(row: ScuolaSearch) -> SchoolResponse:
+    return SchoolResponse.model_construct(
+        id=row.id,
+        nome=row.nome,
+        tipo=row.tipo,
+        indirizzo=row.indirizzo,
+        città=row.citta_nome,
+        provincia=row.provincia,
+        codice_postale=row.codice_postale,
+        email_contatto=row.email,
+        telefono_contatto=row.telefono,
+        indirizzi_scuola=[SchoolAddress.model_construct(**addr) for addr in row.indirizzi],
+        sito_web=row.sito_web,
+        descrizione=row.descrizione,
+        created_at=row.created_at,
+        updated_at=row.updated_at
+    )
+
+
 async def get_schools(
         db: AsyncSession,
         limit: int = 10,
@@ -48,6 +77,9 @@ async def get_schools(
         citta: Optional[str] = None,
         provincia: Optional[str] = None,
         indirizzo: Optional[str] = None,
+        materia: Optional[str] = None,
+        indirizzo_studio: Optional[str] = None,
+        regione: Optional[str] = None,
         sort_by: str = "name",
         order: str = "asc"
 ) -> SchoolsList:
@@ -58,11 +90,14 @@ async def get_schools(
         db (AsyncSession): Sessione del database.
         limit (int): Numero massimo di scuole da restituire.
         offset (int): Numero di scuole da saltare per la paginazione.
-        search (Optional[str]): Termine di ricerca per filtrare le scuole per nome.
+        search (Optional[str]): Termine di ricerca per filtrare le scuole per nome (ignora accenti e maiuscole).
         tipo (Optional[str]): Filtra per tipo di scuola (es. Liceo, ITIS, ecc.).
-        citta (Optional[str]): Filtra per città.
+        citta (Optional[str]): Filtra per città (ignora accenti e maiuscole: "forli" trova Forlì).
         provincia (Optional[str]): Filtra per provincia.
-        indirizzo (Optional[str]): Filtra per tipo di studi (es. liceo classico, informatico, ecc.).
+        indirizzo (Optional[str]): Filtra per indirizzo (via) della scuola.
+        materia (Optional[str]): Solo scuole con almeno un indirizzo di studio in cui si insegna la materia.
+        indirizzo_studio (Optional[str]): Solo scuole con un indirizzo di studio con questo nome (es. Informatica).
+        regione (Optional[str]): Filtra per regione.
         sort_by (str): Campo per ordinamento (es. nome, città, provincia).
         order (str): Ordine: 'asc' o 'desc'.
 
@@ -70,65 +105,63 @@ async def get_schools(
         SchoolsList: Lista delle scuole con metadati di paginazione.
     """
     try:
-        query = select(Scuola).join(Scuola.citta).options(
-            joinedload(Scuola.citta),
-            selectinload(Scuola.indirizzi).selectinload(Indirizzo.materie)
-        )
-        
-        # applico i filtri
+        # Le liste leggono dal read model denormalizzato: niente join né caricamento di indirizzi/materie.
+        # Nome, città e materia si confrontano con le colonne *_norm, già normalizzate da fold() in scrittura
+        filters = []
         if search:
-            query = query.filter(Scuola.nome.ilike(f"%{search}%"))
+            filters.append(ScuolaSearch.nome_norm.contains(fold(search)))
         if tipo:
-            query = query.filter(Scuola.tipo == tipo)
+            filters.append(ScuolaSearch.tipo == tipo)
         if citta:
-            query = query.filter(Citta.nome == citta)
+            filters.append(ScuolaSearch.citta_nome_norm == fold(citta))
         if provincia:
-            query = query.filter(Citta.provincia == provincia)
+            filters.append(ScuolaSearch.provincia == provincia)
         if indirizzo:
-            query = query.filter(Scuola.indirizzo.ilike(f"%{indirizzo}%"))
-            
+            filters.append(ScuolaSearch.indirizzo.ilike(f"%{indirizzo}%"))
+        if regione:
+            filters.append(ScuolaSearch.regione == regione)
+        # Filtri sugli indirizzi di studio come semi-join (EXISTS): ogni scuola compare una sola volta
+        # anche se più indirizzi corrispondono, senza DISTINCT
+        if indirizzo_studio:
+            filters.append(exists().where(
+                Indirizzo.id_scuola == ScuolaSearch.id,
+                Indirizzo.nome.ilike(f"%{indirizzo_studio}%"),
+            ))
+        if materia:
+            filters.append(exists().where(
+                Indirizzo.id_scuola == ScuolaSearch.id,
+                indirizzi_materie_table.c.indirizzo_id == Indirizzo.id,
+                Materia.id == indirizzi_materie_table.c.materia_id,
+                Materia.nome_norm.contains(fold(materia)),
+            ))
+
         # applico l'ordinamento
         sort_column = {
-            "name": Scuola.nome,
-            "citta": Citta.nome,
-            "provincia": Citta.provincia
-        }.get(sort_by, Scuola.nome)
-        
-        if order == "desc":
-            query = query.order_by(desc(sort_column))
-        else:
-            query = query.order_by(asc(sort_column))
-        
-        # Count query
-        count_query = select(func.count()).select_from(Scuola).join(Scuola.citta)
-        # Re-apply filters for count
-        if search:
-            count_query = count_query.filter(Scuola.nome.ilike(f"%{search}%"))
-        if tipo:
-            count_query = count_query.filter(Scuola.tipo == tipo)
-        if citta:
-            count_query = count_query.filter(Citta.nome == citta)
-        if provincia:
-            count_query = count_query.filter(Citta.provincia == provincia)
-        if indirizzo:
-            count_query = count_query.filter(Scuola.indirizzo.ilike(f"%{indirizzo}%"))
+            "name": ScuolaSearch.nome,
+            "citta": ScuolaSearch.citta_nome,
+            "provincia": ScuolaSearch.provincia
+        }.get(sort_by, ScuolaSearch.nome)
+        sort_column = desc(sort_column) if order == "desc" else asc(sort_column)
 
-        total_result = await db.execute(count_query)
-        total = total_result.scalar()
+        count_query = select(func.count()).select_from(ScuolaSearch).where(*filters)
+        total = (await db.execute(count_query)).scalar()
 
-        result = await db.execute(query.offset(offset).limit(limit))
-        scuole = result.scalars().all()
+        query = select(ScuolaSearch).where(*filters).order_by(sort_column).offset(offset).limit(limit)
+        scuole = (await db.execute(query)).scalars().all()
 
-        return SchoolsList(
+        return SchoolsList.model_construct(
             total=total,
             limit=limit,
             offset=offset,
-            scuole=[build_school(s) for s in scuole],
+            scuole=[build_school_from_search(s) for s in scuole],
             filter_search=search,
             filter_tipo=tipo,
             filter_citta=citta,
             filter_provincia=provincia,
             filter_indirizzo=indirizzo,
+            filter_materia=materia,
+            filter_indirizzo_studio=indirizzo_studio,
+            filter_regione=regione,
             sort_by=sort_by,
             order=order
         )
@@ -170,6 +203,55 @@ async def get_school_by_id(school_id: int, db: AsyncSession):
         )
 
 
+async def get_similar_schools(school_id: int, k: int, metric: str, provincia: Optional[str], tipo: Optional[str],
+                              db: AsyncSession) -> SimilarSchoolsList:
+    """
+    Recupera le scuole più simili a quella indicata per materie insegnate, dall'indice in memoria.
+
+    Args:
+        school_id (int): ID della scuola di riferimento.
+        k (int): Numero massimo di scuole da restituire.
+        metric (str): "jaccard" o "cosine".
+        provincia (Optional[str]): Solo scuole di questa provincia.
+        tipo (Optional[str]): Solo scuole di questo tipo.
+        db (AsyncSession): Sessione DB.
+
+    Returns:
+        SimilarSchoolsList: Scuole simili in ordine decrescente di punteggio.
+    """
+    url = f"schools/{school_id}/similar"
+    try:
+        await similarity_index.ensure_fresh(db)
+        ranking = similarity_index.similar(school_id, k, metric, provincia=provincia, tipo=tipo)
+        if ranking is None:
+            raise OrientatiException(
+                status_code=404,
+                url=url,
+                message="Not Found",
+                details={"message": "School Not Found"}
+            )
+
+        rows = {}
+        if ranking:
+            result = await db.execute(select(ScuolaSearch).where(ScuolaSearch.id.in_([i for i, _ in ranking])))
+            rows = {row.id: row for row in result.scalars()}
+        return SimilarSchoolsList.model_construct(
+            school_id=school_id,
+            metric=metric,
+            # Una scuola eliminata dopo l'ultimo aggiornamento dell'indice viene saltata
+            risultati=[SimilarSchool.model_construct(score=score, scuola=build_school_from_search(rows[i]))
+                       for i, score in ranking if i in rows],
+        )
+
+    except OrientatiException as e:
+        raise e
+    except Exception as e:
+        raise OrientatiException(
+            url=url,
+            exc=e
+        )
+
+
 async def create_school(school: SchoolCreate, db: AsyncSession) -> SchoolResponse:
     """
     Crea una nuova scuola.
@@ -205,6 +287,8 @@ async def create_school(school: SchoolCreate, db: AsyncSession) -> SchoolRespons
             descrizione=school.descrizione
         )
         db.add(nuova_scuola)
+        await db.flush()
+        await catalog_sync.entities_changed(db, "scuola", [nuova_scuola.id])
         await db.commit()
         await db.refresh(nuova_scuola)
         
@@ -298,6 +382,7 @@ async def update_school(school_id: int, school: dict, db: AsyncSession) -> Schoo
         scuola.sito_web = school["sito_web"] if find_key(school, "sito_web") else scuola.sito_web
         scuola.descrizione = school["descrizione"] if find_key(school, "descrizione") else scuola.descrizione
 
+        await catalog_sync.entities_changed(db, "scuola", [school_id])
         await db.commit()
         await db.refresh(scuola)
 
@@ -337,7 +422,12 @@ async def delete_school(school_id: int, db: AsyncSession) -> SchoolDeleteRespons
                 details={"message": "School Not Found"}
             )
 
+        # Gli indirizzi della scuola restano senza scuola (id_scuola = NULL): anche loro risultano modificati
+        indirizzi_ids = (await db.execute(
+            select(Indirizzo.id).where(Indirizzo.id_scuola == school_id))).scalars().all()
         await db.delete(scuola)
+        await catalog_sync.entities_changed(db, "scuola", [school_id])
+        await catalog_sync.entities_changed(db, "indirizzo", indirizzi_ids)
         await db.commit()
 
         return SchoolDeleteResponse()
@@ -349,3 +439,249 @@ async def delete_school(school_id: int, db: AsyncSession) -> SchoolDeleteRespons
             url=f"schools/{school_id}/delete",
             exc=e
         )
+
+
+def _school_values(school: SchoolCreate) -> dict:
+    # Statement Core: i validator del modello non intervengono, nome_norm va calcolato qui
+    return {
+        "nome": school.nome,
+        "nome_norm": fold(school.nome),
+        "tipo": school.tipo,
+        "indirizzo": school.indirizzo,
+        "id_citta": school.citta_id,
+        "email": school.email_contatto,
+        "telefono": school.telefono_contatto,
+        "sito_web": school.sito_web,
+        "descrizione": school.descrizione,
+    }
+
+
+async def _check_nested_payload(school: SchoolFullCreate | SchoolFullUpdate, db: AsyncSession, url: str) -> None:
+    nomi = [indirizzo.nome for indirizzo in school.indirizzi_scuola]
+    if len(set(nomi)) != len(nomi):
+        raise OrientatiException(
+            status_code=422,
+            url=url,
+            message="Unprocessable Entity",
+            details={"message": "Duplicate indirizzo name"}
+        )
+    if (await db.execute(select(Citta.id).where(Citta.id == school.citta_id))).scalar() is None:
+        raise OrientatiException(
+            status_code=404,
+            url=url,
+            message="Not Found",
+            details={"message": "City Not Found"}
+        )
+
+
+async def _create_materie(names: dict[str, str], db: AsyncSession) -> dict[str, int]:
+    """Crea con un solo insert le materie indicate (nome_norm -> nome) e ne restituisce gli id per nome_norm.
+
+    nome_norm è unico: le materie create nel frattempo da una richiesta concorrente non vengono duplicate
+    ma riutilizzate.
+    """
+    result = await db.execute(
+        upsert_insert(db, Materia)
+        .values([{"nome": nome, "nome_norm": nome_norm, "descrizione": ""} for nome_norm, nome in names.items()])
+        .on_conflict_do_nothing(index_elements=[Materia.nome_norm])
+        .returning(Materia.id, Materia.nome_norm)
+    )
+    created = {nome_norm: materia_id for materia_id, nome_norm in result}
+    await record_changes(db, "materia", created.values(), deleted=False)
+
+    # RETURNING non restituisce le righe in conflitto: i loro id vanno letti a parte
+    concurrent = [nome_norm for nome_norm in names if nome_norm not in created]
+    if concurrent:
+        result = await db.execute(select(Materia.id, Materia.nome_norm).where(Materia.nome_norm.in_(concurrent)))
+        created.update({nome_norm: materia_id for materia_id, nome_norm in result})
+    return created
+
+
+async def _resolve_materie(indirizzi: list[SchoolAddressCreate], db: AsyncSession, url: str) -> dict[int | str, int]:
+    """Risolve gli id e i nomi delle materie in id con una query, creando con un solo insert quelle nuove.
+
+    I nomi vengono confrontati con nome_norm (senza accenti e maiuscole); a parità di nome vince la materia più vecchia.
+    """
+    # In ordine di payload: tra le grafie dello stesso nome nuovo si crea la prima
+    refs = list(dict.fromkeys(ref for indirizzo in indirizzi for ref in indirizzo.materie))
+    ids = {ref for ref in refs if isinstance(ref, int)}
+    names: dict[str, str] = {}
+    for ref in refs:
+        if isinstance(ref, str):
+            names.setdefault(fold(ref), ref)
+    if not refs:
+        return {}
+
+    conditions = []
+    if ids:
+        conditions.append(Materia.id.in_(ids))
+    if names:
+        conditions.append(Materia.nome_norm.in_(names))
+    found = (await db.execute(
+        select(Materia.id, Materia.nome_norm).where(or_(*conditions)).order_by(Materia.id))).all()
+
+    resolved: dict[int | str, int] = {}
+    by_name: dict[str, int] = {}
+    for materia_id, nome_norm in found:
+        if materia_id in ids:
+            resolved[materia_id] = materia_id
+        by_name.setdefault(nome_norm, materia_id)
+
+    missing = sorted(ids - resolved.keys())
+    if missing:
+        raise OrientatiException(
+            status_code=404,
+            url=url,
+            message="Not Found",
+            details={"message": "Materia Not Found", "ids": missing}
+        )
+
+    new_names = {nome_norm: nome for nome_norm, nome in names.items() if nome_norm not in by_name}
+    if new_names:
+        by_name.update(await _create_materie(new_names, db))
+
+    # Ogni grafia ricevuta (es. "Storia" e "storia") punta alla stessa materia
+    resolved.update({ref: by_name[fold(ref)] for ref in refs if isinstance(ref, str)})
+    return resolved
+
+
+async def _write_indirizzi(school_id: int, indirizzi: list[SchoolAddressCreate], existing: list[tuple[int, str]],
+                           db: AsyncSession, url: str) -> None:
+    """Porta gli indirizzi di studio della scuola (e i loro collegamenti alle materie) a quelli indicati.
+
+    Gli indirizzi esistenti con lo stesso nome mantengono il proprio id; gli altri vengono eliminati.
+    Ogni passo è un solo statement, indipendentemente dal numero di indirizzi e materie.
+
+    Args:
+        school_id (int): ID della scuola.
+        indirizzi (list[SchoolAddressCreate]): Elenco completo degli indirizzi di studio.
+        existing (list[tuple[int, str]]): Indirizzi attuali della scuola (id, nome), in ordine di id.
+        db (AsyncSession): Sessione DB.
+        url (str): URL per gli errori.
+    """
+    materie = await _resolve_materie(indirizzi, db, url)
+    wanted = {indirizzo.nome for indirizzo in indirizzi}
+    # POST /indirizzi ammette più indirizzi con lo stesso nome: si tiene il più vecchio, gli altri vanno eliminati
+    kept: dict[str, int] = {}
+    removed = []
+    for indirizzo_id, nome in existing:
+        if nome in wanted and nome not in kept:
+            kept[nome] = indirizzo_id
+        else:
+            removed.append(indirizzo_id)
+
+    if existing:
+        await db.execute(delete(indirizzi_materie_table)
+                         .where(indirizzi_materie_table.c.indirizzo_id.in_([row[0] for row in existing])))
+    if removed:
+        await db.execute(delete(Indirizzo).where(Indirizzo.id.in_(removed)))
+    if kept:
+        await db.execute(
+            update(Indirizzo.__table__).where(Indirizzo.__table__.c.id == bindparam("b_id")),
+            [{"b_id": kept[indirizzo.nome], "descrizione": indirizzo.descrizione}
+             for indirizzo in indirizzi if indirizzo.nome in kept]
+        )
+
+    ids = dict(kept)
+    new = [indirizzo for indirizzo in indirizzi if indirizzo.nome not in kept]
+    if new:
+        result = await db.execute(
+            insert(Indirizzo)
+            .values([{"nome": i.nome, "descrizione": i.descrizione, "id_scuola": school_id} for i in new])
+            .returning(Indirizzo.id, Indirizzo.nome)
+        )
+        ids.update({nome: indirizzo_id for indirizzo_id, nome in result})
+
+    links = {(ids[indirizzo.nome], materie[ref]) for indirizzo in indirizzi for ref in indirizzo.materie}
+    if links:
+        await db.execute(insert(indirizzi_materie_table),
+                         [{"indirizzo_id": indirizzo_id, "materia_id": materia_id} for indirizzo_id, materia_id in links])
+
+    await record_changes(db, "indirizzo", ids.values(), deleted=False)
+    await record_changes(db, "indirizzo", removed, deleted=True)
+
+
+async def _read_written_school(school_id: int, db: AsyncSession) -> SchoolResponse:
+    # Read model appena ricalcolato: la risposta completa con una sola query
+    await catalog_sync.refresh_schools(db, [school_id])
+    row = (await db.execute(select(ScuolaSearch).where(ScuolaSearch.id == school_id))).scalar_one()
+    return build_school_from_search(row)
+
+
+async def create_school_full(school: SchoolFullCreate, db: AsyncSession) -> SchoolResponse:
+    """
+    Crea una scuola con i suoi indirizzi di studio e le relative materie in un'unica transazione.
+
+    Args:
+        school (SchoolFullCreate): Dati della scuola, dei suoi indirizzi e delle materie (id o nomi).
+        db (AsyncSession): Sessione DB.
+
+    Returns:
+        SchoolResponse: Dettagli della scuola creata, indirizzi e materie compresi.
+    """
+    url = "schools/full"
+    try:
+        await _check_nested_payload(school, db, url)
+        school_id = (await db.execute(
+            insert(Scuola).values(_school_values(school)).returning(Scuola.id))).scalar_one()
+        await _write_indirizzi(school_id, school.indirizzi_scuola, [], db, url)
+        await record_changes(db, "scuola", [school_id], deleted=False)
+
+        response = await _read_written_school(school_id, db)
+        await db.commit()
+        return response
+
+    except OrientatiException as e:
+        raise e
+    except Exception as e:
+        raise OrientatiException(
+            url=url,
+            exc=e
+        )
+
+
+async def replace_school_full(school_id: int, school: SchoolFullUpdate, db: AsyncSession) -> SchoolResponse:
+    """
+    Sostituisce i dati di una scuola e l'elenco completo dei suoi indirizzi di studio e materie in un'unica transazione.
+
+    Gli indirizzi già presenti con lo stesso nome mantengono il loro id, quelli non più elencati vengono eliminati.
+
+    Args:
+        school_id (int): ID della scuola da sostituire.
+        school (SchoolFullUpdate): Nuovi dati della scuola, dei suoi indirizzi e delle materie (id o nomi).
+        db (AsyncSession): Sessione DB.
+
+    Returns:
+        SchoolResponse: Dettagli della scuola aggiornata, indirizzi e materie compresi.
+    """
+    url = f"schools/{school_id}/full"
+    try:
+        await _check_nested_payload(school, db, url)
+        updated = (await db.execute(
+            update(Scuola.__table__).where(Scuola.__table__.c.id == school_id)
+            .values(_school_values(school)).returning(Scuola.__table__.c.id)
+        )).scalar()
+        if updated is None:
+            raise OrientatiException(
+                status_code=404,
+                url=url,
+                message="Not Found",
+                details={"message": "School Not Found"}
+            )
+
+        existing = [tuple(row) for row in await db.execute(
+            select(Indirizzo.id, Indirizzo.nome).where(Indirizzo.id_scuola == school_id).order_by(Indirizzo.id))]
+        await _write_indirizzi(school_id, school.indirizzi_scuola, existing, db, url)
+        await record_changes(db, "scuola", [school_id], deleted=False)
+
+        response = await _read_written_school(school_id, db)
+        await db.commit()
+        return response
+
+    except OrientatiException as e:
+        raise e
+    except Exception as e:
+        raise OrientatiException(
+            url=url,
+            exc=e
+        )
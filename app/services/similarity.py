@@ -0,0 +1,152 @@
+"""Scuole simili in base alle materie insegnate nei loro indirizzi di studio.
+
+Ogni worker tiene in memoria una matrice scuola × materia (1 se la materia è insegnata in almeno un
+indirizzo della scuola) e calcola la similarità di Jaccard o coseno con una scuola rispetto a tutte
+le altre in un'unica operazione vettoriale NumPy. L'aggiornamento dal log catalog_changes è in
+app.services.catalog_index.
+"""
+from __future__ import annotations
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Indirizzo, ScuolaSearch
+from app.models.indirizzo import indirizzi_materie_table
+from app.services.catalog_index import CatalogIndex, grow, grow_columns
+
+METRICS = ("jaccard", "cosine")
+
+
+class SimilarityIndex(CatalogIndex):
+    """Matrice scuola × materia in memoria, con tipo e provincia per filtrare i risultati.
+
+    La matrice è di uint8 in ordine Fortran: le colonne (materie) sono contigue, quindi sommare le
+    colonne delle materie della scuola di riferimento costa O(scuole × materie della scuola).
+    Le righe delle scuole eliminate restano azzerate e disattivate fino alla ricostruzione successiva.
+    """
+
+    name = "similarity"
+
+    def _clear(self) -> None:
+        self.n_rows = 0
+        self.n_cols = 0
+        self.school_ids = np.zeros(0, dtype=np.int64)
+        self.matrix = np.zeros((0, 0), dtype=np.uint8, order="F")
+        self.sizes = np.zeros(0, dtype=np.int32)  # materie distinte per scuola
+        self.active = np.zeros(0, dtype=bool)
+        self.tipo = np.zeros(0, dtype=np.int32)
+        self.provincia = np.zeros(0, dtype=np.int32)
+        self._rows: dict[int, int] = {}  # id scuola -> riga
+        self._columns: dict[int, int] = {}  # id materia -> colonna
+        self._codes: dict[str, dict[str, int]] = {"tipo": {}, "provincia": {}}
+
+    def _school_count(self) -> int:
+        return self.n_rows
+
+    def _code(self, field: str, value: str) -> int:
+        codes = self._codes[field]
+        return codes.setdefault(value, len(codes))
+
+    def _apply(self, school_ids: set[int], data: tuple[list, list]) -> None:
+        schools, links = data
+        new_schools = [school_id for school_id, _, _ in schools if school_id not in self._rows]
+        new_materie = sorted({m for _, m in links if m not in self._columns})
+        size = self.n_rows + len(new_schools)
+        self.matrix = grow_columns(grow(self.matrix, size), self.n_cols + len(new_materie))
+        self.school_ids, self.sizes, self.active, self.tipo, self.provincia = (
+            grow(a, size) for a in (self.school_ids, self.sizes, self.active, self.tipo, self.provincia))
+        for school_id in new_schools:
+            self._rows[school_id] = self.n_rows
+            self.school_ids[self.n_rows] = school_id
+            self.n_rows += 1
+        for materia_id in new_materie:
+            self._columns[materia_id] = self.n_cols
+            self.n_cols += 1
+
+        cleared = np.fromiter((self._rows[i] for i in school_ids if i in self._rows), dtype=np.int64)
+        self.matrix[cleared, :] = 0
+        self.active[cleared] = False
+        self.sizes[cleared] = 0
+        for school_id, tipo, provincia in schools:
+            row = self._rows[school_id]
+            self.active[row] = True
+            self.tipo[row] = self._code("tipo", tipo)
+            self.provincia[row] = self._code("provincia", provincia)
+        if links:
+            link_rows = np.fromiter((self._rows[s] for s, _ in links), dtype=np.int64, count=len(links))
+            link_cols = np.fromiter((self._columns[m] for _, m in links), dtype=np.int64, count=len(links))
+            self.matrix[link_rows, link_cols] = 1
+        written = np.fromiter((self._rows[school_id] for school_id, _, _ in schools), dtype=np.int64)
+        if len(written):
+            self.sizes[written] = self.matrix[written, :self.n_cols].sum(axis=1, dtype=np.int32)
+
+    async def _load(self, db: AsyncSession, school_ids: set[int] | None) -> tuple[list, list]:
+        """Legge tipo e provincia delle scuole e le coppie (scuola, materia) distinte: due query."""
+        schools_stmt = select(ScuolaSearch.id, ScuolaSearch.tipo, ScuolaSearch.provincia)
+        links_stmt = (select(Indirizzo.id_scuola, indirizzi_materie_table.c.materia_id)
+                      .join(indirizzi_materie_table, indirizzi_materie_table.c.indirizzo_id == Indirizzo.id)
+                      .where(Indirizzo.id_scuola.is_not(None))
+                      .distinct())
+        if school_ids is not None:
+            schools_stmt = schools_stmt.where(ScuolaSearch.id.in_(school_ids))
+            links_stmt = links_stmt.where(Indirizzo.id_scuola.in_(school_ids))
+        schools = (await db.execute(schools_stmt)).all()
+        # Solo le scuole presenti nel read model (con una città) finiscono nell'indice
+        known = {school_id for school_id, _, _ in schools}
+        links = [(s, m) for s, m in (await db.execute(links_stmt)).all() if s in known]
+        return schools, links
+
+    # --- interrogazione ---
+
+    def similar(self, school_id: int, k: int, metric: str = "jaccard", provincia: str | None = None,
+                tipo: str | None = None) -> list[tuple[int, float]] | None:
+        """Le k scuole più simili a school_id per materie insegnate.
+
+        Args:
+            school_id (int): Scuola di riferimento.
+            k (int): Numero massimo di risultati.
+            metric (str): "jaccard" (|A∩B| / |A∪B|) oppure "cosine" (|A∩B| / sqrt(|A|·|B|)).
+            provincia (str | None): Solo scuole di questa provincia.
+            tipo (str | None): Solo scuole di questo tipo.
+
+        Returns:
+            list[tuple[int, float]] | None: Coppie (id scuola, punteggio) in ordine decrescente di
+            punteggio (a parità, per id); None se la scuola non è nell'indice.
+        """
+        row = self._rows.get(school_id)
+        if row is None or not self.active[row]:
+            return None
+        n = self.n_rows
+        columns = np.flatnonzero(self.matrix[row, :self.n_cols])
+        if not len(columns):
+            return []
+
+        intersection = self.matrix[:n, columns].sum(axis=1, dtype=np.int32)
+        mask = self.active[:n] & (intersection > 0)
+        mask[row] = False
+        for field, value in (("provincia", provincia), ("tipo", tipo)):
+            if value is not None:
+                code = self._codes[field].get(value)
+                if code is None:
+                    return []
+                mask &= getattr(self, field)[:n] == code
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+
+        inter = intersection[candidates].astype(np.float64)
+        sizes = self.sizes[candidates].astype(np.float64)
+        if metric == "cosine":
+            scores = inter / np.sqrt(sizes * len(columns))
+        else:
+            scores = inter / (sizes + len(columns) - inter)
+
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((self.school_ids[candidates], -scores))
+        return [(int(self.school_ids[candidates[i]]), round(float(scores[i]), 6)) for i in order]
+
+
+index = SimilarityIndex()
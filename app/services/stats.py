@@ -0,0 +1,185 @@
+"""Statistiche aggregate del catalogo per GET /stats, mantenute nella tabella catalog_stats.
+
+I conteggi derivano dalle righe di scuole_search: ogni volta che catalog_sync le ricalcola applica la
+differenza tra le righe vecchie e le nuove con un upsert "total = total + delta", corretto anche con più
+worker che scrivono in parallelo. GET /stats legge quindi poche righe, indipendentemente dalla dimensione
+del catalogo, e riutilizza la risposta per settings.STATS_CACHE_SECONDS.
+
+Ricalcolo completo (es. dopo un import diretto nel DB):
+    python -m app.services.stats --batch-size 1000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, Mapping
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import SingleFlight
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.upsert import upsert_insert
+from app.models import CatalogStat, ScuolaSearch
+from app.schemas.stats import CatalogStats, StatEntry
+
+logger = get_logger(__name__)
+
+# Colonne di scuole_search da cui derivano i conteggi
+SOURCE_COLUMNS = (ScuolaSearch.regione, ScuolaSearch.provincia, ScuolaSearch.tipo, ScuolaSearch.indirizzi)
+
+_cache: dict = {"expires": float("-inf"), "value": None}
+_flight = SingleFlight()
+
+
+def count_rows(rows: Iterable[Mapping]) -> Counter:
+    """Conteggi (dimensione, valore) di un insieme di righe di scuole_search.
+
+    Args:
+        rows (Iterable[Mapping]): Righe con regione, provincia, tipo e indirizzi.
+
+    Returns:
+        Counter: Totali per ("totale", "scuole"|"indirizzi"), ("regione", ...), ("provincia", ...),
+        ("tipo", ...) e ("materia", nome) = indirizzi in cui la materia è insegnata.
+    """
+    counts = Counter()
+    for row in rows:
+        counts["totale", "scuole"] += 1
+        counts["regione", row["regione"]] += 1
+        counts["provincia", row["provincia"]] += 1
+        counts["tipo", row["tipo"]] += 1
+        for indirizzo in row["indirizzi"]:
+            counts["totale", "indirizzi"] += 1
+            for materia in set(indirizzo["materie"]):
+                counts["materia", materia] += 1
+    return counts
+
+
+async def apply_delta(db: AsyncSession, old_rows: Iterable[Mapping], new_rows: Iterable[Mapping]) -> None:
+    """Aggiorna catalog_stats nella transazione corrente dopo la sostituzione di righe di scuole_search.
+
+    Nessuno statement se i conteggi non cambiano (es. modifica del solo nome di una scuola).
+    """
+    delta = count_rows(new_rows)
+    delta.subtract(count_rows(old_rows))
+    values = [{"dimension": dimension, "value": value, "total": total}
+              for (dimension, value), total in sorted(delta.items()) if total]
+    if not values:
+        return
+    stmt = upsert_insert(db, CatalogStat)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CatalogStat.dimension, CatalogStat.value],
+            set_={"total": CatalogStat.total + stmt.excluded.total},
+        ),
+        values,
+    )
+
+
+def _entries(rows: list[CatalogStat], dimension: str) -> list[StatEntry]:
+    entries = [StatEntry(valore=row.value, totale=row.total) for row in rows if row.dimension == dimension]
+    return sorted(entries, key=lambda e: (-e.totale, e.valore))
+
+
+async def _read_stats(db: AsyncSession) -> CatalogStats:
+    rows = (await db.execute(select(CatalogStat).where(CatalogStat.total > 0))).scalars().all()
+    totals = {row.value: row.total for row in rows if row.dimension == "totale"}
+    return CatalogStats(
+        scuole=totals.get("scuole", 0),
+        indirizzi=totals.get("indirizzi", 0),
+        scuole_per_regione=_entries(rows, "regione"),
+        scuole_per_provincia=_entries(rows, "provincia"),
+        scuole_per_tipo=_entries(rows, "tipo"),
+        indirizzi_per_materia=_entries(rows, "materia"),
+        generated_at=datetime.now(timezone.utc),
+    )
+
+
+async def get_stats(db: AsyncSession) -> CatalogStats:
+    """
+    Restituisce le statistiche del catalogo, dalla cache del worker se lette da meno di settings.STATS_CACHE_SECONDS.
+
+    Args:
+        db (AsyncSession): Sessione DB.
+
+    Returns:
+        CatalogStats: Totali e conteggi per regione, provincia, tipo e materia.
+    """
+    if time.monotonic() < _cache["expires"]:
+        return _cache["value"]
+
+    async def load():
+        value = await _read_stats(db)
+        _cache.update(value=value, expires=time.monotonic() + settings.STATS_CACHE_SECONDS)
+        return value
+
+    # Alla scadenza della cache le richieste concorrenti condividono una sola lettura
+    value, _ = await _flight.do("stats", load)
+    return value
+
+
+def clear_cache() -> None:
+    _cache.update(value=None, expires=float("-inf"))
+
+
+async def recompute_stats(session_factory, batch_size: int = 1000) -> int:
+    """Ricalcola da zero catalog_stats leggendo scuole_search a blocchi, poi sostituisce la tabella in un'unica transazione.
+
+    Le scritture concorrenti al ricalcolo possono andare perse: va eseguito a catalogo fermo.
+
+    Args:
+        session_factory: Factory delle sessioni asincrone (es. AsyncSessionLocal).
+        batch_size (int): Scuole lette per blocco.
+
+    Returns:
+        int: Numero di scuole conteggiate.
+    """
+    counts = Counter()
+    processed = 0
+    last_id = 0
+    async with session_factory() as db:
+        while True:
+            rows = (await db.execute(
+                select(ScuolaSearch.id, *SOURCE_COLUMNS)
+                .where(ScuolaSearch.id > last_id).order_by(ScuolaSearch.id).limit(batch_size)
+            )).mappings().all()
+            if not rows:
+                break
+            counts.update(count_rows(rows))
+            processed += len(rows)
+            last_id = rows[-1]["id"]
+
+        await db.execute(delete(CatalogStat))
+        if counts:
+            await db.execute(insert(CatalogStat), [
+                {"dimension": dimension, "value": value, "total": total}
+                for (dimension, value), total in sorted(counts.items())
+            ])
+        await db.commit()
+    return processed
+
+
+async def _main(batch_size: int) -> None:
+    from app.core.logging import setup_logging, shutdown_logging
+    from app.db.base import import_models
+    from app.db.session import AsyncSessionLocal, engine
+
+    import_models()
+    setup_logging()
+    started = time.perf_counter()
+    try:
+        processed = await recompute_stats(AsyncSessionLocal, batch_size)
+        logger.info("Recomputed catalog_stats from %d schools in %.1fs", processed, time.perf_counter() - started)
+    finally:
+        await engine.dispose()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ricalcola le statistiche aggregate del catalogo (catalog_stats).")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(_main(parser.parse_args().batch_size))
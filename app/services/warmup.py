@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db import session
+from app.services import citta as citta_service
+from app.services import indirizzi as indirizzi_service
+from app.services import materie as materie_service
+from app.services import school as school_service
+from app.services.matching import index as match_index
+from app.services.similarity import index as similarity_index
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class WarmupState:
+    """Stato del warm-up del worker corrente, letto da /ready.
+
+    Attributes:
+        done (bool): True quando il warm-up è terminato (anche se fallito o disabilitato).
+        duration (float | None): Durata in secondi.
+        connections (int): Connessioni aperte in anticipo nel pool.
+        error (str | None): Primo errore incontrato, se presente.
+    """
+    done: bool = False
+    duration: float | None = None
+    connections: int = 0
+    error: str | None = None
+
+
+state = WarmupState()
+
+
+async def _open_connections(target, n: int) -> int:
+    """Apre n connessioni in parallelo e le restituisce al pool, che le tiene aperte per le prime richieste."""
+    async def checkout():
+        return await target.connect()
+
+    results = await asyncio.gather(*(checkout() for _ in range(n)), return_exceptions=True)
+    opened = [conn for conn in results if not isinstance(conn, BaseException)]
+    for conn in opened:
+        await conn.close()
+    errors = [e for e in results if isinstance(e, BaseException)]
+    if errors:
+        raise errors[0]
+    return len(opened)
+
+
+async def _run_hot_queries(session_factory) -> None:
+    """Esegue le query più frequenti tramite i service, così SQLAlchemy compila e mette in cache gli statement
+    e pydantic costruisce i serializer di SchoolsList/SchoolResponse prima del primo utente."""
+    async with session_factory() as db:
+        schools = await school_service.get_schools(db, limit=10)
+        await school_service.get_schools(db, limit=10, search="a", sort_by="citta")
+        if schools.scuole:
+            school = await school_service.get_school_by_id(schools.scuole[0].id, db)
+            if school:
+                school.model_dump(mode="json")
+        schools.model_dump(mode="json")
+
+        # Dati di riferimento: piccoli e letti da quasi ogni client
+        await materie_service.get_materie(db, limit=100, offset=0, search=None, sort_by="name", order="asc")
+        await citta_service.get_citta(db, limit=100, offset=0, search=None, sort_by="name", order="asc")
+        await indirizzi_service.get_indirizzi(db, limit=10, offset=0, search=None, sort_by="name", order="asc")
+
+        # Indici in memoria: la prima costruzione legge tutto il catalogo
+        await similarity_index.ensure_fresh(db)
+        await match_index.ensure_fresh(db)
+
+
+async def warm_up() -> WarmupState:
+    """Prepara il worker al traffico: apre le connessioni del pool ed esegue le query calde.
+
+    Il numero di connessioni è settings.WARMUP_CONNECTIONS (0 = DB_POOL_SIZE), limitato a DB_POOL_SIZE
+    perché le connessioni in overflow verrebbero chiuse appena restituite. Non solleva mai eccezioni:
+    un warm-up fallito o oltre settings.WARMUP_TIMEOUT viene solo loggato e il worker viene dichiarato pronto.
+
+    Returns:
+        WarmupState: Stato finale del warm-up.
+    """
+    started = time.perf_counter()
+    connections = min(settings.WARMUP_CONNECTIONS or settings.DB_POOL_SIZE, settings.DB_POOL_SIZE)
+    targets = [(session.engine, session.AsyncSessionLocal)]
+    if session.replica_engine is not None:
+        targets.append((session.replica_engine, session.ReplicaSessionLocal))
+
+    async def run():
+        for target, session_factory in targets:
+            state.connections += await _open_connections(target, connections)
+            await _run_hot_queries(session_factory)
+
+    try:
+        await asyncio.wait_for(run(), settings.WARMUP_TIMEOUT)
+    except Exception as e:
+        state.error = str(e) or type(e).__name__
+        logger.warning("Warm-up failed after %.0fms: %s", (time.perf_counter() - started) * 1000, state.error)
+    finally:
+        state.duration = time.perf_counter() - started
+        state.done = True
+
+    if state.error is None:
+        logger.info("Warm-up completed in %.0fms (%d connections opened)", state.duration * 1000, state.connections)
+    return state
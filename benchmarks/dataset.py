@@ -0,0 +1,179 @@
+"""Dataset sintetico deterministico a scala nazionale per i benchmark.
+
+Con scale=1.0 genera circa 8k comuni, 60k scuole, 200k indirizzi di studio e ~8 materie per indirizzo.
+A parità di seed e scale il dataset è sempre identico, così i risultati di run diversi sono confrontabili.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.text import fold
+from app.models import Citta, Indirizzo, Materia, Scuola, ScuolaSearch
+from app.models.indirizzo import indirizzi_materie_table
+from app.services.catalog_sync import rebuild_search
+
+REGIONI = {
+    "Piemonte": ["TO", "CN", "AL", "AT", "NO", "VC", "BI", "VB"],
+    "Valle d'Aosta": ["AO"],
+    "Lombardia": ["MI", "BG", "BS", "CO", "CR", "LC", "LO", "MN", "MB", "PV", "SO", "VA"],
+    "Trentino-Alto Adige": ["TN", "BZ"],
+    "Veneto": ["VE", "VR", "VI", "PD", "TV", "BL", "RO"],
+    "Friuli-Venezia Giulia": ["TS", "UD", "PN", "GO"],
+    "Liguria": ["GE", "SP", "SV", "IM"],
+    "Emilia-Romagna": ["BO", "MO", "PR", "RE", "FE", "RA", "FC", "RN", "PC"],
+    "Toscana": ["FI", "PI", "LI", "LU", "MS", "PT", "PO", "AR", "SI", "GR"],
+    "Umbria": ["PG", "TR"],
+    "Marche": ["AN", "PU", "MC", "FM", "AP"],
+    "Lazio": ["RM", "LT", "FR", "RI", "VT"],
+    "Abruzzo": ["AQ", "TE", "PE", "CH"],
+    "Molise": ["CB", "IS"],
+    "Campania": ["NA", "SA", "CE", "AV", "BN"],
+    "Puglia": ["BA", "BT", "BR", "FG", "LE", "TA"],
+    "Basilicata": ["PZ", "MT"],
+    "Calabria": ["CZ", "CS", "KR", "RC", "VV"],
+    "Sicilia": ["PA", "CT", "ME", "AG", "CL", "EN", "RG", "SR", "TP"],
+    "Sardegna": ["CA", "SS", "NU", "OR", "SU"],
+}
+
+TIPI_SCUOLA = ["Liceo", "Istituto Tecnico", "Istituto Professionale", "ITIS", "Liceo Artistico", "Convitto"]
+
+INDIRIZZI_STUDIO = [
+    "Scientifico", "Scienze Applicate", "Classico", "Linguistico", "Scienze Umane", "Economico Sociale",
+    "Artistico", "Musicale", "Informatica e Telecomunicazioni", "Elettronica ed Elettrotecnica", "Meccanica",
+    "Chimica e Biotecnologie", "Costruzioni Ambiente e Territorio", "Amministrazione Finanza e Marketing",
+    "Turismo", "Agraria", "Grafica e Comunicazione", "Trasporti e Logistica", "Enogastronomia", "Moda",
+]
+
+MATERIE = [
+    "Italiano", "Latino", "Greco", "Inglese", "Francese", "Spagnolo", "Tedesco", "Storia", "Geografia",
+    "Filosofia", "Matematica", "Fisica", "Chimica", "Biologia", "Scienze della Terra", "Informatica",
+    "Sistemi e Reti", "Tecnologie e Progettazione", "Telecomunicazioni", "Elettronica", "Elettrotecnica",
+    "Meccanica", "Disegno", "Storia dell'Arte", "Educazione Fisica", "Religione", "Diritto", "Economia",
+    "Economia Aziendale", "Psicologia", "Sociologia", "Pedagogia", "Musica", "Discipline Pittoriche",
+    "Discipline Plastiche", "Topografia", "Estimo", "Logistica", "Enogastronomia", "Sala e Vendita",
+]
+
+_SILLABE = ["ca", "sa", "no", "ri", "val", "mon", "te", "bor", "go", "lì", "cit", "tà", "san", "t'an", "na",
+            "pie", "ve", "ra", "gio", "fer", "ma", "ro", "li", "vo", "ne", "ù", "ter", "mi", "po", "lo"]
+
+CHUNK = 2000
+
+
+@dataclass
+class DatasetSize:
+    comuni: int
+    scuole: int
+    indirizzi: int
+    materie: int = len(MATERIE)
+    materie_per_indirizzo: int = 8
+
+    @classmethod
+    def for_scale(cls, scale: float) -> "DatasetSize":
+        return cls(
+            comuni=max(int(8000 * scale), 20),
+            scuole=max(int(60000 * scale), 50),
+            indirizzi=max(int(200000 * scale), 150),
+        )
+
+
+def _nome_comune(rng: random.Random, used: set[str]) -> str:
+    while True:
+        nome = "".join(rng.choice(_SILLABE) for _ in range(rng.randint(2, 4))).capitalize()
+        if rng.random() < 0.15:
+            nome = f"{nome} di {rng.choice(_SILLABE).capitalize()}{rng.choice(_SILLABE)}"
+        if nome not in used:
+            used.add(nome)
+            return nome
+
+
+async def _insert_chunks(conn, table, rows: list[dict]) -> None:
+    for start in range(0, len(rows), CHUNK):
+        await conn.execute(insert(table), rows[start:start + CHUNK])
+
+
+async def seed(engine: AsyncEngine, scale: float = 1.0, seed: int = 42) -> DatasetSize:
+    """Popola il database con il dataset sintetico (le tabelle devono esistere ed essere vuote).
+
+    Args:
+        engine (AsyncEngine): Engine del database da popolare.
+        scale (float): Fattore di scala rispetto al dataset nazionale completo.
+        seed (int): Seed del generatore pseudo-casuale.
+
+    Returns:
+        DatasetSize: Numero di righe generate per tabella.
+    """
+    rng = random.Random(seed)
+    size = DatasetSize.for_scale(scale)
+    province = [(regione, provincia) for regione, sigle in REGIONI.items() for provincia in sigle]
+
+    # Insert Core: i validator dei modelli non intervengono, nome_norm va calcolato qui
+    used_names: set[str] = set()
+    comuni = []
+    for i in range(1, size.comuni + 1):
+        regione, provincia = rng.choice(province)
+        comuni.append({"id": i, "nome": (nome := _nome_comune(rng, used_names)), "nome_norm": fold(nome),
+                       "provincia": provincia,
+                       "codice_postale": f"{rng.randint(10, 98)}{i % 1000:03d}", "regione": regione})
+
+    materie = [{"id": i, "nome": nome, "nome_norm": fold(nome), "descrizione": f"Corso di {nome.lower()}"}
+               for i, nome in enumerate(MATERIE, start=1)]
+
+    scuole = []
+    for i in range(1, size.scuole + 1):
+        # Le scuole si concentrano nei comuni più grandi (distribuzione sbilanciata come quella reale)
+        id_citta = min(int(rng.paretovariate(1.2)), size.comuni)
+        id_citta = rng.randint(1, size.comuni) if rng.random() < 0.5 else id_citta
+        tipo = rng.choice(TIPI_SCUOLA)
+        nome = f"{tipo} {_nome_comune(rng, set()).title()} {i}"
+        scuole.append({
+            "id": i, "nome": nome, "nome_norm": fold(nome), "tipo": tipo,
+            "descrizione": None, "indirizzo": f"Via {rng.choice(MATERIE)} {rng.randint(1, 200)}",
+            "email": f"info{i}@scuola.edu.it", "telefono": f"0{rng.randint(100000000, 999999999)}",
+            "sito_web": f"https://scuola{i}.edu.it", "id_citta": id_citta,
+        })
+
+    indirizzi = []
+    links = []
+    for i in range(1, size.indirizzi + 1):
+        indirizzi.append({"id": i, "nome": (nome := rng.choice(INDIRIZZI_STUDIO)),
+                          "descrizione": f"Indirizzo {nome.lower()}",
+                          "id_scuola": rng.randint(1, size.scuole)})
+        k = max(1, min(len(materie), int(rng.gauss(size.materie_per_indirizzo, 2))))
+        links.extend({"indirizzo_id": i, "materia_id": m["id"]} for m in rng.sample(materie, k))
+
+    async with engine.begin() as conn:
+        await _insert_chunks(conn, Citta.__table__, comuni)
+        await _insert_chunks(conn, Materia.__table__, materie)
+        await _insert_chunks(conn, Scuola.__table__, scuole)
+        await _insert_chunks(conn, Indirizzo.__table__, indirizzi)
+        await _insert_chunks(conn, indirizzi_materie_table, links)
+    await ensure_read_models(engine)
+    return size
+
+
+async def is_seeded(engine: AsyncEngine) -> bool:
+    async with engine.connect() as conn:
+        return bool(await conn.scalar(select(func.count()).select_from(Scuola)))
+
+
+async def dataset_size(engine: AsyncEngine) -> DatasetSize:
+    """Righe presenti in un database già popolato (anche con una scala diversa da quella richiesta)."""
+    async with engine.connect() as conn:
+        counts = [await conn.scalar(select(func.count()).select_from(model))
+                  for model in (Citta, Scuola, Indirizzo, Materia, indirizzi_materie_table)]
+    comuni, scuole, indirizzi, materie, links = counts
+    return DatasetSize(comuni=comuni, scuole=scuole, indirizzi=indirizzi, materie=materie,
+                       materie_per_indirizzo=round(links / max(indirizzi, 1)))
+
+
+async def ensure_read_models(engine: AsyncEngine) -> None:
+    """Popola i read model derivati (scuole_search) se sono vuoti, es. su un database creato da una versione precedente."""
+    async with engine.connect() as conn:
+        if await conn.scalar(select(func.count()).select_from(ScuolaSearch)):
+            return
+    await rebuild_search(sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False), batch_size=2000)
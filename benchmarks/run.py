@@ -0,0 +1,354 @@
+"""Benchmark delle route del servizio sul dataset sintetico.
+
+Esegue l'app ASGI in-process (senza rete) e misura per ogni scenario latenza p50/p95/p99,
+query per richiesta e throughput. I risultati vengono scritti in JSON per confrontare run diversi.
+
+Gli scenari di scrittura vengono eseguiti una richiesta alla volta, ognuna in una transazione annullata
+alla fine (i commit delle route diventano savepoint): il dataset resta identico tra un run e l'altro.
+
+Uso:
+    python -m benchmarks.run --scale 0.1 --requests 200 --concurrency 8 --output bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+os.environ.setdefault("SCHOOLS_ENVIRONMENT", "testing")
+os.environ.setdefault("SCHOOLS_LOG_LEVEL", "WARNING")
+# Le query lente sono già misurate dal benchmark stesso
+os.environ.setdefault("SCHOOLS_SLOW_QUERY_MS", "0")
+os.environ.setdefault("SCHOOLS_QUERY_BUDGET_PER_REQUEST", "0")
+# Gli scenari ripetono gli stessi URL: con la cache delle liste si misurerebbero solo gli hit
+# (SCHOOLS_LIST_CACHE_ENABLED=true per misurarla)
+os.environ.setdefault("SCHOOLS_LIST_CACHE_ENABLED", "false")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.api.deps import get_db  # noqa: E402
+from app.core.text import fold  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.db.instrumentation import capture_queries  # noqa: E402
+from app.db.session import engine_options, normalize_database_url  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Materia  # noqa: E402
+from app.models.indirizzo import indirizzi_materie_table  # noqa: E402
+from benchmarks.dataset import (INDIRIZZI_STUDIO, MATERIE, TIPI_SCUOLA, DatasetSize, dataset_size,  # noqa: E402
+                                ensure_read_models, is_seeded, seed)
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///./benchmarks/bench.db"
+# Materie create dagli scenari che ne richiedono una senza indirizzi, fuori dagli id del dataset
+SCRATCH_ID = 1_000_000
+
+# Connessione della transazione dello scenario di scrittura in corso (None = scenario di lettura)
+_write_connection: ContextVar[AsyncConnection | None] = ContextVar("bench_write_connection", default=None)
+
+
+@dataclass
+class Scenario:
+    url: Callable[[int], str]  # URL della i-esima richiesta
+    method: str = "GET"
+    body: Callable[[int], object] | None = None  # body JSON della i-esima richiesta
+    write: bool = False  # una richiesta alla volta, in una transazione annullata alla fine
+    # Preparazione nella stessa transazione, fuori dalla misura (es. una materia da eliminare)
+    prepare: Callable[[AsyncConnection, int], Awaitable[None]] | None = None
+
+
+def _school(i: int, size: DatasetSize) -> dict:
+    return {"nome": f"Benchmark {i}", "tipo": TIPI_SCUOLA[i % len(TIPI_SCUOLA)], "indirizzo": f"Via Roma {i}",
+            "email_contatto": f"bench{i}@scuola.edu.it", "telefono_contatto": "0612345678",
+            "citta_id": (i * 31) % size.comuni + 1}
+
+
+def _school_full(i: int, size: DatasetSize) -> dict:
+    return {**_school(i, size), "indirizzi_scuola": [
+        {"nome": INDIRIZZI_STUDIO[(i + n) % len(INDIRIZZI_STUDIO)],
+         "materie": [MATERIE[(i + n + m) % len(MATERIE)] for m in range(6)]}
+        for n in range(3)
+    ]}
+
+
+async def _scratch_materia(conn: AsyncConnection, i: int) -> None:
+    nome = f"Benchmark {i}"
+    await conn.execute(insert(Materia).values(id=SCRATCH_ID + i, nome=nome, nome_norm=fold(nome), descrizione=""))
+
+
+async def _scratch_link(conn: AsyncConnection, i: int, size: DatasetSize) -> None:
+    await _scratch_materia(conn, i)
+    await conn.execute(insert(indirizzi_materie_table).values(
+        materia_id=SCRATCH_ID + i, indirizzo_id=(i * 104729) % size.indirizzi + 1))
+
+
+def scenarios(size: DatasetSize) -> dict[str, Scenario]:
+    """Scenari da misurare per nome, uno per route (più varianti delle liste di scuole)."""
+    prefix = "/api/v1"
+
+    def school_id(i):
+        return (i * 7919) % size.scuole + 1
+
+    def citta_id(i):
+        return (i * 31) % size.comuni + 1
+
+    def indirizzo_id(i):
+        return (i * 104729) % size.indirizzi + 1
+
+    def materia_id(i):
+        return i % size.materie + 1
+
+    return {
+        "schools_list": Scenario(lambda i: f"{prefix}/schools/?limit=20&offset={(i * 20) % 2000}"),
+        "schools_list_100": Scenario(lambda i: f"{prefix}/schools/?limit=100"),
+        "schools_search": Scenario(lambda i: f"{prefix}/schools/?search=Liceo%20{i % 9}"),
+        "schools_by_tipo": Scenario(lambda i: f"{prefix}/schools/?tipo=Liceo&limit=20"),
+        "schools_by_provincia": Scenario(lambda i: f"{prefix}/schools/?provincia=MI&sort_by=citta"),
+        "schools_by_materia": Scenario(lambda i: f"{prefix}/schools/?materia=Informatica&regione=Lombardia"),
+        "school_detail": Scenario(lambda i: f"{prefix}/schools/{school_id(i)}"),
+        "school_similar": Scenario(lambda i: f"{prefix}/schools/{school_id(i)}/similar"),
+        "citta_list": Scenario(lambda i: f"{prefix}/citta/?limit=50&offset={(i * 50) % 1000}"),
+        "citta_detail": Scenario(lambda i: f"{prefix}/citta/{citta_id(i)}"),
+        "indirizzi_list": Scenario(lambda i: f"{prefix}/indirizzi/?limit=50"),
+        "indirizzo_detail": Scenario(lambda i: f"{prefix}/indirizzi/{indirizzo_id(i)}"),
+        "indirizzi_match": Scenario(lambda i: f"{prefix}/indirizzi/match", "POST", lambda i: {
+            "materie": [{"materia_id": materia_id(i + n), "peso": n + 1} for n in range(4)]}),
+        "materie_list": Scenario(lambda i: f"{prefix}/materie/?limit=50"),
+        "materia_detail": Scenario(lambda i: f"{prefix}/materie/{materia_id(i)}"),
+        "stats": Scenario(lambda i: f"{prefix}/stats/"),
+        "changes": Scenario(lambda i: f"{prefix}/changes/?since={i * 100}&limit=100"),
+
+        "school_create": Scenario(lambda i: f"{prefix}/schools/", "POST", lambda i: _school(i, size), write=True),
+        "school_create_full": Scenario(lambda i: f"{prefix}/schools/full", "POST",
+                                       lambda i: _school_full(i, size), write=True),
+        "school_update": Scenario(lambda i: f"{prefix}/schools/{school_id(i)}", "PUT",
+                                  lambda i: _school(i, size), write=True),
+        "school_replace_full": Scenario(lambda i: f"{prefix}/schools/{school_id(i)}/full", "PUT",
+                                        lambda i: _school_full(i, size), write=True),
+        "school_delete": Scenario(lambda i: f"{prefix}/schools/{school_id(i)}", "DELETE", write=True),
+        "citta_create": Scenario(lambda i: f"{prefix}/citta/", "POST", lambda i: {
+            "nome": f"Benchmark {i}", "cap": "00100", "provincia": "RM", "regione": "Lazio"}, write=True),
+        "citta_bulk_100": Scenario(lambda i: f"{prefix}/citta/bulk", "POST", lambda i: [
+            {"nome": f"Benchmark {i}-{n}", "cap": f"{n:05d}", "provincia": "RM", "regione": "Lazio"}
+            for n in range(100)], write=True),
+        "citta_update": Scenario(lambda i: f"{prefix}/citta/{citta_id(i)}", "PUT", lambda i: {
+            "nome": f"Benchmark {i}", "cap": "00100", "provincia": "RM", "regione": "Lazio"}, write=True),
+        "citta_delete": Scenario(lambda i: f"{prefix}/citta/{citta_id(i)}", "DELETE", write=True),
+        "indirizzo_create": Scenario(lambda i: f"{prefix}/indirizzi/", "POST", lambda i: {
+            "nome": f"Benchmark {i}", "descrizione": "", "id_scuola": school_id(i)}, write=True),
+        "indirizzo_update": Scenario(lambda i: f"{prefix}/indirizzi/{indirizzo_id(i)}", "PUT", lambda i: {
+            "nome": f"Benchmark {i}", "descrizione": "", "id_scuola": school_id(i)}, write=True),
+        "indirizzo_delete": Scenario(lambda i: f"{prefix}/indirizzi/{indirizzo_id(i)}", "DELETE", write=True),
+        "materia_create": Scenario(lambda i: f"{prefix}/materie/", "POST", lambda i: {
+            "nome": f"Benchmark {i}", "descrizione": ""}, write=True),
+        "materia_update": Scenario(lambda i: f"{prefix}/materie/{materia_id(i)}", "PUT", lambda i: {
+            "nome": f"Benchmark {i}", "descrizione": ""}, write=True),
+        # Solo le materie senza indirizzi possono essere eliminate: ne viene creata una per richiesta
+        "materia_delete": Scenario(lambda i: f"{prefix}/materie/{SCRATCH_ID + i}", "DELETE", write=True,
+                                   prepare=_scratch_materia),
+        "materia_link": Scenario(lambda i: f"{prefix}/materie/link-indirizzo/{SCRATCH_ID + i}/{indirizzo_id(i)}",
+                                 "POST", write=True, prepare=_scratch_materia),
+        "materia_unlink": Scenario(
+            lambda i: f"{prefix}/materie/unlink-indirizzo/{SCRATCH_ID + i}/{indirizzo_id(i)}", "DELETE",
+            write=True, prepare=lambda conn, i: _scratch_link(conn, i, size)),
+    }
+
+
+def write_engine(database_url: str) -> AsyncEngine:
+    """Engine per gli scenari di scrittura, con transazioni esplicite anche su sqlite.
+
+    pysqlite/aiosqlite emettono BEGIN solo prima dei DML: senza BEGIN esplicito il SAVEPOINT della sessione
+    aprirebbe la transazione e il suo RELEASE, al commit della route, farebbe un COMMIT vero.
+    """
+    engine = create_async_engine(database_url, **engine_options(database_url))
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine.sync_engine, "connect")
+        def _connect(dbapi_connection, _):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def _begin(conn):
+            conn.exec_driver_sql("BEGIN")
+    return engine
+
+
+@asynccontextmanager
+async def rolled_back(engine: AsyncEngine, scenario: Scenario, i: int):
+    """Transazione della i-esima richiesta di scrittura: preparata, usata da get_db e annullata alla fine."""
+    async with engine.connect() as conn:
+        await conn.begin()
+        if scenario.prepare:
+            await scenario.prepare(conn, i)
+        token = _write_connection.set(conn)
+        try:
+            yield
+        finally:
+            _write_connection.reset(token)
+            await conn.rollback()
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def send(client: AsyncClient, scenario: Scenario, i: int):
+    body = scenario.body(i) if scenario.body else None
+    return await client.request(scenario.method, scenario.url(i), json=body)
+
+
+async def run_scenario(client: AsyncClient, scenario: Scenario, requests: int, concurrency: int, warmup: int,
+                       writer: AsyncEngine) -> dict:
+    if scenario.write:
+        concurrency = 1
+
+    def transaction(i: int):
+        return rolled_back(writer, scenario, i) if scenario.write else nullcontext()
+
+    for i in range(warmup):
+        async with transaction(i):
+            await send(client, scenario, i)
+
+    latencies: list[float] = []
+    queries: list[int] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore, transaction(i):
+            # Ogni task ha il proprio contesto, quindi il conteggio delle query è per singola richiesta
+            with capture_queries() as stats:
+                started = time.perf_counter()
+                response = await send(client, scenario, i)
+                latencies.append(time.perf_counter() - started)
+            queries.append(stats.count)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "queries_per_request": round(statistics.fmean(queries), 2),
+        "max_queries": max(queries),
+        "throughput_rps": round(requests / elapsed, 1),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+async def main(args: argparse.Namespace) -> dict:
+    database_url = normalize_database_url(args.database_url)
+    engine = create_async_engine(database_url, **engine_options(database_url))
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    seeded = not await is_seeded(engine)
+    if seeded:
+        started = time.perf_counter()
+        size = await seed(engine, scale=args.scale, seed=args.seed)
+        print(f"Seeded {size} in {time.perf_counter() - started:.1f}s")
+    else:
+        # Database già popolato, forse con un'altra scala: gli id degli scenari derivano dalle righe presenti
+        await ensure_read_models(engine)
+        size = await dataset_size(engine)
+        print(f"Using existing dataset {size}")
+    writer = write_engine(database_url)
+
+    async def bench_get_db():
+        connection = _write_connection.get()
+        if connection is None:
+            async with session_factory() as db:
+                yield db
+            return
+        # Sessione dentro la transazione dello scenario: i commit della route diventano savepoint
+        async with AsyncSession(bind=connection, expire_on_commit=False, autoflush=False,
+                                join_transaction_mode="create_savepoint") as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    results = {}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            for name, scenario in scenarios(size).items():
+                if args.only and name not in args.only:
+                    continue
+                requests = args.write_requests if scenario.write else args.requests
+                results[name] = await run_scenario(client, scenario, requests, args.concurrency, args.warmup, writer)
+                r = results[name]
+                print(f"{name:<22} p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  p99 {r['p99_ms']:>8.2f}ms  "
+                      f"q/req {r['queries_per_request']:>5}  {r['throughput_rps']:>8} req/s"
+                      + (f"  {r['errors']} errors" if r["errors"] else ""))
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        await writer.dispose()
+        await engine.dispose()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            # Scala e seed sono noti solo se il dataset è stato generato da questo run
+            "scale": args.scale if seeded else None,
+            "seed": args.seed if seeded else None,
+            "dataset": size.__dict__,
+            "requests": args.requests,
+            "write_requests": args.write_requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark delle route del servizio scuole.")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL,
+                        help="Database da usare (viene popolato se vuoto)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Scala del dataset (1.0 = nazionale)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=500, help="Richieste misurate per scenario di lettura")
+    parser.add_argument("--write-requests", type=int, default=100,
+                        help="Richieste misurate per scenario di scrittura (eseguite una alla volta)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="Richieste di riscaldamento non misurate")
+    parser.add_argument("--only", nargs="*", help="Esegue solo gli scenari indicati")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = asyncio.run(main(arguments))
+    arguments.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {arguments.output}")
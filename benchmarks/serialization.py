@@ -0,0 +1,112 @@
+"""Benchmark della costruzione e serializzazione di una pagina di SchoolsList, senza DB né rete.
+
+Confronta, per pagine di --rows scuole lette da scuole_search:
+- validated: modelli costruiti con validazione e serializzati dal percorso response_model di FastAPI
+  (model_dump, nuova validazione, serializzazione, ORJSONResponse), come prima di ModelResponse;
+- trusted: builder del service con model_construct e ModelResponse, come fanno ora le route.
+
+Misura il tempo CPU (process_time) per pagina e verifica che i due percorsi producano gli stessi byte.
+
+Uso:
+    python -m benchmarks.serialization --rows 100 --iterations 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("SCHOOLS_ENVIRONMENT", "testing")
+os.environ.setdefault("SCHOOLS_LOG_LEVEL", "WARNING")
+
+from fastapi.responses import ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.api.responses import ModelResponse  # noqa: E402
+from app.models import ScuolaSearch  # noqa: E402
+from app.schemas.school import SchoolAddress, SchoolResponse, SchoolsList  # noqa: E402
+from app.services.school import build_school_from_search  # noqa: E402
+from benchmarks.dataset import INDIRIZZI_STUDIO, MATERIE  # noqa: E402
+
+
+def make_rows(n: int) -> list[ScuolaSearch]:
+    """Righe di scuole_search in memoria, con 3 indirizzi di 6 materie ciascuna."""
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        ScuolaSearch(
+            id=i, nome=f"Istituto {i}", nome_norm=f"istituto {i}", tipo="Liceo", descrizione="Scuola superiore",
+            indirizzo=f"Via Roma {i}", email=f"info{i}@scuola.it", telefono="061234567",
+            sito_web=f"https://scuola{i}.it", id_citta=1, citta_nome="Forlì", citta_nome_norm="forli",
+            provincia="FC", codice_postale="47121", regione="Emilia-Romagna", created_at=now, updated_at=now,
+            indirizzi=[{"id": i * 10 + j, "nome": INDIRIZZI_STUDIO[j % len(INDIRIZZI_STUDIO)], "descrizione": "",
+                        "materie": [MATERIE[(i + j + m) % len(MATERIE)] for m in range(6)]} for j in range(3)],
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def page_fields(rows: list[ScuolaSearch]) -> dict:
+    return {"total": len(rows), "limit": len(rows), "offset": 0, "sort_by": "name", "order": "asc"}
+
+
+async def validated_page(rows: list[ScuolaSearch], field) -> bytes:
+    scuole = []
+    for row in rows:
+        fields = dict(build_school_from_search(row).__dict__)
+        fields["indirizzi_scuola"] = [SchoolAddress(**addr) for addr in row.indirizzi]
+        scuole.append(SchoolResponse(**fields))
+    page = SchoolsList(scuole=scuole, **page_fields(rows))
+    content = await serialize_response(field=field, response_content=page)
+    return ORJSONResponse(content).body
+
+
+def trusted_page(rows: list[ScuolaSearch]) -> bytes:
+    page = SchoolsList.model_construct(scuole=[build_school_from_search(row) for row in rows], **page_fields(rows))
+    return ModelResponse(page).body
+
+
+def measure(fn, iterations: int) -> float:
+    """Tempo CPU medio per chiamata, in microsecondi."""
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def main(args: argparse.Namespace) -> None:
+    rows = make_rows(args.rows)
+    field = create_model_field("Response_get_schools", SchoolsList, mode="serialization")
+    loop = asyncio.new_event_loop()
+    try:
+        def validated():
+            return loop.run_until_complete(validated_page(rows, field))
+
+        assert validated() == trusted_page(rows), "i due percorsi producono JSON diversi"
+        for _ in range(args.warmup):
+            validated()
+            trusted_page(rows)
+
+        before = measure(validated, args.iterations)
+        after = measure(lambda: trusted_page(rows), args.iterations)
+    finally:
+        loop.close()
+
+    print(f"page of {args.rows} schools, {args.iterations} iterations")
+    print(f"validated  {before:>10.1f} µs CPU/page")
+    print(f"trusted    {after:>10.1f} µs CPU/page")
+    print(f"saved      {before - after:>10.1f} µs CPU/page ({(1 - after / before) * 100:.0f}%)")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark della serializzazione delle liste di scuole.")
+    parser.add_argument("--rows", type=int, default=100, help="Scuole per pagina")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,69 @@
+# Configurazione gunicorn: python3 -m gunicorn app.main:app -c gunicorn.conf.py
+import math
+import os
+import tempfile
+from pathlib import Path
+
+from app.core import metrics
+from app.core.config import settings
+
+
+def _cgroup_cpu_limit() -> float | None:
+    """Limite di CPU del container (cgroup v2 cpu.max o v1 cfs_quota), None se assente."""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """CPU utilizzabili dal processo: cpu_count() conta quelle dell'host, non l'affinità né il limite del container."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(math.ceil(limit), 1))
+    return cpus
+
+
+bind = f"0.0.0.0:{settings.SERVICE_PORT}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# SCHOOLS_WEB_CONCURRENCY=0 -> un worker per CPU disponibile
+workers = settings.WEB_CONCURRENCY or available_cpus()
+# L'app viene importata una sola volta nel master e condivisa (copy-on-write) dai worker
+preload_app = True
+graceful_timeout = 30
+
+# Ogni worker ha il proprio registry di metriche: con più worker /metrics le aggrega da una cartella condivisa
+# (il valore arriva ai worker perché settings è già importato nel master)
+if workers > 1 and not settings.METRICS_MULTIPROC_DIR:
+    settings.METRICS_MULTIPROC_DIR = tempfile.mkdtemp(prefix="schools-metrics-")
+
+
+def on_starting(server):
+    """Le metriche di un'esecuzione precedente (es. con SCHOOLS_METRICS_MULTIPROC_DIR fissa) non vanno esportate."""
+    if settings.METRICS_MULTIPROC_DIR:
+        os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+        for path in Path(settings.METRICS_MULTIPROC_DIR).glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+def post_fork(server, worker):
+    """Il pool creato nel master non va condiviso: ogni worker apre le proprie connessioni."""
+    from app.db import session
+
+    for target in (session.engine, session.replica_engine):
+        if target is not None:
+            target.sync_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """Un worker terminato non serve più richieste: le sue metriche escono da /metrics."""
+    if settings.METRICS_MULTIPROC_DIR:
+        metrics.remove_snapshot(settings.METRICS_MULTIPROC_DIR, worker.pid)
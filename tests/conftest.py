@@ -5,6 +5,7 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.db.base import Base
+from app.api import list_cache
 from app.api.deps import get_db
 import os
 os.environ["SCHOOLS_ENVIRONMENT"] = "testing"
@@ -43,6 +44,9 @@ def mock_broker():
 
 @pytest.fixture(scope="function")
 async def db_session():
+    # Ogni test ha un DB nuovo: le pagine in cache di un test precedente avrebbero la stessa generazione
+    list_cache.clear_cache()
+
     # Setup DB
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import delete, select
+
+from app.models import ScuolaSearch
+from app.services import catalog_sync
+from tests.conftest import TestingSessionLocal
+
+
+async def listed_school(client):
+    data = (await client.get("/api/v1/schools/")).json()
+    return data["scuole"][0] if data["scuole"] else None
+
+
+async def create_catalog(client):
+    citta = (await client.post("/api/v1/citta/", json={
+        "nome": "Torino", "cap": "10100", "provincia": "TO", "regione": "Piemonte"})).json()
+    school = (await client.post("/api/v1/schools/", json={
+        "nome": "ITIS Avogadro", "tipo": "ITIS", "indirizzo": "Corso San Maurizio 8",
+        "email_contatto": "info@avogadro.it", "telefono_contatto": "011", "citta_id": citta["id"]})).json()
+    indirizzo = (await client.post("/api/v1/indirizzi/", json={
+        "nome": "Informatica", "descrizione": "Corso di informatica", "id_scuola": school["id"]})).json()
+    materia = (await client.post("/api/v1/materie/", json={"nome": "Sistemi", "descrizione": "Reti"})).json()
+    await client.post(f"/api/v1/materie/link-indirizzo/{materia['id']}/{indirizzo['id']}")
+    return citta, school, indirizzo, materia
+
+
+@pytest.mark.anyio
+async def test_write_paths_keep_search_model_in_sync(client):
+    citta, school, indirizzo, materia = await create_catalog(client)
+
+    listed = await listed_school(client)
+    assert listed["città"] == "Torino"
+    assert listed["indirizzi_scuola"] == [
+        {"id": indirizzo["id"], "nome": "Informatica", "descrizione": "Corso di informatica", "materie": ["Sistemi"]}]
+
+    await client.put(f"/api/v1/materie/{materia['id']}", json={"nome": "Sistemi e Reti", "descrizione": "Reti"})
+    assert (await listed_school(client))["indirizzi_scuola"][0]["materie"] == ["Sistemi e Reti"]
+
+    await client.put(f"/api/v1/citta/{citta['id']}", json={
+        "nome": "Torino Centro", "cap": "10121", "provincia": "TO", "regione": "Piemonte"})
+    assert (await listed_school(client))["città"] == "Torino Centro"
+
+    await client.put(f"/api/v1/indirizzi/{indirizzo['id']}", json={
+        "nome": "Informatica e TLC", "descrizione": "d", "id_scuola": school["id"]})
+    assert (await listed_school(client))["indirizzi_scuola"][0]["nome"] == "Informatica e TLC"
+
+    await client.delete(f"/api/v1/materie/unlink-indirizzo/{materia['id']}/{indirizzo['id']}")
+    assert (await listed_school(client))["indirizzi_scuola"][0]["materie"] == []
+
+    await client.delete(f"/api/v1/indirizzi/{indirizzo['id']}")
+    assert (await listed_school(client))["indirizzi_scuola"] == []
+
+    await client.delete(f"/api/v1/schools/{school['id']}")
+    assert await listed_school(client) is None
+
+
+@pytest.mark.anyio
+async def test_rebuild_restores_search_model(client, db_session):
+    _, school, _, _ = await create_catalog(client)
+    await db_session.execute(delete(ScuolaSearch))
+    await db_session.commit()
+    assert await listed_school(client) is None
+
+    processed = await catalog_sync.rebuild_search(TestingSessionLocal, batch_size=1)
+
+    assert processed == 1
+    listed = await listed_school(client)
+    assert listed["id"] == school["id"]
+    assert listed["indirizzi_scuola"][0]["materie"] == ["Sistemi"]
+    assert (await db_session.execute(select(ScuolaSearch.id))).scalars().all() == [school["id"]]
@@ -0,0 +1,104 @@
+import pytest
+
+from app.services.changes import record_changes
+from tests.conftest import TestingSessionLocal
+from tests.test_catalog_sync import create_catalog
+
+
+async def get_changes(client, since=0, limit=100):
+    response = await client.get("/api/v1/changes/", params={"since": since, "limit": limit})
+    assert response.status_code == 200
+    return response.json()
+
+
+def summary(page):
+    return [(c["entity"], c["id"], c["deleted"]) for c in page["changes"]]
+
+
+@pytest.mark.anyio
+async def test_changes_since_start_return_current_catalog(client):
+    citta, school, indirizzo, materia = await create_catalog(client)
+
+    page = await get_changes(client)
+    # Il link materia-indirizzo è una modifica dell'indirizzo, che compare una sola volta
+    assert summary(page) == [("citta", citta["id"], False), ("scuola", school["id"], False),
+                             ("materia", materia["id"], False), ("indirizzo", indirizzo["id"], False)]
+    by_entity = {c["entity"]: c["data"] for c in page["changes"]}
+    assert by_entity["citta"]["nome"] == "Torino"
+    assert "nome_norm" not in by_entity["citta"]
+    assert by_entity["scuola"]["id_citta"] == citta["id"]
+    assert by_entity["indirizzo"]["materie"] == [materia["id"]]
+    assert page["has_more"] is False
+
+    # Nessuna modifica successiva al token
+    again = await get_changes(client, since=page["next_since"])
+    assert again["changes"] == [] and again["next_since"] == page["next_since"]
+
+
+@pytest.mark.anyio
+async def test_changes_are_paged_by_token(client):
+    await create_catalog(client)
+
+    first = await get_changes(client, limit=2)
+    assert len(first["changes"]) == 2 and first["has_more"] is True
+    rest = await get_changes(client, since=first["next_since"])
+    assert rest["has_more"] is False
+    seen = summary(first) + summary(rest)
+    assert [entity for entity, _, _ in seen] == ["citta", "scuola", "materia", "indirizzo"]
+
+
+@pytest.mark.anyio
+async def test_deletes_produce_tombstones(client):
+    citta, school, indirizzo, materia = await create_catalog(client)
+    since = (await get_changes(client))["next_since"]
+
+    await client.delete(f"/api/v1/materie/unlink-indirizzo/{materia['id']}/{indirizzo['id']}")
+    await client.delete(f"/api/v1/indirizzi/{indirizzo['id']}")
+    await client.delete(f"/api/v1/materie/{materia['id']}")
+    page = await get_changes(client, since=since)
+    # La scuola compare tra le modifiche perché ha perso un indirizzo
+    assert summary(page) == [("indirizzo", indirizzo["id"], True), ("scuola", school["id"], False),
+                             ("materia", materia["id"], True)]
+    assert page["changes"][0]["data"] is None and page["changes"][2]["data"] is None
+
+    # Eliminando la città la scuola resta senza città ed esce dalle liste
+    await client.delete(f"/api/v1/citta/{citta['id']}")
+    page = await get_changes(client, since=page["next_since"])
+    assert summary(page) == [("citta", citta["id"], True), ("scuola", school["id"], False)]
+    assert page["changes"][1]["data"]["id_citta"] is None
+    assert (await client.get("/api/v1/schools/")).json()["total"] == 0
+
+
+@pytest.mark.anyio
+async def test_changes_are_logged_in_commit_order(client):
+    citta, school, _, _ = await create_catalog(client)
+    since = (await get_changes(client))["next_since"]
+
+    async with TestingSessionLocal() as slow:
+        # Transazione iniziata prima ma committata dopo un'altra scrittura: il seq viene assegnato al commit
+        await record_changes(slow, "scuola", [school["id"]], deleted=False)
+        await client.put(f"/api/v1/citta/{citta['id']}", json={
+            "nome": "Torino", "cap": "10121", "provincia": "TO", "regione": "Piemonte"})
+        page = await get_changes(client, since=since)
+        assert summary(page) == [("citta", citta["id"], False)]
+        await slow.commit()
+
+    # Il client che ha già superato la modifica della città riceve comunque quella committata dopo
+    page = await get_changes(client, since=page["next_since"])
+    assert summary(page) == [("scuola", school["id"], False)]
+
+    async with TestingSessionLocal() as rolled_back:
+        await record_changes(rolled_back, "scuola", [school["id"]], deleted=False)
+        await rolled_back.rollback()
+    assert (await get_changes(client, since=page["next_since"]))["changes"] == []
+
+
+@pytest.mark.anyio
+async def test_deleting_school_detaches_its_indirizzi(client):
+    _, school, indirizzo, _ = await create_catalog(client)
+    since = (await get_changes(client))["next_since"]
+
+    await client.delete(f"/api/v1/schools/{school['id']}")
+    page = await get_changes(client, since=since)
+    assert summary(page) == [("scuola", school["id"], True), ("indirizzo", indirizzo["id"], False)]
+    assert page["changes"][1]["data"]["id_scuola"] is None
@@ -1,5 +1,8 @@
+import orjson
 import pytest
 from app.schemas.citta import CittaCreate
+from app.db.instrumentation import assert_max_queries
+from app.services.citta import BULK_CHUNK
 
 # Helper to create a Citta
 async def create_citta(client, nome="Roma", cap="00100", provincia="RM", regione="Lazio"):
@@ -101,3 +104,113 @@ async def test_delete_citta(client):
         # Assuming service handles it.
     except Exception:
         pass
+
+@pytest.mark.anyio
+async def test_citta_routes_query_count(client):
+    create_res = await create_citta(client, nome="Genova")
+    citta_id = create_res.json()["id"]
+
+    with assert_max_queries(1):
+        await client.get("/api/v1/citta/")
+    with assert_max_queries(1):
+        await client.get(f"/api/v1/citta/{citta_id}")
+
+
+@pytest.mark.anyio
+async def test_search_citta_ignores_accents_and_case(client):
+    create_res = await create_citta(client, nome="Forlì", cap="47121", provincia="FC", regione="Emilia-Romagna")
+    await create_citta(client, nome="Città di Castello", cap="06012", provincia="PG", regione="Umbria")
+
+    data = (await client.get("/api/v1/citta/", params={"search": "FORLI"})).json()
+    assert [c["nome"] for c in data["citta"]] == ["Forlì"]
+    data = (await client.get("/api/v1/citta/", params={"search": "citta di"})).json()
+    assert [c["nome"] for c in data["citta"]] == ["Città di Castello"]
+
+    # Il nome normalizzato segue gli aggiornamenti
+    await client.put(f"/api/v1/citta/{create_res.json()['id']}", json={
+        "nome": "Forlimpopoli", "cap": "47034", "provincia": "FC", "regione": "Emilia-Romagna"})
+    data = (await client.get("/api/v1/citta/", params={"search": "forlì"})).json()
+    assert [c["nome"] for c in data["citta"]] == ["Forlimpopoli"]
+
+
+@pytest.mark.anyio
+async def test_create_citta_is_a_single_upsert(client):
+    # Insert della città + (al commit) versione del catalogo e riga del log delle modifiche
+    with assert_max_queries(3):
+        response = await create_citta(client, nome="Trieste", cap="34100", provincia="TS", regione="Friuli-Venezia Giulia")
+    assert response.status_code == 200
+
+    with pytest.raises(Exception, match="Città già esistente"):
+        await create_citta(client, nome="Trieste", cap="34100", provincia="TS", regione="Friuli-Venezia Giulia")
+
+
+@pytest.mark.anyio
+async def test_bulk_upsert_citta_json_array(client):
+    existing = (await create_citta(client, nome="Aosta", cap="11100", provincia="AO", regione="Valle d'Aosta")).json()
+    unchanged = (await create_citta(client, nome="Bard", cap="11020", provincia="AO", regione="Valle d'Aosta")).json()
+
+    payload = [
+        {"nome": "Aosta", "cap": "11101", "provincia": "AO", "regione": "Valle d'Aosta"},
+        {"nome": "Bard", "cap": "11020", "provincia": "AO", "regione": "Valle d'Aosta"},
+        {"nome": "Forlì", "cap": "47100", "provincia": "FC", "regione": "Emilia-Romagna"},
+        {"nome": "Forlì", "cap": "47121", "provincia": "FC", "regione": "Emilia-Romagna"},  # vale l'ultima
+    ]
+    response = await client.post("/api/v1/citta/bulk", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 3 and data["changed"] == 2
+    by_name = {c["nome"]: c for c in data["citta"]}
+    assert by_name["Aosta"] == {"id": existing["id"], "nome": "Aosta", "changed": True}
+    assert by_name["Bard"] == {"id": unchanged["id"], "nome": "Bard", "changed": False}
+
+    forli = (await client.get(f"/api/v1/citta/{by_name['Forlì']['id']}")).json()
+    assert forli["cap"] == "47121"
+    assert (await client.get("/api/v1/citta/", params={"search": "forli"})).json()["citta"][0]["nome"] == "Forlì"
+    assert (await client.get(f"/api/v1/citta/{existing['id']}")).json()["cap"] == "11101"
+
+
+@pytest.mark.anyio
+async def test_bulk_upsert_citta_ndjson_is_all_or_nothing(client):
+    body = (b'{"nome": "Lecce", "cap": "73100", "provincia": "LE", "regione": "Puglia"}\n'
+            b'{"nome": "Bari", "cap": "70121", "provincia": "BA", "regione": "Puglia"}\n')
+    response = await client.post("/api/v1/citta/bulk", content=body,
+                                 headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["changed"] == 2
+
+    body = (b'{"nome": "Taranto", "cap": "74121", "provincia": "TA", "regione": "Puglia"}\n'
+            b'{"nome": "Brindisi", "cap": "72100"}\n')
+    response = await client.post("/api/v1/citta/bulk", content=body,
+                                 headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", 1]
+    names = [c["nome"] for c in (await client.get("/api/v1/citta/")).json()["citta"]]
+    assert names == ["Bari", "Lecce"]
+
+
+@pytest.mark.anyio
+async def test_bulk_upsert_citta_across_chunks(client):
+    rows = [{"nome": f"Comune {n}", "cap": f"{n:05d}", "provincia": "XX", "regione": "Test"}
+            for n in range(BULK_CHUNK + 10)]
+    # Stesso nome nel primo e nel secondo blocco: vale l'ultima occorrenza
+    rows.append({**rows[0], "cap": "99999"})
+    body = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+    # Riga non valida dopo il primo blocco: nessuna scrittura (nemmeno del primo blocco) prima della validazione
+    with assert_max_queries(0):
+        response = await client.post("/api/v1/citta/bulk", content=body + b'{"nome": "Senza cap"}\n',
+                                     headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", len(rows)]
+
+    response = await client.post("/api/v1/citta/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == data["changed"] == BULK_CHUNK + 10
+    assert len({c["id"] for c in data["citta"]}) == BULK_CHUNK + 10
+    first = data["citta"][0]
+    assert (await client.get(f"/api/v1/citta/{first['id']}")).json()["cap"] == "99999"
+
+    # Ricaricato identico non modifica nulla
+    response = await client.post("/api/v1/citta/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["changed"] == 0
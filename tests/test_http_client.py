@@ -0,0 +1,194 @@
+import asyncio
+from enum import Enum
+
+import httpx
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.core import deadline
+from app.core.cache import SingleFlight
+from app.services import http_client
+from app.services.http_client import HttpMethod, OrientatiException, send_request
+
+
+class SiblingUrl(str, Enum):
+    SIBLING = "http://sibling"
+
+
+@pytest.fixture
+def upstream():
+    calls = []
+    state = {"headers": {"Cache-Control": "max-age=60"}, "delay": 0}
+
+    async def handler(request: httpx.Request):
+        calls.append(request)
+        if state["delay"]:
+            await asyncio.sleep(state["delay"])
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, json={"n": len(calls)}, headers=state["headers"])
+
+    http_client.clear_cache()
+    http_client.async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    yield calls, state
+    http_client.async_client = None
+    http_client.clear_cache()
+
+
+@pytest.mark.anyio
+async def test_cached_get_reuses_fresh_response(upstream):
+    calls, _ = upstream
+    first = await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True)
+    second = await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True)
+
+    assert first == second == ({"n": 1}, 200)
+    assert len(calls) == 1
+    assert http_client.cache_stats()["hits"] == 1
+
+
+@pytest.mark.anyio
+async def test_no_store_is_not_cached(upstream):
+    calls, state = upstream
+    state["headers"] = {"Cache-Control": "no-store"}
+    await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True)
+    await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True)
+
+    assert len(calls) == 2
+    assert http_client.cache_stats()["entries"] == 0
+
+
+@pytest.mark.anyio
+async def test_etag_revalidation(upstream):
+    calls, state = upstream
+    state["headers"] = {"Cache-Control": "no-cache", "ETag": '"v1"'}
+    await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True)
+    data, status = await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True)
+
+    assert (data, status) == ({"n": 1}, 200)
+    assert calls[1].headers["If-None-Match"] == '"v1"'
+    assert http_client.cache_stats()["revalidated"] == 1
+
+
+@pytest.mark.anyio
+async def test_concurrent_identical_requests_are_coalesced(upstream):
+    calls, state = upstream
+    state["delay"] = 0.05
+    results = await asyncio.gather(*[
+        send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True) for _ in range(5)
+    ])
+
+    assert len(calls) == 1
+    assert all(r == ({"n": 1}, 200) for r in results)
+    stats = http_client.cache_stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+
+
+@pytest.mark.anyio
+async def test_mutating_a_cached_response_does_not_affect_other_callers(upstream):
+    calls, state = upstream
+    state["delay"] = 0.05
+    (leader, _), (follower, _) = await asyncio.gather(*[
+        send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True) for _ in range(2)])
+    leader["n"] = "leader"
+    follower["extra"] = True
+
+    hit, _ = await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items", cache=True)
+    assert hit == {"n": 1}
+    hit["n"] = "hit"
+
+    # Anche la risposta riusata dopo una rivalidazione (304) è una copia
+    state["headers"] = {"Cache-Control": "no-cache", "ETag": '"v1"'}
+    http_client.clear_cache()
+    revalidated = [await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/other", cache=True) for _ in range(2)]
+    revalidated[0][0]["n"] = "mutated"
+    assert (await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/other", cache=True))[0] == {"n": 2}
+    assert revalidated[1][0] == {"n": 2}
+    assert len(calls) == 4
+
+
+@pytest.mark.anyio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    calls = []
+
+    async def slow(n):
+        calls.append(n)
+        started.set()
+        await asyncio.sleep(0.05)
+        return n
+
+    leader = asyncio.create_task(flight.do("key", lambda: slow(1)))
+    await started.wait()
+    followers = [asyncio.create_task(flight.do("key", lambda n=n: slow(n))) for n in (2, 3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    # Il primo follower riprende la chiamata, il secondo si accoda a lui
+    assert await asyncio.gather(*followers) == [(2, False), (2, True)]
+    assert leader.cancelled()
+    assert calls == [1, 2]
+    assert not flight.in_flight("key")
+
+
+@pytest.mark.anyio
+async def test_deadline_is_forwarded_and_caps_timeout(upstream):
+    calls, _ = upstream
+    token = deadline.set_deadline(1.5)
+    try:
+        await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items")
+    finally:
+        deadline.reset_deadline(token)
+
+    forwarded = int(calls[0].headers[deadline.DEADLINE_HEADER])
+    assert 0 < forwarded <= 1500
+    assert calls[0].extensions["timeout"]["read"] <= 1.5
+
+
+@pytest.mark.anyio
+async def test_expired_deadline_skips_upstream_call(upstream):
+    calls, _ = upstream
+    token = deadline.set_deadline(0)
+    try:
+        with pytest.raises(OrientatiException) as exc_info:
+            await send_request(SiblingUrl.SIBLING, HttpMethod.GET, "/items")
+    finally:
+        deadline.reset_deadline(token)
+
+    assert exc_info.value.status_code == 504
+    assert calls == []
+
+
+@pytest.mark.anyio
+async def test_expired_inbound_budget_is_rejected(client):
+    response = await client.get("/api/v1/citta/", headers={deadline.DEADLINE_HEADER: "0"})
+    assert response.status_code == 504
+
+
+def test_error_log_limiter_suppresses_repeats():
+    limiter = http_client.ErrorLogLimiter(window_seconds=60, max_per_window=2)
+    key = (500, "Internal Server Error", "schools/get", "OperationalError", "db down")
+
+    results = [limiter.acquire(key) for _ in range(5)]
+
+    assert results == [0, 0, None, None, None]
+    assert limiter.stats()["suppressed"] == 3
+
+
+def test_errors_differing_only_in_parameters_share_a_log_key():
+    first = OperationalError("SELECT * FROM scuole WHERE id = ?", (12,), Exception("database is locked"))
+    second = OperationalError("SELECT * FROM scuole WHERE id = ?", (57,), Exception("database is locked"))
+    assert str(first) != str(second)
+
+    assert (http_client.error_log_key(500, "Internal Server Error", "schools/12", first)
+            == http_client.error_log_key(500, "Internal Server Error", "schools/57", second))
+    assert (http_client.error_log_key(500, "Internal Server Error", "schools/12", first)
+            != http_client.error_log_key(500, "Internal Server Error", "citta/12", first))
+
+
+def test_error_log_limiter_reports_suppressed_count_in_next_window():
+    limiter = http_client.ErrorLogLimiter(window_seconds=0, max_per_window=1)
+    limiter._windows.set(("k",), [0.0, 1, 4])
+
+    assert limiter.acquire(("k",)) == 4
@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Citta, Indirizzo, Scuola
+from app.services import catalog_sync
+from app.services import school as school_service
+from tests.conftest import engine
+
+
+@contextmanager
+def recorded_selects():
+    """Registra gli statement SELECT eseguiti sull'engine dei test, con i relativi parametri."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, tuple(parameters)))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+async def query_plan(db, call) -> str:
+    """Esegue call() e restituisce l'EXPLAIN QUERY PLAN di tutte le query che ha lanciato."""
+    with recorded_selects() as statements:
+        await call()
+
+    conn = await db.connection()
+    lines = []
+    for statement, parameters in statements:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        lines.extend(row[-1] for row in result)
+    return "\n".join(lines)
+
+
+@pytest.fixture
+async def catalog(db_session):
+    citta = [Citta(nome=f"Città {i}", provincia="TO" if i % 2 else "MI", codice_postale=f"10{i:03d}",
+                   regione="Piemonte") for i in range(20)]
+    db_session.add_all(citta)
+    await db_session.flush()
+    for i in range(200):
+        scuola = Scuola(nome=f"Scuola {i}", tipo="Liceo" if i % 3 else "ITIS", indirizzo=f"Via {i}",
+                        email=f"s{i}@test.it", telefono="011", id_citta=citta[i % 20].id)
+        scuola.indirizzi = [Indirizzo(nome="Scientifico", descrizione="")]
+        db_session.add(scuola)
+    await db_session.flush()
+    await catalog_sync.refresh_schools(db_session, range(1, 201))
+    await db_session.commit()
+    return db_session
+
+
+def schools_list(db, **filters):
+    return lambda: school_service.get_schools(db, limit=10, **filters)
+
+
+@pytest.mark.anyio
+async def test_filter_by_tipo_uses_composite_index(catalog):
+    plan = await query_plan(catalog, schools_list(catalog, tipo="Liceo"))
+
+    assert "ix_scuole_search_tipo_nome" in plan
+
+
+@pytest.mark.anyio
+async def test_filter_by_citta_uses_composite_index(catalog):
+    plan = await query_plan(catalog, schools_list(catalog, citta="Città 3"))
+
+    assert "ix_scuole_search_citta_nome_norm_nome" in plan
+
+
+@pytest.mark.anyio
+async def test_filter_by_provincia_uses_composite_index(catalog):
+    plan = await query_plan(catalog, schools_list(catalog, provincia="TO", sort_by="name"))
+
+    assert "ix_scuole_search_provincia_nome" in plan
+
+
+@pytest.mark.anyio
+async def test_filter_by_materia_uses_semi_join_indexes(catalog):
+    plan = await query_plan(catalog, schools_list(catalog, materia="Informatica"))
+
+    assert "ix_indirizzi_id_scuola" in plan or "ix_indirizzi_materie_table_materia_id" in plan
+    assert "SCAN indirizzi" not in plan
+    assert "SCAN indirizzi_materie_table" not in plan
+
+
+@pytest.mark.anyio
+async def test_filter_by_regione_uses_composite_index(catalog):
+    plan = await query_plan(catalog, schools_list(catalog, regione="Piemonte"))
+
+    assert "ix_scuole_search_regione_nome" in plan
+
+
+@pytest.mark.anyio
+async def test_loading_indirizzi_uses_fk_index(catalog):
+    plan = await query_plan(catalog, lambda: school_service.get_school_by_id(1, catalog))
+
+    assert "ix_indirizzi_id_scuola" in plan
+
+
+@pytest.mark.anyio
+async def test_city_change_resolves_schools_with_fk_index(catalog):
+    plan = await query_plan(catalog, lambda: catalog_sync.schools_affected_by(catalog, "citta", [3]))
+
+    assert "ix_scuole_id_citta" in plan
+
+
+def test_unused_indexes_are_gone():
+    names = {index.name for index in Scuola.__table__.indexes}
+
+    assert not names & {"ix_scuole_email", "ix_scuole_telefono", "ix_scuole_sito_web", "ix_scuole_indirizzo"}
+    # Le liste leggono da scuole_search: gli indici compositi su scuole costerebbero solo in scrittura
+    assert not names & {"ix_scuole_tipo_nome", "ix_scuole_id_citta_nome"}
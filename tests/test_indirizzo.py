@@ -1,4 +1,5 @@
 import pytest
+from app.db.instrumentation import assert_max_queries
 
 async def create_citta_helper(client):
     response = await client.post(
@@ -102,3 +103,15 @@ async def test_delete_indirizzo(client):
     
     response = await client.delete(f"/api/v1/indirizzi/{indirizzo_id}")
     assert response.status_code == 200
+
+@pytest.mark.anyio
+async def test_indirizzi_routes_query_count(client):
+    citta = await create_citta_helper(client)
+    school = await create_school_helper(client, citta["id"])
+    indirizzo_res = await create_indirizzo_helper(client, school["id"])
+    indirizzo_id = indirizzo_res.json()["id"]
+
+    with assert_max_queries(1):
+        await client.get("/api/v1/indirizzi/")
+    with assert_max_queries(1):
+        await client.get(f"/api/v1/indirizzi/{indirizzo_id}")
@@ -0,0 +1,32 @@
+import logging
+
+import pytest
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.instrumentation import QueryStats, assert_max_queries, check_query_stats, parameters_shape
+
+
+@pytest.mark.anyio
+async def test_assert_max_queries_fails_when_exceeded(db_session):
+    with pytest.raises(AssertionError, match="Expected at most 1 queries, 2 were executed"):
+        with assert_max_queries(1):
+            await db_session.execute(text("SELECT 1"))
+            await db_session.execute(text("SELECT 2"))
+
+
+def test_parameters_shape_hides_values():
+    assert parameters_shape({"nome": "Roma", "id": 3}) == "{'nome': 'str', 'id': 'int'}"
+    assert parameters_shape([("a", 1), ("b", 2)]) == "2 x ['str', 'int']"
+
+
+def test_check_query_stats_reports_n_plus_one(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "N_PLUS_ONE_THRESHOLD", 3)
+    stats = QueryStats()
+    for _ in range(3):
+        stats.record("SELECT * FROM materie WHERE id = ?", 0.001)
+
+    with caplog.at_level(logging.WARNING, logger="app.db.instrumentation"):
+        check_query_stats(stats, "/api/v1/schools/")
+
+    assert "Possible N+1" in caplog.text
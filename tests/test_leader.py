@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from app.core.leader import LeaderLock
+
+
+def test_only_one_leader(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    first, second = LeaderLock(path), LeaderLock(path)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert not second.is_leader
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+@pytest.mark.anyio
+async def test_follower_takes_over_when_leader_releases(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    current, follower = LeaderLock(path), LeaderLock(path)
+    current.try_acquire()
+    started = asyncio.Event()
+
+    async def on_elected():
+        started.set()
+
+    task = asyncio.create_task(follower.run_when_elected(on_elected, interval=0.01))
+    await asyncio.sleep(0.05)
+    assert not started.is_set()
+
+    current.release()
+    await asyncio.wait_for(started.wait(), 1)
+    assert follower.is_leader
+    await task
+    follower.release()
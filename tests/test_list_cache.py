@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.api import list_cache
+from app.db.instrumentation import assert_max_queries
+from app.core.config import settings
+from app.models import CatalogVersion, ScuolaSearch
+from app.services import school as school_service
+from tests.test_school import create_citta_helper, create_school_helper
+
+
+@pytest.mark.anyio
+async def test_identical_queries_are_served_from_cache(client):
+    citta = await create_citta_helper(client)
+    await create_school_helper(client, citta["id"], nome="School A")
+
+    first = await client.get("/api/v1/schools/", params={"tipo": "Liceo", "limit": 10})
+    # Stessi parametri interpretati (ordine diverso, default esplicito): stessa pagina, nessuna query
+    with assert_max_queries(0):
+        second = await client.get("/api/v1/schools/?limit=10&order=asc&tipo=Liceo")
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert list_cache.cache_stats()["hits"] == 1
+
+    # Ogni scrittura cambia la generazione del catalogo
+    await create_school_helper(client, citta["id"], nome="School B")
+    third = await client.get("/api/v1/schools/", params={"tipo": "Liceo"})
+    assert [s["nome"] for s in third.json()["scuole"]] == ["School A", "School B"]
+    assert third.headers["etag"] != first.headers["etag"]
+
+
+@pytest.mark.anyio
+async def test_conditional_requests_get_304(client, db_session):
+    citta = await create_citta_helper(client)
+    await create_school_helper(client, citta["id"])
+
+    response = await client.get("/api/v1/schools/")
+    etag = response.headers["etag"]
+    # Ultima modifica nel secondo corrente: Last-Modified non ancora affidabile
+    assert "last-modified" not in response.headers
+
+    not_modified = await client.get("/api/v1/schools/", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    # Catalogo modificato un minuto fa
+    past = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=1)
+    await db_session.execute(update(CatalogVersion).values(changed_at=past))
+    await db_session.execute(update(ScuolaSearch).values(updated_at=past))
+    await db_session.commit()
+    list_cache.clear_cache()
+
+    response = await client.get("/api/v1/schools/")
+    assert response.headers["last-modified"] == format_datetime(past, usegmt=True)
+    since = await client.get("/api/v1/schools/", headers={"If-Modified-Since": response.headers["last-modified"]})
+    assert since.status_code == 304
+    older = format_datetime(past - timedelta(seconds=1), usegmt=True)
+    assert (await client.get("/api/v1/schools/", headers={"If-Modified-Since": older})).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_stale_page_served_while_revalidating(client, monkeypatch):
+    citta = await create_citta_helper(client)
+    await create_school_helper(client, citta["id"], nome="School A")
+    stale = await client.get("/api/v1/schools/")
+    await create_school_helper(client, citta["id"], nome="School B")
+
+    release = asyncio.Event()
+    get_schools = school_service.get_schools
+
+    async def slow_get_schools(*args, **kwargs):
+        await release.wait()
+        return await get_schools(*args, **kwargs)
+
+    monkeypatch.setattr(school_service, "get_schools", slow_get_schools)
+    refreshing = asyncio.create_task(client.get("/api/v1/schools/"))
+    while list_cache.cache_stats()["misses"] != 2:
+        await asyncio.sleep(0)
+
+    # La pagina è in ricalcolo: le altre richieste ricevono subito la versione precedente
+    assert (await client.get("/api/v1/schools/")).content == stale.content
+    assert list_cache.cache_stats()["stale"] == 1
+
+    release.set()
+    fresh = await refreshing
+    assert fresh.json()["total"] == 2
+    assert (await client.get("/api/v1/schools/")).content == fresh.content
+
+
+@pytest.mark.anyio
+async def test_other_worker_writes_change_the_generation(client, db_session, monkeypatch):
+    citta = await create_citta_helper(client)
+    await create_school_helper(client, citta["id"], nome="School A")
+    cached = await client.get("/api/v1/schools/")
+
+    # Scrittura di un altro worker: nessun commit in questo processo la segnala, cambia solo catalog_version
+    await db_session.execute(update(ScuolaSearch).values(nome="School B"))
+    await db_session.execute(update(CatalogVersion).values(version=CatalogVersion.version + 1))
+    await db_session.commit()
+    assert (await client.get("/api/v1/schools/")).content == cached.content
+
+    # Alla rilettura della generazione la pagina viene ricalcolata
+    monkeypatch.setattr(settings, "LIST_CACHE_GENERATION_SECONDS", 0)
+    assert (await client.get("/api/v1/schools/")).json()["scuole"][0]["nome"] == "School B"
@@ -0,0 +1,41 @@
+import logging
+
+import orjson
+import pytest
+
+from app.core.logging import JsonFormatter, SamplingFilter
+
+
+def make_record(name="app.test", level=logging.INFO, msg="hello %s", args=("world",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_json_formatter_includes_request_context():
+    record = make_record()
+    record.request_id = "abc123"
+    record.route = "/api/v1/schools/{school_id}"
+    record.latency_ms = 1.5
+
+    payload = orjson.loads(JsonFormatter().format(record))
+
+    assert payload["msg"] == "hello world"
+    assert payload["request_id"] == "abc123"
+    assert payload["route"] == "/api/v1/schools/{school_id}"
+    assert payload["latency_ms"] == 1.5
+
+
+def test_sampling_filter_drops_only_configured_low_level_records():
+    sampling = SamplingFilter({"app.noisy": 0.0})
+
+    assert sampling.filter(make_record(name="app.noisy.child", level=logging.DEBUG)) is False
+    assert sampling.filter(make_record(name="app.noisy", level=logging.ERROR)) is True
+    assert sampling.filter(make_record(name="app.other", level=logging.DEBUG)) is True
+
+
+@pytest.mark.anyio
+async def test_request_id_is_propagated(client):
+    response = await client.get("/health", headers={"X-Request-ID": "req-1"})
+    assert response.headers["x-request-id"] == "req-1"
+
+    response = await client.get("/health")
+    assert response.headers["x-request-id"]
@@ -0,0 +1,96 @@
+import pytest
+
+from app.core.config import settings
+from app.services.matching import index
+from tests.test_school import create_citta_helper, full_school_payload
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    # Ogni test ha un DB nuovo: l'indice va ricostruito e aggiornato a ogni richiesta
+    index.reset()
+    monkeypatch.setattr(settings, "SIMILARITY_REFRESH_SECONDS", 0)
+    yield
+    index.reset()
+
+
+async def create_school(client, citta_id, nome, indirizzi):
+    payload = full_school_payload(citta_id, [{"nome": n, "materie": m} for n, m in indirizzi.items()])
+    payload["nome"] = nome
+    response = await client.post("/api/v1/schools/full", json=payload)
+    assert response.status_code == 200
+    return response.json()
+
+
+async def materie_ids(client):
+    materie = (await client.get("/api/v1/materie/", params={"limit": 100})).json()["materie"]
+    return {m["nome"]: m["id"] for m in materie}
+
+
+async def match(client, materie, **params):
+    response = await client.post("/api/v1/indirizzi/match", json={"materie": materie, **params})
+    assert response.status_code == 200
+    return [(r["scuola"]["nome"], r["indirizzo"]["nome"], r["score"]) for r in response.json()["risultati"]]
+
+
+@pytest.mark.anyio
+async def test_match_ranks_indirizzi_by_weighted_coverage(client):
+    citta = await create_citta_helper(client)
+    await create_school(client, citta["id"], "ITIS", {"Informatica": ["Informatica", "Matematica"],
+                                                      "Elettronica": ["Elettronica", "Matematica"]})
+    await create_school(client, citta["id"], "Liceo", {"Classico": ["Latino", "Greco"],
+                                                       "Scientifico": ["Matematica", "Fisica", "Latino"]})
+    ids = await materie_ids(client)
+
+    preferite = [{"materia_id": ids["Informatica"], "peso": 3}, {"materia_id": ids["Matematica"]},
+                 {"materia_id": ids["Fisica"]}]
+    # Il Classico non insegna nessuna delle materie e non compare
+    assert await match(client, preferite) == [("ITIS", "Informatica", 0.8), ("Liceo", "Scientifico", 0.4),
+                                              ("ITIS", "Elettronica", 0.2)]
+    assert await match(client, preferite, k=1) == [("ITIS", "Informatica", 0.8)]
+
+    response = (await client.post("/api/v1/indirizzi/match", json={"materie": preferite})).json()
+    best = response["risultati"][0]
+    assert best["materie_corrispondenti"] == sorted([ids["Informatica"], ids["Matematica"]])
+    assert best["indirizzo"]["id_scuola"] == best["scuola"]["id"]
+    assert best["scuola"]["città"] == "Roma"
+
+
+@pytest.mark.anyio
+async def test_match_filters_by_provincia_and_regione(client):
+    roma = await create_citta_helper(client)
+    milano = (await client.post("/api/v1/citta/", json={
+        "nome": "Milano", "cap": "20100", "provincia": "MI", "regione": "Lombardia"})).json()
+    await create_school(client, roma["id"], "A", {"Informatica": ["Informatica"]})
+    await create_school(client, milano["id"], "B", {"Informatica": ["Informatica"]})
+    preferite = [{"materia_id": (await materie_ids(client))["Informatica"]}]
+
+    assert await match(client, preferite, regione="Lombardia") == [("B", "Informatica", 1.0)]
+    assert await match(client, preferite, provincia="RM") == [("A", "Informatica", 1.0)]
+    assert await match(client, preferite, provincia="TO") == []
+
+
+@pytest.mark.anyio
+async def test_match_index_follows_catalog_changes(client):
+    citta = await create_citta_helper(client)
+    school = await create_school(client, citta["id"], "A", {"Informatica": ["Informatica"]})
+    preferite = [{"materia_id": (await materie_ids(client))["Informatica"]}]
+    assert await match(client, preferite) == [("A", "Informatica", 1.0)]
+
+    await create_school(client, citta["id"], "B", {"Sistemi": ["Informatica", "Elettronica"]})
+    assert await match(client, preferite) == [("A", "Informatica", 1.0), ("B", "Sistemi", 1.0)]
+
+    indirizzo_id = school["indirizzi_scuola"][0]["id"]
+    assert (await client.delete(f"/api/v1/indirizzi/{indirizzo_id}")).status_code == 200
+    assert await match(client, preferite) == [("B", "Sistemi", 1.0)]
+
+
+@pytest.mark.anyio
+async def test_match_validation(client):
+    response = await client.post("/api/v1/indirizzi/match", json={"materie": [{"materia_id": 999}]})
+    assert response.status_code == 404
+    assert response.json()["details"]["ids"] == [999]
+    response = await client.post("/api/v1/indirizzi/match", json={"materie": []})
+    assert response.status_code == 422
+    response = await client.post("/api/v1/indirizzi/match", json={"materie": [{"materia_id": 1, "peso": 0}]})
+    assert response.status_code == 422
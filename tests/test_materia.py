@@ -1,4 +1,5 @@
 import pytest
+from app.db.instrumentation import assert_max_queries
 
 async def create_materia_helper(client, nome="Matematica"):
     response = await client.post(
@@ -64,3 +65,22 @@ async def test_delete_materia(client):
     
     response = await client.delete(f"/api/v1/materie/{materia_id}")
     assert response.status_code == 200
+
+@pytest.mark.anyio
+async def test_materie_routes_query_count(client):
+    materia_res = await create_materia_helper(client)
+    materia_id = materia_res.json()["id"]
+
+    with assert_max_queries(1):
+        await client.get("/api/v1/materie/")
+    with assert_max_queries(1):
+        await client.get(f"/api/v1/materie/{materia_id}")
+
+
+@pytest.mark.anyio
+async def test_search_materie_ignores_accents_and_case(client):
+    await create_materia_helper(client, "Attività motorie")
+    await create_materia_helper(client, "Matematica")
+
+    response = await client.get("/api/v1/materie/", params={"search": "ATTIVITA"})
+    assert [m["nome"] for m in response.json()["materie"]] == ["Attività motorie"]
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from app.core import metrics
+
+
+@pytest.mark.anyio
+async def test_metrics_report_route_latency_and_db_statements(client):
+    route_labels = ("GET", "/api/v1/citta/{citta_id}", 200)
+    before = metrics.HTTP_REQUEST_DURATION.count(route_labels)
+
+    created = await client.post("/api/v1/citta/", json={"nome": "Roma", "cap": "00100", "provincia": "RM",
+                                                        "regione": "Lazio"})
+    await client.get(f"/api/v1/citta/{created.json()['id']}")
+
+    assert metrics.HTTP_REQUEST_DURATION.count(route_labels) == before + 1
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/citta/{citta_id}",status="200"}' in body
+    assert 'db_statements_per_request_bucket{route="/api/v1/citta/{citta_id}",le="1.0"}' in body
+    assert "db_pool_checked_out" in body
+    assert "# TYPE db_pool_wait_seconds_total counter" in body
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "test", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = list(histogram.samples())
+
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_seconds_count 3" in lines
+
+
+def test_multiprocess_render_groups_every_worker_under_one_family(tmp_path):
+    registry = metrics.Registry()
+    requests = registry.register(metrics.Counter("test_requests_total", "test", ("route",)))
+    latency = registry.register(metrics.Histogram("test_seconds", "test", buckets=(1.0,)))
+    requests.inc(("/a",), 3)
+    latency.observe(0.5)
+    # Campioni scritti da un altro worker
+    (tmp_path / "1.json").write_text(json.dumps({"test_requests_total": ['test_requests_total{route="/a",worker="1"} 2']}))
+
+    lines = metrics.render_multiprocess(str(tmp_path), registry).splitlines()
+
+    pid = os.getpid()
+    family = lines[lines.index("# TYPE test_requests_total counter") + 1:lines.index("# HELP test_seconds test")]
+    assert sorted(family) == sorted(['test_requests_total{route="/a",worker="1"} 2',
+                                     f'test_requests_total{{route="/a",worker="{pid}"}} 3'])
+    assert f'test_seconds_bucket{{le="1.0",worker="{pid}"}} 1' in lines
+    assert f'test_seconds_count{{worker="{pid}"}} 1' in lines
+
+    # Worker terminato: i suoi campioni non vengono più esportati
+    metrics.remove_snapshot(str(tmp_path), 1)
+    assert 'worker="1"' not in metrics.render_multiprocess(str(tmp_path), registry)
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from starlette.requests import Request
+
+from app.api import deps
+from app.db import session
+
+
+class FakeReplicaSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def make_request(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+async def resolve(request, primary="primary"):
+    generator = deps.get_read_db(request, primary)
+    db = await generator.__anext__()
+    await generator.aclose()
+    return db
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    monkeypatch.setattr(session, "ReplicaSessionLocal", FakeReplicaSession)
+
+    async def usable():
+        return True
+
+    monkeypatch.setattr(session.replica_health, "is_usable", usable)
+
+
+@pytest.mark.anyio
+async def test_reads_use_primary_without_replica():
+    assert await resolve(make_request()) == "primary"
+
+
+@pytest.mark.anyio
+async def test_reads_use_healthy_replica(replica):
+    assert isinstance(await resolve(make_request()), FakeReplicaSession)
+
+
+@pytest.mark.anyio
+async def test_recent_writer_reads_from_primary(replica):
+    request = make_request({deps.LAST_WRITE_HEADER: str(time.time())})
+    assert await resolve(request) == "primary"
+
+
+@pytest.mark.anyio
+async def test_lagging_replica_falls_back_to_primary(monkeypatch):
+    monkeypatch.setattr(session, "ReplicaSessionLocal", FakeReplicaSession)
+
+    async def usable():
+        return False
+
+    monkeypatch.setattr(session.replica_health, "is_usable", usable)
+    assert await resolve(make_request()) == "primary"
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from app import main
+from app.api.deps import get_db
+from app.core.config import settings
+from app.core.readiness import CachedCheck
+from app.db import session
+from app.services import broker, warmup
+from tests.conftest import TestingSessionLocal, engine
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(main, "db_check", CachedCheck("database", ttl=60))
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState(done=True))
+
+
+@pytest.mark.anyio
+async def test_ready_reports_database_and_broker(client):
+    response = await client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "database": "ok", "broker": "disabled", "warmup": "done"}
+
+
+@pytest.mark.anyio
+async def test_ready_returns_503_when_database_is_down(client):
+    class BrokenSession:
+        async def execute(self, *args, **kwargs):
+            raise ConnectionError("connection refused")
+
+    async def broken_db():
+        yield BrokenSession()
+
+    previous = main.app.dependency_overrides[get_db]
+    main.app.dependency_overrides[get_db] = broken_db
+    try:
+        response = await client.get("/ready")
+    finally:
+        main.app.dependency_overrides[get_db] = previous
+
+    assert response.status_code == 503
+    assert response.json()["database"] == "connection refused"
+
+
+@pytest.mark.anyio
+async def test_ready_waits_for_warmup(client):
+    warmup.state.done = False
+
+    response = await client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json()["warmup"] == "running"
+
+
+@pytest.mark.anyio
+async def test_warm_up_opens_connections_and_runs_hot_queries(db_session, monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    monkeypatch.setattr(session, "engine", engine)
+    monkeypatch.setattr(session, "AsyncSessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(settings, "WARMUP_CONNECTIONS", 2)
+
+    state = await warmup.warm_up()
+
+    assert state.done
+    assert state.error is None
+    assert state.connections == 2
+    assert state.duration is not None
+
+
+@pytest.mark.anyio
+async def test_cached_check_reuses_result():
+    calls = 0
+
+    async def check():
+        nonlocal calls
+        calls += 1
+
+    cached = CachedCheck("test", ttl=60)
+    assert await cached.run(check)
+    assert await cached.run(check)
+    assert calls == 1
+
+
+class FakeBroker:
+    def __init__(self):
+        # Primo tentativo fallito, poi connessioni riuscite
+        self.connect_results = [False, True, True]
+        self.connected = False
+        self.subscribed = []
+
+    @property
+    def is_connected(self):
+        return self.connected
+
+    async def connect(self, retries, delay):
+        self.connected = self.connect_results.pop(0)
+        return self.connected
+
+    async def subscribe(self, exchange, callback):
+        self.subscribed.append(exchange)
+
+    async def reset(self):
+        self.connected = False
+
+
+async def wait_until(condition, attempts=100):
+    for _ in range(attempts):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def supervised(monkeypatch):
+    """Supervisor in esecuzione su un FakeBroker; restituisce (supervisor, broker)."""
+    fake = FakeBroker()
+    monkeypatch.setattr(broker, "AsyncBrokerSingleton", lambda: fake)
+    monkeypatch.setattr(settings, "RABBITMQ_CONNECTION_RETRY_DELAY", 0)
+    supervisor = broker.BrokerSupervisor({"schools": None}, check_interval=0.01)
+    task = asyncio.create_task(supervisor.run())
+    try:
+        yield supervisor, fake
+    finally:
+        task.cancel()
+
+
+@pytest.mark.anyio
+async def test_supervisor_retries_until_connected(supervised):
+    supervisor, fake = supervised
+
+    await wait_until(lambda: supervisor.state == "connected")
+
+    assert supervisor.state == "connected"
+    assert fake.connect_results == [True]
+    assert fake.subscribed == ["schools"]
+
+
+@pytest.mark.anyio
+async def test_supervisor_resubscribes_after_connection_loss(supervised):
+    supervisor, fake = supervised
+    await wait_until(lambda: supervisor.state == "connected")
+
+    # Connessione persa: il supervisor riconnette e risottoscrive
+    fake.connected = False
+    await wait_until(lambda: len(fake.subscribed) == 2 and supervisor.state == "connected")
+
+    assert supervisor.state == "connected"
+    assert fake.subscribed == ["schools", "schools"]
@@ -1,4 +1,10 @@
 import pytest
+from sqlalchemy import event, select
+
+from app.db.instrumentation import assert_max_queries
+from app.models.indirizzo import indirizzi_materie_table
+from app.schemas.school import SchoolResponse, SchoolsList
+from tests.conftest import TestingSessionLocal, engine
 
 async def create_citta_helper(client):
     response = await client.post(
@@ -95,3 +101,235 @@ async def test_delete_school(client):
     
     # Try to get it
     # Depending on implementation, might return 404 or something else
+
+@pytest.mark.anyio
+async def test_school_routes_query_count(client):
+    citta = await create_citta_helper(client)
+    for i in range(3):
+        school = (await create_school_helper(client, citta["id"], nome=f"School {i}")).json()
+        indirizzo = (await client.post("/api/v1/indirizzi/", json={
+            "nome": "Informatica", "descrizione": "Corso", "id_scuola": school["id"]})).json()
+        materia = (await client.post("/api/v1/materie/", json={"nome": f"Materia {i}", "descrizione": "d"})).json()
+        await client.post(f"/api/v1/materie/link-indirizzo/{materia['id']}/{indirizzo['id']}")
+
+    # generazione del catalogo + count + pagina dal read model scuole_search, indipendentemente dal numero di righe
+    with assert_max_queries(3):
+        response = await client.get("/api/v1/schools/")
+    assert response.status_code == 200
+    # Stessa pagina, catalogo invariato: servita dalla cache
+    with assert_max_queries(0):
+        assert (await client.get("/api/v1/schools/")).content == response.content
+
+    with assert_max_queries(3):
+        response = await client.get(f"/api/v1/schools/{school['id']}")
+    assert response.json()["indirizzi_scuola"][0]["materie"] == ["Materia 2"]
+
+
+@pytest.mark.anyio
+async def test_filter_schools_by_materia_indirizzo_studio_and_regione(client):
+    roma = await create_citta_helper(client)
+    milano = (await client.post("/api/v1/citta/", json={
+        "nome": "Milano", "cap": "20100", "provincia": "MI", "regione": "Lombardia"})).json()
+    informatica = (await client.post("/api/v1/materie/", json={"nome": "Informatica", "descrizione": "d"})).json()
+
+    async def school_with(citta_id, nome, indirizzi):
+        school = (await create_school_helper(client, citta_id, nome=nome)).json()
+        for nome_indirizzo in indirizzi:
+            indirizzo = (await client.post("/api/v1/indirizzi/", json={
+                "nome": nome_indirizzo, "descrizione": "d", "id_scuola": school["id"]})).json()
+            await client.post(f"/api/v1/materie/link-indirizzo/{informatica['id']}/{indirizzo['id']}")
+        return school
+
+    # Due indirizzi con la stessa materia: la scuola deve comparire una sola volta
+    await school_with(milano["id"], "ITIS Milano", ["Informatica", "Telecomunicazioni"])
+    await school_with(roma["id"], "ITIS Roma", ["Informatica"])
+    await create_school_helper(client, milano["id"], nome="Liceo Classico")
+
+    data = (await client.get("/api/v1/schools/", params={"materia": "informatica"})).json()
+    assert data["total"] == 2
+    assert [s["nome"] for s in data["scuole"]] == ["ITIS Milano", "ITIS Roma"]
+
+    data = (await client.get("/api/v1/schools/", params={"materia": "Informatica", "regione": "Lombardia"})).json()
+    assert [s["nome"] for s in data["scuole"]] == ["ITIS Milano"]
+    assert data["filter_regione"] == "Lombardia"
+
+    data = (await client.get("/api/v1/schools/", params={"indirizzo_studio": "Telecom"})).json()
+    assert data["total"] == 1
+    assert data["scuole"][0]["nome"] == "ITIS Milano"
+
+
+@pytest.mark.anyio
+async def test_search_schools_ignores_accents_case_and_apostrophes(client):
+    forli = (await client.post("/api/v1/citta/", json={
+        "nome": "Forlì", "cap": "47121", "provincia": "FC", "regione": "Emilia-Romagna"})).json()
+    roma = await create_citta_helper(client)
+    await create_school_helper(client, forli["id"], nome="Liceo Sant'Anna")
+    await create_school_helper(client, roma["id"], nome="Istituto Santa Maria")
+
+    for search in ("sant'anna", "Sant’Anna", "SANT ANNA"):
+        data = (await client.get("/api/v1/schools/", params={"search": search})).json()
+        assert [s["nome"] for s in data["scuole"]] == ["Liceo Sant'Anna"], search
+
+    data = (await client.get("/api/v1/schools/", params={"citta": "forli"})).json()
+    assert [s["nome"] for s in data["scuole"]] == ["Liceo Sant'Anna"]
+
+
+def full_school_payload(citta_id, indirizzi):
+    return {
+        "nome": "ITIS Galilei", "tipo": "ITIS", "indirizzo": "Via Galilei 1", "email_contatto": "info@galilei.it",
+        "telefono_contatto": "06123", "citta_id": citta_id, "indirizzi_scuola": indirizzi,
+    }
+
+
+@pytest.mark.anyio
+async def test_create_school_with_nested_indirizzi_and_materie(client):
+    citta = await create_citta_helper(client)
+    informatica = (await client.post("/api/v1/materie/", json={"nome": "Informatica", "descrizione": "d"})).json()
+    fisica = (await client.post("/api/v1/materie/", json={"nome": "Fisica", "descrizione": "d"})).json()
+
+    indirizzi = [
+        {"nome": f"Indirizzo {n}", "descrizione": "d", "materie": [informatica["id"], "FISICA", "Robotica"]}
+        for n in range(10)
+    ]
+    # Il numero di statement non dipende da quanti indirizzi e materie vengono creati
+    # (compresi catalog_stats e, al commit, versione del catalogo e log delle modifiche)
+    with assert_max_queries(15):
+        response = await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], indirizzi))
+    assert response.status_code == 200
+    school = response.json()
+    assert school["città"] == "Roma"
+    assert len(school["indirizzi_scuola"]) == 10
+    assert school["indirizzi_scuola"][0]["materie"] == ["Informatica", "Fisica", "Robotica"]
+
+    assert (await client.get(f"/api/v1/schools/{school['id']}")).json() == school
+    # "FISICA" è stata riconosciuta, "Robotica" creata una sola volta
+    materie = (await client.get("/api/v1/materie/", params={"limit": 100})).json()["materie"]
+    assert sorted(m["nome"] for m in materie) == ["Fisica", "Informatica", "Robotica"]
+    assert fisica["id"] in {m["id"] for m in materie}
+
+
+@pytest.mark.anyio
+async def test_replace_school_keeps_matching_indirizzi(client):
+    citta = await create_citta_helper(client)
+    school = (await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], [
+        {"nome": "Informatica", "materie": ["Sistemi", "Reti"]},
+        {"nome": "Meccanica", "materie": ["Disegno"]},
+    ]))).json()
+    kept_id = school["indirizzi_scuola"][0]["id"]
+
+    payload = full_school_payload(citta["id"], [
+        {"nome": "Informatica", "descrizione": "Nuova", "materie": ["Reti"]},
+        {"nome": "Elettronica", "materie": ["Sistemi"]},
+    ])
+    payload["nome"] = "ITIS Galileo Galilei"
+    response = await client.put(f"/api/v1/schools/{school['id']}/full", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["nome"] == "ITIS Galileo Galilei"
+    assert [(i["nome"], i["descrizione"], i["materie"]) for i in data["indirizzi_scuola"]] == [
+        ("Informatica", "Nuova", ["Reti"]), ("Elettronica", "", ["Sistemi"])]
+    assert data["indirizzi_scuola"][0]["id"] == kept_id
+    removed = await client.get("/api/v1/indirizzi/", params={"search": "Meccanica"})
+    assert removed.json()["indirizzi"] == []
+
+
+@pytest.mark.anyio
+async def test_nested_materie_spelling_variants_resolve_to_one_materia(client):
+    citta = await create_citta_helper(client)
+    # Grafie dello stesso nome, nello stesso indirizzo e in indirizzi diversi
+    response = await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], [
+        {"nome": "Liceo", "materie": ["Storia", "storia"]},
+        {"nome": "Tecnico", "materie": ["STORIA", "Città"]},
+        {"nome": "Professionale", "materie": ["citta"]},
+    ]))
+    assert response.status_code == 200
+    assert [i["materie"] for i in response.json()["indirizzi_scuola"]] == [["Storia"], ["Storia", "Città"], ["Città"]]
+    materie = (await client.get("/api/v1/materie/")).json()["materie"]
+    assert sorted(m["nome"] for m in materie) == ["Città", "Storia"]
+
+
+@pytest.mark.anyio
+async def test_replace_school_removes_indirizzi_with_duplicate_names(client):
+    citta = await create_citta_helper(client)
+    school = (await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], [
+        {"nome": "Informatica", "materie": ["Sistemi"]}]))).json()
+    kept_id = school["indirizzi_scuola"][0]["id"]
+    # PUT /indirizzi (e due POST concorrenti) possono lasciare due indirizzi con lo stesso nome nella stessa scuola
+    duplicate = (await client.post("/api/v1/indirizzi/", json={
+        "nome": "Meccanica", "descrizione": "", "id_scuola": school["id"]})).json()
+    await client.put(f"/api/v1/indirizzi/{duplicate['id']}", json={
+        "nome": "Informatica", "descrizione": "", "id_scuola": school["id"]})
+    fisica = (await client.post("/api/v1/materie/", json={"nome": "Fisica", "descrizione": "d"})).json()
+    await client.post(f"/api/v1/materie/link-indirizzo/{fisica['id']}/{duplicate['id']}")
+
+    response = await client.put(f"/api/v1/schools/{school['id']}/full", json=full_school_payload(citta["id"], [
+        {"nome": "Informatica", "materie": ["Reti"]}]))
+    assert response.status_code == 200
+    assert [(i["id"], i["materie"]) for i in response.json()["indirizzi_scuola"]] == [(kept_id, ["Reti"])]
+    with pytest.raises(Exception, match="Indirizzo non trovato"):
+        await client.get(f"/api/v1/indirizzi/{duplicate['id']}")
+    async with TestingSessionLocal() as db:
+        links = (await db.execute(select(indirizzi_materie_table.c.indirizzo_id))).scalars().all()
+    assert links == [kept_id]
+
+
+@pytest.mark.anyio
+async def test_nested_materia_created_concurrently_is_not_duplicated(client):
+    citta = await create_citta_helper(client)
+    created = []
+
+    def concurrent_insert(conn, cursor, statement, parameters, context, executemany):
+        # Un'altra richiesta crea "Robotica" tra la lettura delle materie esistenti e l'insert di quelle nuove
+        if statement.lstrip().upper().startswith("INSERT INTO MATERIE") and not created:
+            created.append(True)
+            conn.exec_driver_sql("INSERT INTO materie (nome, nome_norm, descrizione) VALUES ('ROBOTICA', 'robotica', '')")
+
+    event.listen(engine.sync_engine, "before_cursor_execute", concurrent_insert)
+    try:
+        response = await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], [
+            {"nome": "Informatica", "materie": ["Robotica", "Reti"]}]))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", concurrent_insert)
+
+    assert created
+    assert response.status_code == 200
+    assert response.json()["indirizzi_scuola"][0]["materie"] == ["ROBOTICA", "Reti"]
+    materie = (await client.get("/api/v1/materie/")).json()["materie"]
+    assert sorted(m["nome"] for m in materie) == ["ROBOTICA", "Reti"]
+    with pytest.raises(Exception, match="Materia già esistente"):
+        await client.post("/api/v1/materie/", json={"nome": "robotica", "descrizione": "d"})
+
+
+@pytest.mark.anyio
+async def test_nested_school_write_errors_leave_no_trace(client):
+    citta = await create_citta_helper(client)
+
+    response = await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], [
+        {"nome": "Informatica", "materie": ["Nuova materia", 999]}]))
+    assert response.status_code == 404
+    assert response.json()["details"]["ids"] == [999]
+
+    response = await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], [
+        {"nome": "Informatica"}, {"nome": "Informatica"}]))
+    assert response.status_code == 422
+
+    response = await client.put("/api/v1/schools/999/full", json=full_school_payload(citta["id"], []))
+    assert response.status_code == 404
+
+    assert (await client.get("/api/v1/schools/")).json()["total"] == 0
+    assert (await client.get("/api/v1/materie/")).json()["materie"] == []
+
+
+@pytest.mark.anyio
+async def test_school_responses_match_response_model(client):
+    citta = await create_citta_helper(client)
+    created = (await client.post("/api/v1/schools/full", json=full_school_payload(citta["id"], [
+        {"nome": "Informatica", "materie": ["Sistemi", "Reti"]}]))).json()
+
+    # Le route serializzano direttamente il modello costruito dal service: l'output deve restare
+    # quello che produrrebbe FastAPI validando con response_model
+    listed = (await client.get("/api/v1/schools/")).json()
+    assert SchoolsList.model_validate(listed).model_dump(mode="json") == listed
+    detail = (await client.get(f"/api/v1/schools/{created['id']}")).json()
+    assert SchoolResponse.model_validate(detail).model_dump(mode="json") == detail == created
+    assert listed["scuole"] == [detail]
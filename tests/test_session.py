@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.db.session import TimedQueuePool, engine_options
+
+
+def test_postgres_engine_options_follow_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 2500)
+
+    options = engine_options("postgresql+asyncpg://user:pass@db/schools")
+
+    assert options["poolclass"] is TimedQueuePool
+    assert options["pool_size"] == 7
+    assert options["connect_args"]["server_settings"]["statement_timeout"] == "2500"
+
+
+def test_sqlite_engine_options_skip_pool_settings():
+    options = engine_options("sqlite+aiosqlite:///./database.db")
+    assert "pool_size" not in options
+
+
+@pytest.mark.anyio
+async def test_pool_counts_only_waits_on_exhausted_pool():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=TimedQueuePool, pool_size=1,
+                                 max_overflow=0, pool_timeout=5)
+    pool = engine.sync_engine.pool
+    try:
+        # Checkout con una connessione disponibile (anche se va aperta): non è un'attesa
+        first = await engine.connect()
+        assert (pool.wait_count, pool.waiting) == (0, 0)
+
+        second = asyncio.create_task(engine.connect().start())
+        await asyncio.sleep(0.05)
+        assert pool.waiting == 1
+        await first.close()
+        await (await second).close()
+
+        assert (pool.wait_count, pool.waiting) == (1, 0)
+        assert pool.wait_seconds_total >= 0.04
+    finally:
+        await engine.dispose()
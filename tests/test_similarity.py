@@ -0,0 +1,124 @@
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.models import Materia
+from app.models.indirizzo import indirizzi_materie_table
+from app.services.changes import record_changes
+from app.services.similarity import index
+from tests.conftest import TestingSessionLocal
+from tests.test_school import create_citta_helper, full_school_payload
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    # Ogni test ha un DB nuovo: l'indice va ricostruito e aggiornato a ogni richiesta
+    index.reset()
+    monkeypatch.setattr(settings, "SIMILARITY_REFRESH_SECONDS", 0)
+    yield
+    index.reset()
+
+
+async def create_school(client, citta_id, nome, materie, tipo="ITIS"):
+    payload = full_school_payload(citta_id, [{"nome": "Ordinario", "materie": materie}])
+    payload.update({"nome": nome, "tipo": tipo})
+    response = await client.post("/api/v1/schools/full", json=payload)
+    assert response.status_code == 200
+    return response.json()
+
+
+async def get_similar(client, school_id, **params):
+    response = await client.get(f"/api/v1/schools/{school_id}/similar", params=params)
+    assert response.status_code == 200
+    return [(s["scuola"]["nome"], s["score"]) for s in response.json()["risultati"]]
+
+
+@pytest.mark.anyio
+async def test_similar_schools_ranked_by_jaccard_and_cosine(client):
+    citta = await create_citta_helper(client)
+    a = await create_school(client, citta["id"], "A", ["Informatica", "Fisica", "Matematica", "Inglese"])
+    await create_school(client, citta["id"], "B", ["Informatica", "Fisica", "Matematica"])
+    await create_school(client, citta["id"], "C", ["Informatica", "Latino"])
+    await create_school(client, citta["id"], "D", ["Latino", "Greco"])
+
+    # D non ha materie in comune con A e non compare
+    assert await get_similar(client, a["id"]) == [("B", 0.75), ("C", 0.2)]
+    assert await get_similar(client, a["id"], metric="cosine") == [("B", 0.866025), ("C", 0.353553)]
+    assert await get_similar(client, a["id"], k=1) == [("B", 0.75)]
+
+    response = (await client.get(f"/api/v1/schools/{a['id']}/similar")).json()
+    assert response["school_id"] == a["id"] and response["metric"] == "jaccard"
+    materie = response["risultati"][0]["scuola"]["indirizzi_scuola"][0]["materie"]
+    assert sorted(materie) == ["Fisica", "Informatica", "Matematica"]
+
+
+@pytest.mark.anyio
+async def test_similar_schools_filters(client):
+    roma = await create_citta_helper(client)
+    milano = (await client.post("/api/v1/citta/", json={
+        "nome": "Milano", "cap": "20100", "provincia": "MI", "regione": "Lombardia"})).json()
+    a = await create_school(client, roma["id"], "A", ["Informatica", "Fisica"])
+    await create_school(client, roma["id"], "B", ["Informatica"], tipo="Liceo")
+    await create_school(client, milano["id"], "C", ["Informatica", "Fisica"])
+
+    assert await get_similar(client, a["id"], provincia="RM") == [("B", 0.5)]
+    assert await get_similar(client, a["id"], tipo="ITIS") == [("C", 1.0)]
+    assert await get_similar(client, a["id"], provincia="TO") == []
+
+
+@pytest.mark.anyio
+async def test_similarity_index_follows_catalog_changes(client):
+    citta = await create_citta_helper(client)
+    a = await create_school(client, citta["id"], "A", ["Informatica", "Fisica"])
+    b = await create_school(client, citta["id"], "B", ["Informatica"])
+    assert await get_similar(client, a["id"]) == [("B", 0.5)]
+    built = index.seq
+
+    # Modifiche applicate in modo incrementale dal log catalog_changes
+    payload = full_school_payload(citta["id"], [{"nome": "Ordinario", "materie": ["Informatica", "Fisica"]}])
+    payload["nome"] = "B"
+    assert (await client.put(f"/api/v1/schools/{b['id']}/full", json=payload)).status_code == 200
+    await create_school(client, citta["id"], "C", ["Fisica", "Chimica"])
+    assert await get_similar(client, a["id"]) == [("B", 1.0), ("C", 0.333333)]
+    assert index.seq > built
+
+    indirizzo_id = b["indirizzi_scuola"][0]["id"]
+    assert (await client.delete(f"/api/v1/indirizzi/{indirizzo_id}")).status_code == 200
+    assert await get_similar(client, a["id"]) == [("C", 0.333333)]
+
+    assert (await client.delete(f"/api/v1/schools/{a['id']}")).status_code == 200
+    response = await client.get(f"/api/v1/schools/{a['id']}/similar")
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_similarity_index_keeps_changes_committed_out_of_order(client, db_session):
+    citta = await create_citta_helper(client)
+    a = await create_school(client, citta["id"], "A", ["Informatica", "Fisica"])
+    b = await create_school(client, citta["id"], "B", ["Informatica"])
+    assert await get_similar(client, a["id"]) == [("B", 0.5)]
+
+    async with TestingSessionLocal() as slow:
+        # Transazione lenta: la modifica di B è registrata prima della scrittura di C ma committata dopo
+        fisica = (await db_session.execute(select(Materia.id).where(Materia.nome == "Fisica"))).scalar_one()
+        await db_session.execute(insert(indirizzi_materie_table).values(
+            indirizzo_id=b["indirizzi_scuola"][0]["id"], materia_id=fisica))
+        await db_session.commit()
+        await record_changes(slow, "scuola", [b["id"]], deleted=False)
+
+        await create_school(client, citta["id"], "C", ["Fisica"])
+        assert await get_similar(client, a["id"]) == [("B", 0.5), ("C", 0.5)]
+        await slow.commit()
+
+    # Il seq di B è successivo a quello di C: l'indice non lo salta
+    assert await get_similar(client, a["id"]) == [("B", 1.0), ("C", 0.5)]
+
+
+@pytest.mark.anyio
+async def test_similar_schools_validation(client):
+    response = await client.get("/api/v1/schools/999/similar")
+    assert response.status_code == 404
+    response = await client.get("/api/v1/schools/1/similar", params={"metric": "euclidean"})
+    assert response.status_code == 422
+    response = await client.get("/api/v1/schools/1/similar", params={"k": settings.SIMILARITY_MAX_K + 1})
+    assert response.status_code == 422
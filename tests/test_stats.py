@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.models import CatalogStat
+from app.services import stats
+from tests.conftest import TestingSessionLocal
+from tests.test_catalog_sync import create_catalog
+
+
+@pytest.fixture(autouse=True)
+def no_stats_cache(monkeypatch):
+    stats.clear_cache()
+    monkeypatch.setattr(settings, "STATS_CACHE_SECONDS", 0)
+    yield
+    stats.clear_cache()
+
+
+async def get_stats(client):
+    response = await client.get("/api/v1/stats/")
+    assert response.status_code == 200
+    data = response.json()
+    return {
+        "scuole": data["scuole"],
+        "indirizzi": data["indirizzi"],
+        **{key: {e["valore"]: e["totale"] for e in data[key]}
+           for key in ("scuole_per_regione", "scuole_per_provincia", "scuole_per_tipo", "indirizzi_per_materia")},
+    }
+
+
+@pytest.mark.anyio
+async def test_write_paths_keep_stats_in_sync(client):
+    citta, school, indirizzo, materia = await create_catalog(client)
+    assert await get_stats(client) == {
+        "scuole": 1, "indirizzi": 1, "scuole_per_regione": {"Piemonte": 1}, "scuole_per_provincia": {"TO": 1},
+        "scuole_per_tipo": {"ITIS": 1}, "indirizzi_per_materia": {"Sistemi": 1},
+    }
+
+    milano = (await client.post("/api/v1/citta/", json={
+        "nome": "Milano", "cap": "20100", "provincia": "MI", "regione": "Lombardia"})).json()
+    await client.post("/api/v1/schools/", json={
+        "nome": "Liceo Volta", "tipo": "Liceo", "indirizzo": "Via Volta 1", "email_contatto": "info@volta.it",
+        "telefono_contatto": "02", "citta_id": milano["id"]})
+    await client.put(f"/api/v1/materie/{materia['id']}", json={"nome": "Sistemi e Reti", "descrizione": "Reti"})
+    await client.put(f"/api/v1/citta/{citta['id']}", json={
+        "nome": "Torino", "cap": "10100", "provincia": "TO", "regione": "Piemonte Ovest"})
+    data = await get_stats(client)
+    assert data["scuole"] == 2
+    assert data["scuole_per_regione"] == {"Lombardia": 1, "Piemonte Ovest": 1}
+    assert data["scuole_per_tipo"] == {"ITIS": 1, "Liceo": 1}
+    assert data["indirizzi_per_materia"] == {"Sistemi e Reti": 1}
+
+    await client.delete(f"/api/v1/indirizzi/{indirizzo['id']}")
+    await client.delete(f"/api/v1/schools/{school['id']}")
+    data = await get_stats(client)
+    assert data["scuole"] == 1 and data["indirizzi"] == 0
+    assert data["scuole_per_provincia"] == {"MI": 1}
+    assert data["indirizzi_per_materia"] == {}
+
+
+@pytest.mark.anyio
+async def test_recompute_matches_incremental_stats(client, db_session):
+    await create_catalog(client)
+    expected = await get_stats(client)
+
+    await db_session.execute(delete(CatalogStat))
+    await db_session.commit()
+    assert (await get_stats(client))["scuole"] == 0
+
+    processed = await stats.recompute_stats(TestingSessionLocal, batch_size=1)
+    assert processed == 1
+    assert await get_stats(client) == expected
+
+
+@pytest.mark.anyio
+async def test_stats_response_is_cached(client, monkeypatch):
+    monkeypatch.setattr(settings, "STATS_CACHE_SECONDS", 60)
+    await create_catalog(client)
+    response = await client.get("/api/v1/stats/")
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert response.json()["scuole"] == 1
+
+    await client.delete("/api/v1/schools/1")
+    assert (await client.get("/api/v1/stats/")).json() == response.json()
+    stats.clear_cache()
+    assert (await client.get("/api/v1/stats/")).json()["scuole"] == 0